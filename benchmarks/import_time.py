@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入耗时基准：在全新的解释器中导入写入侧模块，检查没有连带导入 nebula3/thrift
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --modules ngsm.ngql,ngsm.loader --max-ms 300
+
++ 每个模块在独立的子进程中导入 repeat 次，报告最快的一次，排除磁盘缓存的影响
++ 导入了 forbidden 中的任一顶层包，或耗时超过 max-ms 时，进程以状态码1退出
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只生成语句的场景会导入的模块
+DEFAULT_MODULES = ('ngsm.model', 'ngsm.convertor', 'ngsm.ngql', 'ngsm.loader', 'ngsm.io', 'ngsm.partition')
+DEFAULT_FORBIDDEN = ('nebula3', 'thrift')
+
+_PROBE = """\
+import json, sys, time
+begin = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - begin
+print(json.dumps(dict(seconds=elapsed, packages=sorted({{m.split('.')[0] for m in sys.modules}}))))
+"""
+
+
+def probe(module: str):
+    """在全新的解释器中导入 module，返回 (秒数, 已导入的顶层包)"""
+    output = subprocess.check_output([sys.executable, '-c', _PROBE.format(module=module)], cwd=ROOT)
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    return result['seconds'], set(result['packages'])
+
+
+def _names(text: str):
+    return [n for n in text.split(',') if n]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ngsm import time guard')
+    parser.add_argument('--modules', type=_names, default=list(DEFAULT_MODULES), help='comma separated modules')
+    parser.add_argument('--forbidden', type=_names, default=list(DEFAULT_FORBIDDEN),
+                        help='comma separated top-level packages that must not be imported')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--max-ms', type=float, default=None, help='fail when the fastest import exceeds this')
+    args = parser.parse_args(argv)
+
+    failures = []
+    print('{:<20}{:>12}  {}'.format('module', 'best ms', 'forbidden imported'))
+    for module in args.modules:
+        best, leaked = None, set()
+        for _ in range(args.repeat):
+            seconds, packages = probe(module)
+            best = seconds if best is None else min(best, seconds)
+            leaked |= packages.intersection(args.forbidden)
+        print('{:<20}{:>12.1f}  {}'.format(module, best * 1000, ', '.join(sorted(leaked)) or '-'))
+        if leaked:
+            failures.append('{} imports {}'.format(module, ', '.join(sorted(leaked))))
+        if args.max_ms is not None and best * 1000 > args.max_ms:
+            failures.append('{} takes {:.1f} ms > {} ms'.format(module, best * 1000, args.max_ms))
+    for line in failures:
+        print('FAIL', line)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线基准测试：语句生成、编码与解码的热点路径，只依赖标准库与 ngsm 自身的依赖
+
+    python benchmarks/run.py --rows 1000,100000 --widths 4,16,64
+    python benchmarks/run.py --update-baseline
+    python benchmarks/run.py --threshold 0.2
+
++ 每组 (基准, 行数, 属性数) 先不开启 tracemalloc 计时，再开启 tracemalloc 单独测量内存峰值
++ 默认与 --baseline（benchmarks/baseline.json）比较，rows/s 下降或内存峰值上升超过 threshold 的项目视为回退，
+  进程以状态码1退出；基线中没有的项目不参与比较
++ 仓库中的 baseline.json 由 `python benchmarks/run.py --update-baseline` 以默认参数生成，
+  其中 __meta__ 记录了生成时的python版本与平台；基线与机器相关，在其他机器上比较前需先在该机器上重新生成
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nebula3.common.ttypes import Value  # noqa: E402
+from nebula3.data.DataObject import ValueWrapper  # noqa: E402
+
+from ngsm.base import NDataTypes  # noqa: E402
+from ngsm.convertor import StmtFormatter  # noqa: E402
+from ngsm.convertor import ValueFormatter  # noqa: E402
+from ngsm.model import EdgeModel  # noqa: E402
+from ngsm.model import EdgeSchemaModel  # noqa: E402
+from ngsm.model import PropertySchemaModel  # noqa: E402
+from ngsm.model import TagSchemaModel  # noqa: E402
+from ngsm.model import VertexBatch  # noqa: E402
+from ngsm.model import VertexModel  # noqa: E402
+from ngsm.ngql import Insert  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+TYPES = (NDataTypes.INT64.value, NDataTypes.STRING.value, NDataTypes.DOUBLE.value, NDataTypes.BOOL.value)
+
+
+def _properties(width: int):
+    return [PropertySchemaModel(name='p{}'.format(i), type=TYPES[i % len(TYPES)]) for i in range(width)]
+
+
+def _value(type_: str, rnd: random.Random):
+    if type_ == NDataTypes.INT64.value:
+        return rnd.randint(-1 << 40, 1 << 40)
+    if type_ == NDataTypes.STRING.value:
+        return 'value-{}'.format(rnd.randint(0, 1 << 20))
+    if type_ == NDataTypes.DOUBLE.value:
+        return rnd.random() * 1e6
+    return rnd.random() < 0.5
+
+
+def _wrapped(type_: str, value):
+    if type_ == NDataTypes.INT64.value:
+        return ValueWrapper(Value(iVal=value))
+    if type_ == NDataTypes.STRING.value:
+        return ValueWrapper(Value(sVal=value.encode('utf-8')))
+    if type_ == NDataTypes.DOUBLE.value:
+        return ValueWrapper(Value(fVal=value))
+    return ValueWrapper(Value(bVal=value))
+
+
+def dataset(rows: int, width: int):
+    """固定随机种子生成的 (vid, 属性字典) 列表"""
+    rnd = random.Random(0)
+    properties = _properties(width)
+    return [(i, {p.name: _value(p.type, rnd) for p in properties}) for i in range(rows)]
+
+
+def _statement_bytes(output):
+    if output is None:
+        return 0
+    if isinstance(output, str):
+        return StmtFormatter.byte_length(output)
+    return sum([StmtFormatter.byte_length(stmt) for stmt in output])
+
+
+# 每个基准的 setup(rows, width) 返回无参函数，调用一次完成全部工作并返回产出的字节数
+
+def setup_vertex_model(rows: int, width: int):
+    tag = TagSchemaModel(name='bench', properties=_properties(width))
+    data = dataset(rows, width)
+
+    def run():
+        [VertexModel(vid=vid, schema=tag, properties=props) for vid, props in data]
+        return 0
+    return run
+
+
+def setup_insert_vertex(rows: int, width: int):
+    tag = TagSchemaModel(name='bench', properties=_properties(width))
+    vertexes = [VertexModel(vid=vid, schema=tag, properties=props) for vid, props in dataset(rows, width)]
+    return lambda: _statement_bytes(Insert.vertex(schema=tag, vertexes=vertexes, if_not_exists=False))
+
+
+def setup_compiled_vertex_model(rows: int, width: int):
+    compiled = TagSchemaModel(name='bench', properties=_properties(width)).compile_class()
+    data = dataset(rows, width)
+
+    def run():
+        [compiled(vid, **props) for vid, props in data]
+        return 0
+    return run
+
+
+def setup_compiled_insert_vertex(rows: int, width: int):
+    tag = TagSchemaModel(name='bench', properties=_properties(width))
+    compiled = tag.compile_class()
+    vertexes = [compiled(vid, **props) for vid, props in dataset(rows, width)]
+    return lambda: _statement_bytes(Insert.vertex(schema=tag, vertexes=vertexes, if_not_exists=False))
+
+
+def setup_insert_vertex_batch(rows: int, width: int):
+    tag = TagSchemaModel(name='bench', properties=_properties(width))
+    data = dataset(rows, width)
+    vids = [vid for vid, _ in data]
+    columns = {p.name: [props[p.name] for _, props in data] for p in tag.properties}
+
+    def run():
+        batch = VertexBatch(schema=tag, vids=vids, columns=columns)
+        return _statement_bytes(Insert.vertex_batch(batch=batch, if_not_exists=False))
+    return run
+
+
+def setup_insert_edge(rows: int, width: int):
+    edge_type = EdgeSchemaModel(name='bench', properties=_properties(width))
+    edges = [EdgeModel(src_vid='v{}'.format(vid), dst_vid='v{}'.format(vid + 1), schema=edge_type, properties=props)
+             for vid, props in dataset(rows, width)]
+    return lambda: _statement_bytes(Insert.edge(schema=edge_type, edges=edges, if_not_exists=False))
+
+
+def setup_value_formatter_encode(rows: int, width: int):
+    properties = _properties(width)
+    data = dataset(rows, width)
+
+    def run():
+        size = 0
+        for _, props in data:
+            for p in properties:
+                size += len(ValueFormatter.encode(p.type, props[p.name]))
+        return size
+    return run
+
+
+def setup_parse_properties(rows: int, width: int):
+    tag = TagSchemaModel(name='bench', properties=_properties(width))
+    wrapped = [{p.name: _wrapped(p.type, props[p.name]) for p in tag.properties} for _, props in dataset(rows, width)]
+
+    def run():
+        for props in wrapped:
+            ValueFormatter.parse_properties(prop=props, schema=tag, for_display=False)
+        return 0
+    return run
+
+
+BENCHMARKS = {
+    'vertex_model': setup_vertex_model,
+    'insert_vertex': setup_insert_vertex,
+    'compiled_vertex_model': setup_compiled_vertex_model,
+    'compiled_insert_vertex': setup_compiled_insert_vertex,
+    'insert_vertex_batch': setup_insert_vertex_batch,
+    'insert_edge': setup_insert_edge,
+    'value_formatter_encode': setup_value_formatter_encode,
+    'parse_properties': setup_parse_properties,
+}
+
+
+def measure(name: str, rows: int, width: int, repeat: int, memory: bool):
+    run = BENCHMARKS[name](rows, width)
+    best, size = None, 0
+    for _ in range(repeat):
+        gc.collect()
+        begin = time.perf_counter()
+        size = run()
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return dict(rows=rows, width=width, seconds=best,
+                rows_per_second=rows / best if best else 0.0,
+                bytes_per_second=size / best if best and size else 0.0,
+                peak_bytes=peak)
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """返回回退项目的说明列表"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if base['rows_per_second'] and current['rows_per_second'] < base['rows_per_second'] * (1 - threshold):
+            regressions.append('{}: rows/s {:.0f} -> {:.0f}'.format(
+                key, base['rows_per_second'], current['rows_per_second']))
+        if base.get('peak_bytes') and current.get('peak_bytes') and \
+                current['peak_bytes'] > base['peak_bytes'] * (1 + threshold):
+            regressions.append('{}: peak memory {} -> {}'.format(key, base['peak_bytes'], current['peak_bytes']))
+    return regressions
+
+
+def save(results: dict, path: str, meta: dict = None):
+    data = dict(results, __meta__=meta) if meta is not None else results
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def _ints(text: str):
+    return [int(i) for i in text.split(',') if i]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ngsm offline benchmarks')
+    parser.add_argument('--rows', type=_ints, default=[1000, 10000, 100000],
+                        help='comma separated row counts, e.g. 1000,100000,10000000')
+    parser.add_argument('--widths', type=_ints, default=[4, 16, 64], help='comma separated property counts')
+    parser.add_argument('--only', default='', help='comma separated benchmark names, default all')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case, the fastest one is reported')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline json file, default benchmarks/baseline.json')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write results to --baseline instead of comparing with it')
+    parser.add_argument('--save', help='also write results to this json file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression, default 0.2')
+    args = parser.parse_args(argv)
+
+    names = [n for n in args.only.split(',') if n] or list(BENCHMARKS.keys())
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(unknown)))
+
+    results = dict()
+    print('{:<24}{:>10}{:>7}{:>14}{:>14}{:>14}'.format('benchmark', 'rows', 'width', 'rows/s', 'MB/s', 'peak MB'))
+    for name in names:
+        for rows in args.rows:
+            for width in args.widths:
+                r = measure(name, rows, width, args.repeat, memory=not args.no_memory)
+                results['{}[rows={},width={}]'.format(name, rows, width)] = r
+                print('{:<24}{:>10}{:>7}{:>14.0f}{:>14.2f}{:>14}'.format(
+                    name, rows, width, r['rows_per_second'], r['bytes_per_second'] / 1e6,
+                    '-' if r['peak_bytes'] is None else '{:.2f}'.format(r['peak_bytes'] / 1e6)))
+
+    if args.save:
+        save(results, args.save)
+    if args.update_baseline:
+        save(results, args.baseline, meta=dict(python=platform.python_version(), platform=platform.platform(),
+                                               argv=sys.argv[1:] if argv is None else argv))
+        return 0
+    if not os.path.exists(args.baseline):
+        print('baseline {} not found, run with --update-baseline to create it'.format(args.baseline))
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for line in regressions:
+        print('REGRESSION', line)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import time
+
+from ngsm.base import NDataTypes
+from ngsm.executor import AsyncPipeline
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import VertexModel
+from ngsm.ngql import Vertex
+
+
+class StandInResult:
+    """模拟 nebula3 ResultSet 的必要接口"""
+
+    def __init__(self, latency_us):
+        self._latency_us = latency_us
+
+    def is_succeeded(self):
+        return True
+
+    def error_msg(self):
+        return ''
+
+    def latency(self):
+        return self._latency_us
+
+
+class StandInSession:
+    """本地替身会话，按语句长度模拟graphd的处理耗时"""
+
+    def execute(self, stmt):
+        latency = len(stmt) / 1e8
+        time.sleep(latency)
+        return StandInResult(latency_us=int(latency * 1e6))
+
+    def release(self):
+        pass
+
+
+TagA = TagSchemaModel(
+    name='A',
+    properties=[
+        PropertySchemaModel(name='name', type=NDataTypes.STRING.value),
+        PropertySchemaModel(name='age', type=NDataTypes.INT.value)
+    ]
+)
+
+vertexes = (VertexModel(vid=i, schema=TagA, properties={'name': 'name-{}'.format(i), 'age': i})
+            for i in range(100000))
+
+pipeline = AsyncPipeline(session_factory=StandInSession, space_name='test', concurrency=8)
+report = pipeline.run_sync(Vertex.iter_insert(schema=TagA, vertexes=vertexes, if_not_exists=False,
+                                              max_bytes=64 * 1024))
+print('statements: {}, failed: {}, {:.1f} stmt/s, {:.1f} MB/s'.format(
+    len(report.results), len(report.failed()),
+    report.statements_per_second(), report.bytes_per_second() / 1024 / 1024))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from ngsm.base import Setting
+
+
+class AdaptiveBatchController:
+    """
+    AIMD方式调整单条插入语句的行数与字节数
+    + 执行成功且耗时不超过 target_latency 时，行数加 rows_step，字节数加 bytes_step（加性增）
+    + 耗时超过 target_latency、超时或RPC错误时行数乘以 decrease_factor；
+      语句过长时行数与字节数都乘以 decrease_factor（乘性减）
+    + 其余错误（如语法错误）与批次大小无关，不做调整
+    + 取值始终在 [min_rows, max_rows]、[min_bytes, max_bytes] 之间，当前值见 rows、bytes 与 snapshot()
+    + observe 可作为 AsyncPipeline 的回调，budget 可作为 Insert.iter_*_statements 的 budget 参数，
+      二者需在同一线程中使用，AsyncPipeline 的回调与语句生成都在事件循环所在的线程中
+    """
+
+    TIMEOUT_KEYWORDS = ('timeout', 'timed out')
+    RPC_KEYWORDS = ('rpc failure', 'rpc error', 'connection')
+    TOO_LONG_KEYWORDS = ('too long', 'too large', 'exceed')
+
+    def __init__(self, initial_rows: int = 512, min_rows: int = 1, max_rows: int = 10000,
+                 min_bytes: int = 64 * 1024, max_bytes: int = None, target_latency: float = 1.0,
+                 rows_step: int = None, bytes_step: int = None, decrease_factor: float = 0.5):
+        max_bytes = int(Setting.max_stmt_length) if max_bytes is None else max_bytes
+        if not 1 <= min_rows <= initial_rows <= max_rows:
+            raise ValueError('require 1 <= min_rows <= initial_rows <= max_rows, got {}, {}, {} instead'.format(
+                min_rows, initial_rows, max_rows))
+        if not 0 < min_bytes <= max_bytes:
+            raise ValueError('require 0 < min_bytes <= max_bytes, got {}, {} instead'.format(min_bytes, max_bytes))
+        if not 0 < decrease_factor < 1:
+            raise ValueError('decrease_factor require 0 < value < 1, got {} instead'.format(decrease_factor))
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.rows_step = rows_step or max(1, initial_rows // 8)
+        self.bytes_step = bytes_step or max(1, max_bytes // 16)
+        self.decrease_factor = decrease_factor
+        self.rows = initial_rows
+        self.bytes = max_bytes
+        self.increases = 0
+        self.decreases = 0
+
+    def budget(self):
+        """(max_bytes, max_rows)，供 Insert.iter_couple_stmts 在每条语句开始时读取"""
+        return self.bytes, self.rows
+
+    def snapshot(self):
+        return dict(rows=self.rows, bytes=self.bytes, increases=self.increases, decreases=self.decreases)
+
+    @classmethod
+    def _matches(cls, error_msg: str, keywords: tuple):
+        error_msg = error_msg.lower()
+        return any([k in error_msg for k in keywords])
+
+    def _increase(self):
+        self.rows = min(self.max_rows, self.rows + self.rows_step)
+        self.bytes = min(self.max_bytes, self.bytes + self.bytes_step)
+        self.increases += 1
+
+    def _decrease(self, shrink_bytes: bool):
+        self.rows = max(self.min_rows, int(self.rows * self.decrease_factor))
+        if shrink_bytes:
+            self.bytes = max(self.min_bytes, int(self.bytes * self.decrease_factor))
+        self.decreases += 1
+
+    def observe(self, result):
+        """根据一个批次的执行结果调整，result 为 ngsm.executor.BatchResult"""
+        if result.succeeded:
+            if result.elapsed > self.target_latency:
+                self._decrease(shrink_bytes=False)
+            else:
+                self._increase()
+        elif self._matches(result.error_msg, self.TOO_LONG_KEYWORDS):
+            self._decrease(shrink_bytes=True)
+        elif self._matches(result.error_msg, self.TIMEOUT_KEYWORDS + self.RPC_KEYWORDS):
+            self._decrease(shrink_bytes=False)
+        return self
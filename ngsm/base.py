@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import datetime
+
 from attr import validators
 
 from ngsm.tool import EnumBase
@@ -229,9 +231,18 @@ class Setting:
     TRUE
     """
 
+    # 为True时构建节点不再逐行检查属性，改为在生成语句时对整批数据检查并汇总全部错误
+    deferred_validation = False
+
     # 单条语句最大长度
     max_stmt_length = 4194304 / 2
 
+    # 行编码器中每个字符串列最多缓存的编码结果数
+    encoder_memo_size = 4096
+
+    # 最多缓存的参数化语句模板数
+    param_template_cache_size = 1024
+
 
 class NDataTypes(EnumBase):
     # 字符串
@@ -271,6 +282,59 @@ class NDataTypes(EnumBase):
             if type_ in NDataTypes.integers() and not isinstance(value, int):
                 raise TypeError('required int but got {} instead'.format(type(value)))
 
+    @classmethod
+    def check_column(cls, values: list, type_, support_null):
+        """按列检查类型，返回首个不满足的行号，全部满足时返回None"""
+        if type_ not in NDataTypes.integers():
+            return None
+        accepted = (int, type(None)) if support_null else int
+        for i, value in enumerate(values):
+            if not isinstance(value, accepted):
+                return i
+        return None
+
+    @classmethod
+    def column_issues(cls, values: list, type_, support_null):
+        """
+        按列完整检查空值与类型，逐个产出 (行号, 原因)
+        整列值的类型都在 NType2ExactTypes 中时只在C层面检查一遍类型与整数范围，不逐个调用检查函数
+        """
+        if cls._column_is_valid(values, type_, support_null):
+            return
+        checker = NType2Checker[type_]
+        for i, value in enumerate(values):
+            if value is None:
+                if not support_null:
+                    yield i, 'got None while defined as not support null'
+                continue
+            reason = checker(value)
+            if reason is not None:
+                yield i, reason
+
+    @classmethod
+    def _column_is_valid(cls, values: list, type_, support_null):
+        types = set(map(type, values))
+        if support_null and type(None) in types:
+            types.discard(type(None))
+            values = [v for v in values if v is not None]
+        if not types:
+            return True
+        if not types <= NType2ExactTypes.get(type_, frozenset()):
+            return False
+        if type_ not in NDataTypes.integers():
+            return True
+        low, high = NType2IntegerRange[type_]
+        return low <= min(values) and max(values) <= high
+
+
+class ConflictPolicy(EnumBase):
+    # 同一实例重复加入时：保留后加入的
+    LAST_WINS = 'LAST_WINS'
+    # 保留先加入的
+    FIRST_WINS = 'FIRST_WINS'
+    # 合并属性，后加入的非空属性覆盖先加入的
+    MERGE = 'MERGE'
+
 
 # Define the validator when pre-defined Nebula-type meet py-type
 NType2Validator = {
@@ -287,6 +351,137 @@ NType2Validator = {
 }
 
 
+def _integer_range(bits: int):
+    return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+
+
+def _integer_checker(bits: int):
+    low, high = _integer_range(bits)
+
+    def _check(value):
+        if type(value) is bool or not isinstance(value, int):
+            return 'required int but got {} instead'.format(type(value))
+        if not low <= value <= high:
+            return '{} is out of range of INT{}'.format(value, bits)
+        return None
+    return _check
+
+
+def _instance_checker(types: tuple, excluded: tuple = ()):
+    def _check(value):
+        if not isinstance(value, types) or isinstance(value, excluded):
+            return 'required {} but got {} instead'.format(' or '.join([t.__name__ for t in types]), type(value))
+        return None
+    return _check
+
+
+# 完整的类型检查，返回不满足的原因，满足时返回None
+NType2Checker = {
+    NDataTypes.INT.value: _integer_checker(64),
+    NDataTypes.INT64.value: _integer_checker(64),
+    NDataTypes.INT32.value: _integer_checker(32),
+    NDataTypes.INT16.value: _integer_checker(16),
+    NDataTypes.INT8.value: _integer_checker(8),
+    NDataTypes.STRING.value: _instance_checker((str,)),
+    NDataTypes.BOOL.value: _instance_checker((bool,)),
+    NDataTypes.FLOAT.value: _instance_checker((float, int), excluded=(bool,)),
+    NDataTypes.DOUBLE.value: _instance_checker((float, int), excluded=(bool,)),
+    NDataTypes.DATE.value: _instance_checker((datetime.date,), excluded=(datetime.datetime,)),
+    NDataTypes.TIME.value: _instance_checker((datetime.time,)),
+    NDataTypes.DATETIME.value: _instance_checker((datetime.datetime,)),
+    NDataTypes.TIMESTAMP.value: _instance_checker((int, datetime.datetime), excluded=(bool,)),
+    NDataTypes.DURATION.value: _instance_checker((datetime.timedelta,)),
+}
+
+# 精确类型（不含子类）属于这些类型的值一定能通过 NType2Checker，整数类型另需满足 NType2IntegerRange
+NType2ExactTypes = {
+    NDataTypes.INT.value: frozenset([int]),
+    NDataTypes.INT64.value: frozenset([int]),
+    NDataTypes.INT32.value: frozenset([int]),
+    NDataTypes.INT16.value: frozenset([int]),
+    NDataTypes.INT8.value: frozenset([int]),
+    NDataTypes.STRING.value: frozenset([str]),
+    NDataTypes.BOOL.value: frozenset([bool]),
+    NDataTypes.FLOAT.value: frozenset([float, int]),
+    NDataTypes.DOUBLE.value: frozenset([float, int]),
+    NDataTypes.DATE.value: frozenset([datetime.date]),
+    NDataTypes.TIME.value: frozenset([datetime.time]),
+    NDataTypes.DATETIME.value: frozenset([datetime.datetime]),
+    NDataTypes.TIMESTAMP.value: frozenset([int, datetime.datetime]),
+    NDataTypes.DURATION.value: frozenset([datetime.timedelta]),
+}
+
+NType2IntegerRange = {
+    NDataTypes.INT.value: _integer_range(64),
+    NDataTypes.INT64.value: _integer_range(64),
+    NDataTypes.INT32.value: _integer_range(32),
+    NDataTypes.INT16.value: _integer_range(16),
+    NDataTypes.INT8.value: _integer_range(8),
+}
+
+
+def _coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        if value.strip().lower() in ('true', 't', 'yes', 'y', '1'):
+            return True
+        if value.strip().lower() in ('false', 'f', 'no', 'n', '0'):
+            return False
+        raise ValueError('can not coerce {!r} into BOOL'.format(value))
+    return bool(value)
+
+
+def _coerce_integer(value):
+    """不接受bool，不截断带小数部分的浮点数"""
+    if isinstance(value, bool):
+        raise ValueError('can not coerce {!r} into integer'.format(value))
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('can not coerce {!r} into integer without truncation'.format(value))
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise ValueError('can not coerce {!r} into integer'.format(value))
+
+
+def _coerce_timestamp(value):
+    return value if isinstance(value, datetime.datetime) else _coerce_integer(value)
+
+
+def _coerce_iso(type_):
+    def _coerce(value):
+        return type_.fromisoformat(value) if isinstance(value, str) else value
+    return _coerce
+
+
+def _coerce_duration(value):
+    if isinstance(value, bool):
+        raise ValueError('can not coerce {!r} into DURATION'.format(value))
+    return datetime.timedelta(seconds=float(value)) if isinstance(value, (str, int, float)) else value
+
+
+# 把文本等外部数据转为属性类型对应的python类型
+NType2Coercer = {
+    NDataTypes.INT.value: _coerce_integer,
+    NDataTypes.INT64.value: _coerce_integer,
+    NDataTypes.INT32.value: _coerce_integer,
+    NDataTypes.INT16.value: _coerce_integer,
+    NDataTypes.INT8.value: _coerce_integer,
+    NDataTypes.STRING.value: str,
+    NDataTypes.BOOL.value: _coerce_bool,
+    NDataTypes.FLOAT.value: float,
+    NDataTypes.DOUBLE.value: float,
+    NDataTypes.DATE.value: _coerce_iso(datetime.date),
+    NDataTypes.TIME.value: _coerce_iso(datetime.time),
+    NDataTypes.DATETIME.value: _coerce_iso(datetime.datetime),
+    NDataTypes.TIMESTAMP.value: _coerce_timestamp,
+    NDataTypes.DURATION.value: _coerce_duration,
+}
+
+
 class Const:
     TAG = 'TAG'
     EDGE = 'EDGE'
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable
+from typing import Iterable
+
+# 当前进程中存活的缓存，写语句生成时通知它们失效
+_caches = weakref.WeakSet()
+
+
+def invalidate_vertices(schema_name: (str, None), vids: Iterable):
+    """
+    使各个缓存中 (schema名称, vid) 对应的节点失效，由 Insert/Update/Delete 等生成节点写语句时调用
+    schema_name 为None时使该vid在所有schema下的节点失效，用于 DELETE VERTEX
+    没有缓存时立即返回，vids 不会被消费
+    """
+    if not _caches:
+        return
+    vids = list(vids)
+    for cache in list(_caches):
+        cache.invalidate(schema_name, vids)
+
+
+def invalidating(schema_name: str, vertexes: Iterable):
+    """惰性消费节点实例的同时使其失效，没有缓存时原样返回"""
+    if not _caches:
+        return vertexes
+    return _invalidating(schema_name, vertexes)
+
+
+def _invalidating(schema_name: str, vertexes: Iterable):
+    for vertex in vertexes:
+        invalidate_vertices(schema_name, (vertex.vid,))
+        yield vertex
+
+
+def _approximate_size(vertex):
+    size = sys.getsizeof(vertex.vid) + sys.getsizeof(vertex.properties)
+    for k, v in vertex.properties.items():
+        size += sys.getsizeof(k) + sys.getsizeof(v)
+    return size
+
+
+class VertexCache:
+    """
+    以 (schema名称, vid) 为键的节点缓存，按最近最少使用淘汰
+    + ttl 秒后过期，为None时不过期；条目数超过 max_entries 或估算的内存超过 max_bytes 时淘汰最久未使用的节点
+    + 同一进程通过 ngsm 生成某个节点的 INSERT/UPDATE/UPSERT/DELETE 语句时，该节点立即失效；
+      DELETE VERTEX 使该vid在所有schema下的节点失效；其他进程的写入不会使缓存失效，只能依赖 ttl
+    + 失效发生在生成语句时而非执行时，失效后 write_grace 秒内不再缓存该节点，
+      避免语句执行前并发的 fetch_vertices 把旧值重新写入缓存；
+      失效前已开始的 fetch_vertices 取回的结果也不会写入缓存
+    + 线程安全；hits、misses、evictions、expirations、invalidations 计数见 stats()
+    """
+
+    def __init__(self, max_entries: int = 100000, max_bytes: int = 256 * 1024 * 1024, ttl: float = 60.0,
+                 clock: Callable = time.monotonic, sizer: Callable = _approximate_size, write_grace: float = 10.0):
+        if max_entries < 1:
+            raise ValueError('max_entries require integer > 0, got {} instead'.format(max_entries))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.sizer = sizer
+        self.write_grace = write_grace
+        # (schema名称, vid) -> (节点, 过期时间, 估算字节数)
+        self._entries = OrderedDict()
+        # vid -> 缓存了该vid的schema名称集合
+        self._schemas_of = dict()
+        # (schema名称或None, vid) -> (失效序号, 禁止缓存的截止时间)，按失效时间排列
+        self._tombstones = OrderedDict()
+        self._generation = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key: tuple):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        schemas = self._schemas_of.get(key[1])
+        if schemas is not None:
+            schemas.discard(key[0])
+            if not schemas:
+                del self._schemas_of[key[1]]
+
+    def generation(self):
+        """当前的失效序号，传给 put 后，此后失效的节点不会被写入"""
+        return self._generation
+
+    def _blocked(self, key: tuple, generation: int, now: float):
+        for tombstone in (self._tombstones.get(key), self._tombstones.get((None, key[1]))):
+            if tombstone is not None and (tombstone[1] > now or (generation is not None and tombstone[0] > generation)):
+                return True
+        return False
+
+    def _prune_tombstones(self, now: float):
+        # 过了 write_grace 的墓碑只对失效前开始的读取有意义，数量超过 max_entries 时丢弃
+        while self._tombstones and len(self._tombstones) > self.max_entries:
+            key, (_, until) = next(iter(self._tombstones.items()))
+            if until > now:
+                break
+            del self._tombstones[key]
+
+    def get(self, schema_name: str, vid):
+        key = (schema_name, vid)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] is not None and entry[1] <= self.clock():
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, vertex, generation: int = None):
+        """写入节点，返回是否写入；节点在 generation 之后或 write_grace 内失效过时不写入"""
+        key = (vertex.schema.name, vertex.vid)
+        size = self.sizer(vertex)
+        now = self.clock()
+        expire_at = None if self.ttl is None else now + self.ttl
+        with self._lock:
+            if self._blocked(key, generation, now):
+                return False
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (vertex, expire_at, size)
+            self._schemas_of.setdefault(key[1], set()).add(key[0])
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, schema_name: (str, None), vids: Iterable):
+        """schema_name 为None时使该vid在所有schema下的节点失效"""
+        now = self.clock()
+        with self._lock:
+            self._generation += 1
+            tombstone = (self._generation, now + self.write_grace)
+            for vid in vids:
+                key = (schema_name, vid)
+                self._tombstones.pop(key, None)
+                self._tombstones[key] = tombstone
+                keys = [key] if schema_name is not None else \
+                    [(name, vid) for name in self._schemas_of.get(vid, ())]
+                for k in keys:
+                    if k in self._entries:
+                        self._pop(k)
+                        self.invalidations += 1
+            self._prune_tombstones(now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._schemas_of.clear()
+            self._tombstones.clear()
+            self._bytes = 0
+
+    def stats(self):
+        return dict(entries=len(self._entries), bytes=self._bytes, hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, expirations=self.expirations, invalidations=self.invalidations)
+
+    def fetch_vertices(self, reader, schema, vids: Iterable, batch_size: int = 1000):
+        """
+        先查缓存，未命中的vid由 reader（ngsm.reader.GraphReader）批量 FETCH 后写入缓存
+        返回 vid -> VertexModel，不存在的节点不在结果中
+        """
+        found, missing = OrderedDict(), []
+        generation = self.generation()
+        for vid in vids:
+            vertex = self.get(schema.name, vid)
+            if vertex is None:
+                missing.append(vid)
+            else:
+                found[vid] = vertex
+        if missing:
+            for vertex in reader.fetch_vertices(schema, missing, batch_size=batch_size):
+                self.put(vertex, generation)
+                found[vertex.vid] = vertex
+        return found
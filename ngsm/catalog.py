@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from types import FunctionType
+from types import MethodType
+from typing import Callable
+from typing import Iterable
+
+from ngsm.base import Const
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import SchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import build_index_name
+
+FORMAT_VERSION = 1
+
+# 属性按位置序列化的字段顺序
+_PROPERTY_FIELDS = ('name', 'type', 'support_null', 'set_default', 'default', 'index', 'display', 'comment')
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def digest(data) -> str:
+    """可序列化为json的数据的sha256摘要，键的顺序不影响结果"""
+    return hashlib.sha256(_dumps(data).encode('utf-8')).hexdigest()
+
+
+def property_to_list(p: PropertySchemaModel):
+    return [getattr(p, name) for name in _PROPERTY_FIELDS]
+
+
+def property_from_list(values: list):
+    """跳过 attrs 的 converter 与 validator，直接还原已校验过的属性定义"""
+    p = object.__new__(PropertySchemaModel)
+    p.__dict__.update(zip(_PROPERTY_FIELDS, values))
+    return p
+
+
+def schema_to_dict(schema: SchemaModel):
+    """
+    schema 的紧凑表示，统一属性只记录名称，复合索引记录属性名称列表
+    index_name_builder 不参与序列化，还原时由调用方给出
+    """
+    data = dict(type=schema.schema_type(),
+                name=schema.name,
+                properties=[property_to_list(p) for p in schema.properties],
+                unified=[p.name for p in schema.unified_properties],
+                compound_indexes=[[p.name for p in ps] for ps in schema.compound_property_indexes],
+                comment=schema.comment,
+                ttl_duration=schema.ttl_duration,
+                ttl_col=schema.ttl_col,
+                index=schema.index,
+                cn_name=schema.cn_name)
+    if isinstance(schema, EdgeSchemaModel):
+        data['binary'] = schema.binary
+    return data
+
+
+def schema_from_dict(data: dict, index_name_builder: (FunctionType, MethodType) = build_index_name):
+    """
+    由 schema_to_dict 的结果还原schema，不再执行 attrs 的 converter、validator 与 __attrs_post_init__
+    只应用于本模块写出且摘要一致的数据
+    """
+    schema_class = TagSchemaModel if data['type'] == Const.TAG else EdgeSchemaModel
+    properties = [property_from_list(values) for values in data['properties']]
+    properties_map = {p.name: p for p in properties}
+    schema = object.__new__(schema_class)
+    schema.__dict__.update(name=data['name'],
+                           properties=properties,
+                           unified_properties=[properties_map[name] for name in data['unified']],
+                           compound_property_indexes=[[properties_map[name] for name in names]
+                                                      for names in data['compound_indexes']],
+                           comment=data['comment'],
+                           ttl_duration=data['ttl_duration'],
+                           ttl_col=data['ttl_col'],
+                           index=data['index'],
+                           cn_name=data['cn_name'],
+                           index_name_builder=index_name_builder,
+                           _index_names=[],
+                           _properties_map=properties_map,
+                           _row_encoder=None,
+                           _compiled_classes=dict())
+    if schema_class is EdgeSchemaModel:
+        schema.binary = data.get('binary', False)
+    return schema
+
+
+class SchemaCatalog:
+    """
+    可持久化的schema目录，以 (schema类型, 名称) 为键
+    + dump() 写出紧凑json及版本摘要 fingerprint，load() 在摘要一致时直接还原schema，跳过 attrs 的校验
+    + fingerprint 由调用方决定：声明的schema内容、发布版本号或 SchemaRegistry.live_fingerprint() 均可
+    + 文件内容另有自身的摘要，文件被截断或修改时视为不存在
+    """
+
+    def __init__(self, schemas: Iterable[SchemaModel] = (), fingerprint: str = None):
+        self.schemas = OrderedDict()
+        for schema in schemas:
+            if not isinstance(schema, (TagSchemaModel, EdgeSchemaModel)):
+                raise TypeError('require TagSchemaModel or EdgeSchemaModel, got {} instead'.format(type(schema)))
+            self.schemas[(schema.schema_type(), schema.name)] = schema
+        self.fingerprint = fingerprint
+
+    def __len__(self):
+        return len(self.schemas)
+
+    def __iter__(self):
+        return iter(self.schemas.values())
+
+    def __repr__(self):
+        return 'SchemaCatalog: {} schemas, fingerprint: {}'.format(len(self.schemas), self.fingerprint)
+
+    def get(self, schema_type: str, name: str):
+        return self.schemas.get((schema_type, name))
+
+    def tag(self, name: str):
+        return self.get(Const.TAG, name)
+
+    def edge(self, name: str):
+        return self.get(Const.EDGE, name)
+
+    def to_dict(self):
+        return dict(format=FORMAT_VERSION, fingerprint=self.fingerprint,
+                    schemas=[schema_to_dict(schema) for schema in self.schemas.values()])
+
+    def content_fingerprint(self):
+        """schema内容的摘要，适合作为由声明的schema生成的目录的 fingerprint"""
+        return digest([schema_to_dict(schema) for schema in self.schemas.values()])
+
+    @classmethod
+    def from_dict(cls, data: dict, index_name_builder: (FunctionType, MethodType) = build_index_name):
+        return cls(schemas=[schema_from_dict(s, index_name_builder) for s in data['schemas']],
+                   fingerprint=data.get('fingerprint'))
+
+    def dump(self, path: str):
+        """先写临时文件再替换，并发启动的进程不会读到写了一半的文件"""
+        data = self.to_dict()
+        data['checksum'] = digest(data['schemas'])
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(_dumps(data))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str = None,
+             index_name_builder: (FunctionType, MethodType) = build_index_name):
+        """
+        文件不存在、无法解析、格式版本或内容摘要不符时返回None
+        给出 fingerprint 时，与文件中记录的不一致也返回None
+        """
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('format') != FORMAT_VERSION:
+            return None
+        if data.get('checksum') != digest(data.get('schemas')):
+            return None
+        if fingerprint is not None and data.get('fingerprint') != fingerprint:
+            return None
+        return cls.from_dict(data, index_name_builder)
+
+    @classmethod
+    def load_or_build(cls, path: str, fingerprint: str, build: Callable,
+                      index_name_builder: (FunctionType, MethodType) = build_index_name):
+        """
+        摘要一致时从文件还原，否则调用 build() 得到schema列表，写出新的目录后返回
+        返回 (目录, 是否来自文件)
+        """
+        catalog = cls.load(path, fingerprint, index_name_builder)
+        if catalog is not None:
+            return catalog, True
+        catalog = cls(schemas=build(), fingerprint=fingerprint)
+        catalog.dump(path)
+        return catalog, False
+
+    @classmethod
+    def load_or_refresh(cls, path: str, registry, version: str = None):
+        """
+        与线上图空间对齐的目录：registry 为 ngsm.registry.SchemaRegistry
+        version 为空时以 registry.live_fingerprint() 为摘要（执行 SHOW 语句并对每个 tag/edge type 执行 DESCRIBE），
+        摘要变化时才重建目录并重写文件，返回 (目录, 是否来自文件)；
+        给出发布版本号时不访问线上，schema变更后必须更换版本号
+        """
+        fingerprint = version or registry.live_fingerprint()
+
+        def _build():
+            return [schema for schema_type in (Const.TAG, Const.EDGE)
+                    for schema in registry.live_schemas(schema_type).values()]
+        return cls.load_or_build(path, fingerprint, _build)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import builtins
+import keyword
+from types import FunctionType
+from types import MethodType
+
+from ngsm.base import Const
+from ngsm.base import NDataTypes
+from ngsm.base import NType2Checker
+from ngsm.base import Setting
+from ngsm.convertor import _STRING_ESCAPES
+from ngsm.model import SchemaModel
+from ngsm.model import build_id
+from ngsm.model import intern_vid
+
+# 生成的类中已被占用的属性名，与之同名的属性无法生成专用类
+RESERVED_NAMES = {
+    Const.TAG: {'vid', 'schema', 'properties', 'to_values', 'values', 'key', 'property_value', 'vid_builder'},
+    Const.EDGE: {'src_vid', 'dst_vid', 'rank', 'schema', 'properties', 'to_values', 'values', 'key',
+                 'property_value'},
+}
+
+# 生成的代码只通过 __ngsm_*__ 形式的名称引用辅助函数与内置函数，构造函数的参数（属性名）不以 __ 开头，
+# 因此不会遮蔽它们；两端都有双下划线的名称也不会被类体改写（name mangling）
+_BUILTINS = ('str', 'int', 'bool', 'float', 'isinstance', 'hash', 'dict', 'zip', 'getattr')
+
+# 属性值为该python类型时直接通过检查，否则交给 NType2Checker 完整检查
+_EXACT_TYPES = dict([(t, 'int') for t in NDataTypes.integers()] + [
+    (NDataTypes.STRING.value, 'str'),
+    (NDataTypes.BOOL.value, 'bool'),
+    (NDataTypes.FLOAT.value, 'float'),
+    (NDataTypes.DOUBLE.value, 'float'),
+    (NDataTypes.TIMESTAMP.value, 'int'),
+])
+
+_INTEGER_BITS = {
+    NDataTypes.INT.value: 64,
+    NDataTypes.INT64.value: 64,
+    NDataTypes.INT32.value: 32,
+    NDataTypes.INT16.value: 16,
+    NDataTypes.INT8.value: 8,
+}
+
+# 编码函数可以内联的类型，{0} 为局部变量名，{1} 为列序号
+# STRING 列的值为 str 时就地编码，不含需转义的字符时跳过较慢的 translate，其余类型仍交给带缓存的编码函数
+_INLINE_FORMATTERS = {
+    NDataTypes.BOOL.value: "('NULL' if {0} is None else 'true' if {0} else 'false')",
+    NDataTypes.STRING.value: "('NULL' if {0} is None else __ngsm_f{1}__({0}) if {0}.__class__ is not __ngsm_str__ "
+                             "else '\"' + {0}.translate(__ngsm_escapes__) + '\"' if '\\\\' in {0} or '\"' in {0} "
+                             "or '\\n' in {0} or '\\r' in {0} else '\"' + {0} + '\"')",
+}
+# TIMESTAMP 也接受 datetime，不能内联为 str
+for _t in NDataTypes.integers() + (NDataTypes.FLOAT.value, NDataTypes.DOUBLE.value):
+    _INLINE_FORMATTERS[_t] = "('NULL' if {0} is None else __ngsm_str__({0}))"
+
+
+def _check_stmt(i: int, name: str, type_: str, support_null: bool):
+    lines = []
+    if not support_null:
+        lines.append('if {0} is None: __ngsm_null__({1})'.format(name, i))
+    exact = _EXACT_TYPES.get(type_)
+    if exact is None:
+        cond = '__ngsm_c{0}__({1}) is not None'.format(i, name)
+    elif type_ in _INTEGER_BITS:
+        bits = _INTEGER_BITS[type_]
+        cond = '({1}.__class__ is not __ngsm_int__ or not {2} <= {1} <= {3}) and ' \
+               '__ngsm_c{0}__({1}) is not None'.format(i, name, -(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+    else:
+        cond = '{1}.__class__ is not __ngsm_{2}__ and __ngsm_c{0}__({1}) is not None'.format(i, name, exact)
+    lines.append('if {0} is not None and {1}: __ngsm_fail__({2}, {0})'.format(name, cond, i))
+    return lines
+
+
+def _checks(schema: SchemaModel, names: list):
+    """names 为各属性在生成代码中的变量名"""
+    checks = []
+    for i, (p, name) in enumerate(zip(schema.properties, names)):
+        checks += _check_stmt(i, name, p.type, p.support_null)
+    if not checks:
+        return []
+    return ['if not __ngsm_setting__.deferred_validation:'] + ['    ' + line for line in checks]
+
+
+def _source(schema: SchemaModel, class_name: str):
+    schema_type = schema.schema_type()
+    names = schema.property_names()
+    # 除构造函数的参数外，生成代码中的局部变量都使用 _p0、_p1 ...，与属性名无关
+    local_names = ['_p{}'.format(i) for i in range(len(names))]
+    params = ''.join([', {}=None'.format(name) for name in names])
+    body = []
+    if schema_type == Const.TAG:
+        head_fields = ('vid',)
+        signature = '__ngsm_self__, vid{}'.format(params)
+        if schema.index:
+            body.append('__ngsm_self__.vid = __ngsm_intern_vid__(__ngsm_vid_builder__('
+                        'schema_name=__ngsm_schema_name__, _str_things=__ngsm_str__(vid)))')
+        else:
+            body.append('__ngsm_self__.vid = None')
+        key = 'self.vid'
+    else:
+        head_fields = ('src_vid', 'dst_vid', 'rank')
+        signature = '__ngsm_self__, src_vid, dst_vid{}, *, rank=0'.format(params)
+        body += ['if src_vid.__class__ is not __ngsm_str__ and not __ngsm_isinstance__(src_vid, (__ngsm_str__, '
+                 '__ngsm_int__)): __ngsm_vid_fail__(src_vid)',
+                 'if dst_vid.__class__ is not __ngsm_str__ and not __ngsm_isinstance__(dst_vid, (__ngsm_str__, '
+                 '__ngsm_int__)): __ngsm_vid_fail__(dst_vid)',
+                 'if rank.__class__ is not __ngsm_int__ and not __ngsm_isinstance__(rank, __ngsm_int__): '
+                 '__ngsm_rank_fail__(rank)',
+                 '__ngsm_self__.src_vid = __ngsm_intern_vid__(src_vid)',
+                 '__ngsm_self__.dst_vid = __ngsm_intern_vid__(dst_vid)',
+                 '__ngsm_self__.rank = rank']
+        key = 'self.src_vid, self.dst_vid, self.rank'
+    body += _checks(schema, names)
+    body += ['__ngsm_self__.{0} = {0}'.format(name) for name in names]
+
+    values = ['self.{}'.format(name) for name in names]
+    # 先把各个slot读到局部变量，内联的编码表达式会多次引用
+    encoded = [_INLINE_FORMATTERS[p.type].format(local, i) if p.type in _INLINE_FORMATTERS
+               else '__ngsm_f{}__({})'.format(i, local) for i, (p, local) in enumerate(zip(schema.properties,
+                                                                                             local_names))]
+    setter = ['if not __ngsm_names_set__.issuperset(value): __ngsm_unknown__(value)']
+    setter += ['{} = value.get({!r})'.format(local, name) for local, name in zip(local_names, names)]
+    setter += _checks(schema, local_names)
+    setter += ['self.{} = {}'.format(name, local) for name, local in zip(names, local_names)]
+    lines = [
+        'class {}:'.format(class_name),
+        '    __slots__ = {!r}'.format(head_fields + tuple(names)),
+        '    __ngsm_compiled__ = True',
+        '    schema = __ngsm_schema__',
+        '    def __init__({}):'.format(signature),
+    ]
+    lines += ['        ' + line for line in body] or ['        pass']
+    lines += [
+        '    def to_values(self):',
+        '        {}, = {},'.format(', '.join(local_names), ', '.join(values)) if names else '        pass',
+        "        return ', '.join(({},))".format(', '.join(encoded)) if encoded else "        return ''",
+        '    def values(self):',
+        '        return ({},)'.format(', '.join(values)) if values else '        return ()',
+        '    @property',
+        '    def properties(self):',
+        '        return __ngsm_dict__(__ngsm_zip__(__ngsm_names__, self.values()))',
+        '    @properties.setter',
+        '    def properties(self, value):',
+    ]
+    lines += ['        ' + line for line in setter]
+    lines += [
+        '    def property_value(self, p_k):',
+        '        return __ngsm_getattr__(self, p_k, None) if p_k in __ngsm_names_set__ else None',
+        '    def key(self):',
+        '        return {}'.format(key),
+        '    def __eq__(self, other):',
+        '        return other.__class__.__qualname__ == self.__class__.__qualname__ and other.schema == self.schema \\',
+        '            and self.key() == other.key()',
+        '    def __ne__(self, other):',
+        '        return not self.__eq__(other)',
+        '    def __hash__(self):',
+        '        return __ngsm_hash__(self.key())',
+        '    def __repr__(self):',
+        "        return '{}({{!r}}, {{!r}})'.format(self.key(), self.properties)".format(class_name),
+        '    def __reduce__(self):',
+        '        return __ngsm_restore__, (__ngsm_schema__, __ngsm_vid_builder__, ({}), self.values())'.format(
+            ', '.join(['self.{}'.format(f) for f in head_fields]) + ','),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def _restore(schema: SchemaModel, vid_builder, head: tuple, values: tuple):
+    """反序列化时不再重新构建vid与检查属性"""
+    cls = schema.compile_class(vid_builder)
+    instance = object.__new__(cls)
+    for name, value in zip(cls.__slots__, head + values):
+        object.__setattr__(instance, name, value)
+    return instance
+
+
+def compile_model_class(schema: SchemaModel, vid_builder: (FunctionType, MethodType) = build_id):
+    """
+    为schema生成专用的实例类，每个属性一个slot，由 SchemaModel.compile_class 调用并缓存
+    + 节点类的构造函数为 (vid, 属性...)，边类为 (src_vid, dst_vid, 属性..., *, rank=0)，属性按schema顺序，缺省为None
+    + 非延迟校验模式下在构造时完整检查空值与类型，与 NType2Checker 一致
+    + to_values() 按schema的列顺序返回编码后的属性值，Insert 生成语句时直接使用
+    """
+    schema_type = schema.schema_type()
+    for name in schema.property_names():
+        if not name.isidentifier() or keyword.iskeyword(name) or name.startswith('__') or \
+                name in RESERVED_NAMES[schema_type]:
+            raise ValueError('property: {} of {} can not be used as an attribute name of compiled class'.format(
+                name, schema.name))
+    class_name = '{}{}'.format(schema.name[:1].upper() + schema.name[1:], 'Vertex' if schema_type == Const.TAG
+                               else 'Edge')
+    if not class_name.isidentifier():
+        class_name = 'Compiled{}'.format('Vertex' if schema_type == Const.TAG else 'Edge')
+    encoder = schema.row_encoder()
+    properties = schema.properties
+
+    def _null(i: int):
+        raise ValueError('{} of {} got None while defined as not support null'.format(properties[i].name,
+                                                                                     schema.name))
+
+    def _fail(i: int, value):
+        reason = NType2Checker[properties[i].type](value)
+        raise TypeError('{} of {}: {}'.format(properties[i].name, schema.name, reason))
+
+    def _vid_fail(value):
+        raise TypeError('vid require str or int, got {} instead'.format(type(value)))
+
+    def _rank_fail(value):
+        raise TypeError('rank require int, got {} instead'.format(type(value)))
+
+    def _unknown(value: dict):
+        unknown = [k for k in value.keys() if k not in schema.property_names()]
+        raise ValueError('property: {} is not defined in schema: {}'.format(unknown[0], schema.name))
+
+    helpers = dict(schema=schema, schema_name=schema.name, vid_builder=vid_builder, intern_vid=intern_vid,
+                   setting=Setting, escapes=_STRING_ESCAPES, names=tuple(schema.property_names()),
+                   names_set=frozenset(schema.property_names()), restore=_restore, null=_null, fail=_fail,
+                   vid_fail=_vid_fail, rank_fail=_rank_fail, unknown=_unknown)
+    helpers.update((name, getattr(builtins, name)) for name in _BUILTINS)
+    for i, p in enumerate(properties):
+        helpers['c{}'.format(i)] = NType2Checker[p.type]
+        helpers['f{}'.format(i)] = encoder.formatters[i]
+    namespace = {'__ngsm_{}__'.format(k): v for k, v in helpers.items()}
+    exec(_source(schema, class_name), namespace)
+    cls = namespace[class_name]
+    cls.__module__ = __name__
+    cls.__qualname__ = class_name
+    return cls
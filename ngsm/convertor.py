@@ -1,29 +1,96 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from collections import OrderedDict
+from operator import methodcaller
+import datetime
+import itertools
+from typing import TYPE_CHECKING
+import sys
 
-from nebula3.data.DataObject import ValueWrapper
-
+from ngsm.base import Const
 from ngsm.base import Setting
 from ngsm.model import SchemaModel
 from ngsm.model import NDataTypes
 from ngsm.tool import upper_division
 from ngsm.tool import uniform_distribute
 
+if TYPE_CHECKING:
+    from nebula3.data.DataObject import ValueWrapper
+
+
+# nGQL 双引号字符串中需要转义的字符
+_STRING_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r'})
+
+
+def _format_string(value):
+    value = str(value)
+    # translate 逐字符查表，多数字符串不含需转义的字符，先检查可省去
+    if '\\' in value or '"' in value or '\n' in value or '\r' in value:
+        value = value.translate(_STRING_ESCAPES)
+    return '"{}"'.format(value)
+
+
+def _naive_utc(value: datetime.datetime):
+    # 带时区的时间先转为UTC，Nebula的时间字面量不带时区
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _format_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return 'timestamp("{}")'.format(_naive_utc(value).replace(microsecond=0).isoformat())
+    return str(value)
+
+
+def _format_duration(value: datetime.timedelta):
+    return 'duration({{days: {}, seconds: {}, microseconds: {}}})'.format(value.days, value.seconds,
+                                                                         value.microseconds)
+
+
+def _parse_date(value: 'ValueWrapper'):
+    date = value.as_date()
+    return datetime.date(date.get_year(), date.get_month(), date.get_day())
+
+
+def _parse_time(value: 'ValueWrapper'):
+    # graphd 返回UTC时间，与编码时一样不带时区
+    time = value.as_time()
+    return datetime.time(time.get_hour(), time.get_minute(), time.get_sec(), time.get_microsec())
+
+
+def _parse_datetime(value: 'ValueWrapper'):
+    dt = value.as_datetime()
+    return datetime.datetime(dt.get_year(), dt.get_month(), dt.get_day(), dt.get_hour(), dt.get_minute(),
+                             dt.get_sec(), dt.get_microsec())
+
+
+def _parse_duration(value: 'ValueWrapper'):
+    duration = value.as_duration()
+    if duration.get_months():
+        # 月的长度不固定，无法转为 timedelta
+        raise ValueError('can not parse DURATION with months: {} into timedelta'.format(duration.get_months()))
+    return datetime.timedelta(seconds=duration.get_seconds(), microseconds=duration.get_microseconds())
+
 
 class ValueFormatter:
 
+    # 按方法名调用，只生成语句时不需要导入 nebula3
     ValueWrapper2Parser = {
-        NDataTypes.INT.value: ValueWrapper.as_int,
-        NDataTypes.INT8.value: ValueWrapper.as_int,
-        NDataTypes.INT16.value: ValueWrapper.as_int,
-        NDataTypes.INT32.value: ValueWrapper.as_int,
-        NDataTypes.INT64.value: ValueWrapper.as_int,
-        NDataTypes.STRING.value: ValueWrapper.as_string,
-        NDataTypes.BOOL.value: ValueWrapper.as_bool,
-        NDataTypes.FLOAT.value: ValueWrapper.as_double,
-        NDataTypes.DOUBLE.value: ValueWrapper.as_double,
-        NDataTypes.TIMESTAMP.value: ValueWrapper.as_int  # todo: use ValueWrapper.as_time
+        NDataTypes.INT.value: methodcaller('as_int'),
+        NDataTypes.INT8.value: methodcaller('as_int'),
+        NDataTypes.INT16.value: methodcaller('as_int'),
+        NDataTypes.INT32.value: methodcaller('as_int'),
+        NDataTypes.INT64.value: methodcaller('as_int'),
+        NDataTypes.STRING.value: methodcaller('as_string'),
+        NDataTypes.BOOL.value: methodcaller('as_bool'),
+        NDataTypes.FLOAT.value: methodcaller('as_double'),
+        NDataTypes.DOUBLE.value: methodcaller('as_double'),
+        NDataTypes.TIMESTAMP.value: methodcaller('as_int'),  # todo: use ValueWrapper.as_time
+        NDataTypes.DATE.value: _parse_date,
+        NDataTypes.TIME.value: _parse_time,
+        NDataTypes.DATETIME.value: _parse_datetime,
+        NDataTypes.DURATION.value: _parse_duration,
     }
 
     Value2Formatter = {
@@ -32,15 +99,19 @@ class ValueFormatter:
         NDataTypes.INT16.value: str,
         NDataTypes.INT32.value: str,
         NDataTypes.INT64.value: str,
-        NDataTypes.STRING.value: lambda x: '\"{}\"'.format(str(x)),
+        NDataTypes.STRING.value: _format_string,
         NDataTypes.BOOL.value: lambda x: 'true' if x else 'false',
         NDataTypes.FLOAT.value: str,
         NDataTypes.DOUBLE.value: str,
-        NDataTypes.TIMESTAMP.value: str
+        NDataTypes.TIMESTAMP.value: _format_timestamp,
+        NDataTypes.DATE.value: lambda x: 'date("{}")'.format(x.isoformat()),
+        NDataTypes.TIME.value: lambda x: 'time("{}")'.format(x.replace(tzinfo=None).isoformat()),
+        NDataTypes.DATETIME.value: lambda x: 'datetime("{}")'.format(_naive_utc(x).isoformat()),
+        NDataTypes.DURATION.value: _format_duration,
     }
 
     @classmethod
-    def _parse_value_wrapper(cls, v: ValueWrapper, dt, support_null: bool = True):
+    def _parse_value_wrapper(cls, v: 'ValueWrapper', dt, support_null: bool = True):
         if support_null:
             if v.is_null():
                 return None
@@ -50,21 +121,21 @@ class ValueFormatter:
         return cls.ValueWrapper2Parser[dt](v)
 
     @classmethod
-    def is_null(cls, g_value: ValueWrapper):
+    def is_null(cls, g_value: 'ValueWrapper'):
         return g_value.is_null()
 
     @classmethod
-    def parse(cls, d_t, g_value: ValueWrapper, support_null: bool = True):
+    def parse(cls, d_t, g_value: 'ValueWrapper', support_null: bool = True):
         # 从图数据库中获取的ValueWrapper转py数据类型
         return cls._parse_value_wrapper(dt=d_t, v=g_value, support_null=support_null)
 
     @classmethod
-    def parse_from_string(cls, g_value: ValueWrapper, support_null: bool = True):
+    def parse_from_string(cls, g_value: 'ValueWrapper', support_null: bool = True):
         """常用解码函数"""
         return cls._parse_value_wrapper(dt=NDataTypes.STRING.value, v=g_value, support_null=support_null)
 
     @classmethod
-    def parse_from_int(cls, g_value: ValueWrapper, support_null: bool = True):
+    def parse_from_int(cls, g_value: 'ValueWrapper', support_null: bool = True):
         """常用解码函数"""
         return cls._parse_value_wrapper(dt=NDataTypes.INT.value, v=g_value, support_null=support_null)
 
@@ -86,7 +157,7 @@ class ValueFormatter:
         return cls.encode(d_t=NDataTypes.INT.value, py_value=py_value)
 
     @classmethod
-    def parse_vid(cls, g_vid: ValueWrapper, vid_type_is_fixed_string: bool = True):
+    def parse_vid(cls, g_vid: 'ValueWrapper', vid_type_is_fixed_string: bool = True):
         if vid_type_is_fixed_string:
             return g_vid.as_string()
         else:
@@ -128,6 +199,11 @@ class ValueFormatter:
     def encode_properties(cls, prop: dict, schema: SchemaModel):
         return {k: cls.encode(d_t=schema.property_type(k), py_value=v) for k, v in prop.items()}
 
+    @classmethod
+    def decoder(cls, result, schema: SchemaModel, column_properties: dict = None):
+        """按列解码整个结果集，见 ColumnDecoder"""
+        return ColumnDecoder(result=result, schema=schema, column_properties=column_properties)
+
     @classmethod
     def parse_properties(cls, prop: dict, schema: SchemaModel, for_display=True, with_order=True):
         """转化节点或边属性"""
@@ -144,12 +220,245 @@ class ValueFormatter:
         return result
 
 
+class ColumnDecoder:
+    """
+    按列解码查询结果：每个结果集只根据schema构建一次解析计划
+    + result 需提供 keys()、column_values(key)、row_size()、row_values(index)，即 nebula3 的 ResultSet
+    + column_properties 指定结果集列名到属性名的映射，默认列名即属性名，形如 'A.p1' 的列名取最后一段
+    + 未能映射到schema属性的列不参与解码
+    """
+
+    NumpyDtypes = {
+        NDataTypes.INT.value: 'int64',
+        NDataTypes.INT8.value: 'int64',
+        NDataTypes.INT16.value: 'int64',
+        NDataTypes.INT32.value: 'int64',
+        NDataTypes.INT64.value: 'int64',
+        NDataTypes.TIMESTAMP.value: 'int64',
+        NDataTypes.BOOL.value: 'bool',
+        NDataTypes.FLOAT.value: 'float64',
+        NDataTypes.DOUBLE.value: 'float64',
+    }
+
+    def __init__(self, result, schema: SchemaModel, column_properties: dict = None):
+        self.result = result
+        self.schema = schema
+        self.keys = list(result.keys())
+        # 列名 -> (列序号, 属性名, 解析函数, 是否支持空值)
+        self.plan = OrderedDict()
+        column_properties = column_properties or dict()
+        property_names = set(schema.property_names())
+        for i, key in enumerate(self.keys):
+            p_name = column_properties.get(key, key.rsplit('.', 1)[-1])
+            if p_name not in property_names:
+                continue
+            d_t = schema.property_type(p_name)
+            self.plan[key] = (i, p_name, ValueFormatter.ValueWrapper2Parser.get(d_t),
+                              schema.property_support_null(p_name))
+
+    def _plan_of(self, key):
+        if key not in self.plan:
+            raise ValueError('column: {} is not mapped to any property of schema: {}'.format(key, self.schema.name))
+        index, p_name, parser, support_null = self.plan[key]
+        if parser is None:
+            raise ValueError('not support parse {} yet'.format(self.schema.property_type(p_name)))
+        return index, p_name, parser, support_null
+
+    def decode_value(self, key, g_value: 'ValueWrapper'):
+        _, _, parser, support_null = self._plan_of(key)
+        if support_null and g_value.is_null():
+            return None
+        return parser(g_value)
+
+    def column(self, key):
+        """解码整列为python列表"""
+        _, _, parser, support_null = self._plan_of(key)
+        values = self.result.column_values(key)
+        if support_null:
+            return [None if v.is_null() else parser(v) for v in values]
+        return [parser(v) for v in values]
+
+    def columns(self, keys: list = None, by_property: bool = False):
+        """解码多列，默认为全部可映射的列；by_property 为真时以属性名为键"""
+        keys = list(self.plan.keys()) if keys is None else keys
+        return OrderedDict((self.plan[k][1] if by_property else k, self.column(k)) for k in keys)
+
+    def numpy_column(self, key):
+        """
+        解码整列为NumPy数组，返回 (数组, 空值掩码)，空值位置以0/False填充
+        数值与布尔列由解析结果直接填入定长数组，不经过中间的python列表
+        """
+        import numpy
+        _, p_name, parser, support_null = self._plan_of(key)
+        dtype = self.NumpyDtypes.get(self.schema.property_type(p_name), 'object')
+        values = self.result.column_values(key)
+        count = len(values)
+        if support_null:
+            mask = numpy.fromiter((v.is_null() for v in values), dtype='bool', count=count)
+        else:
+            mask = numpy.zeros(count, dtype='bool')
+        if not mask.any():
+            parsed = map(parser, values)
+        elif dtype == 'object':
+            parsed = (None if null else parser(v) for v, null in zip(values, mask.tolist()))
+        else:
+            fill = False if dtype == 'bool' else 0
+            parsed = (fill if null else parser(v) for v, null in zip(values, mask.tolist()))
+        return numpy.fromiter(parsed, dtype=dtype, count=count), mask
+
+    def numpy_columns(self, keys: list = None, by_property: bool = False):
+        keys = list(self.plan.keys()) if keys is None else keys
+        return OrderedDict((self.plan[k][1] if by_property else k, self.numpy_column(k)) for k in keys)
+
+    def iter_rows(self):
+        """逐行惰性解码，只有被访问的列才会解码"""
+        for i in range(self.result.row_size()):
+            yield LazyRow(decoder=self, values=self.result.row_values(i))
+
+
+class LazyRow:
+    """惰性解码的结果行，按列名访问，解码结果会被缓存"""
+
+    __slots__ = ('_decoder', '_values', '_decoded')
+
+    def __init__(self, decoder: ColumnDecoder, values: list):
+        self._decoder = decoder
+        self._values = values
+        self._decoded = dict()
+
+    def __getitem__(self, key):
+        if key not in self._decoded:
+            index = self._decoder._plan_of(key)[0]
+            self._decoded[key] = self._decoder.decode_value(key, self._values[index])
+        return self._decoded[key]
+
+    def get(self, key, default=None):
+        return self[key] if key in self._decoder.plan else default
+
+    def keys(self):
+        return list(self._decoder.plan.keys())
+
+    def to_dict(self, by_property: bool = False):
+        plan = self._decoder.plan
+        return OrderedDict((plan[k][1] if by_property else k, self[k]) for k in plan.keys())
+
+
+class RowEncoder:
+    """
+    按schema编译的行编码器：固定的列顺序、预先生成的语句头、逐列的编码函数
+    由 SchemaModel.row_encoder 惰性创建并缓存，编译后不应再修改schema的属性
+    """
+
+    Headers = {
+        Const.TAG: 'Insert VERTEX{0}{1}({2}) VALUES ',
+        Const.EDGE: 'Insert Edge{0}{1}({2}) VALUES ',
+    }
+    HeaderColumnSplitters = {
+        Const.TAG: ', ',
+        Const.EDGE: ',',
+    }
+
+    def __init__(self, schema: SchemaModel):
+        self.schema_name = schema.name
+        self.columns = tuple(schema.property_names())
+        self.types = tuple(p.type for p in schema.properties)
+        self.formatters = tuple(self.column_formatter(p.type) for p in schema.properties)
+        self.column_formatters = dict(zip(self.columns, self.formatters))
+        self._headers = {
+            if_not_exists: self.Headers[schema.schema_type()].format(
+                ' IF NOT EXISTS ' if if_not_exists else ' ',
+                schema.name,
+                self.HeaderColumnSplitters[schema.schema_type()].join(self.columns)
+            )
+            for if_not_exists in (True, False)
+        }
+
+    @classmethod
+    def column_formatter(cls, d_t):
+        """单列编码函数，空值编码为NULL"""
+        formatter = ValueFormatter.Value2Formatter.get(d_t)
+        if formatter is None:
+            def _unsupported(value):
+                if value is None:
+                    return 'NULL'
+                raise ValueError('{} is not support to encode yet'.format(d_t))
+            return _unsupported
+        if d_t == NDataTypes.STRING.value:
+            return cls._memoized(formatter, max_size=Setting.encoder_memo_size)
+
+        def _format(value):
+            return 'NULL' if value is None else formatter(value)
+        return _format
+
+    @classmethod
+    def _memoized(cls, formatter, max_size: int):
+        """
+        低基数字符串列的编码结果缓存并驻留，缓存满后不再新增
+        以 (类型, 值) 为键，1、True、1.0 相等但编码结果不同
+        """
+        memo = dict()
+
+        def _format(value):
+            if value is None:
+                return 'NULL'
+            key = (value.__class__, value)
+            encoded = memo.get(key)
+            if encoded is None:
+                encoded = formatter(value)
+                if len(memo) < max_size:
+                    encoded = memo[key] = sys.intern(encoded)
+            return encoded
+        return _format
+
+    def header(self, if_not_exists: bool):
+        return self._headers[bool(if_not_exists)]
+
+    def encode_values(self, values: tuple):
+        """编码按列顺序给出的属性值"""
+        return ', '.join([f(v) for f, v in zip(self.formatters, values)])
+
+    def encode_columns(self, columns: list, size: int):
+        """
+        编码按列顺序给出的整列属性值，产出每行的编码结果
+        逐列用 map 编码后按行拼接，不含空值的列直接使用类型的编码函数
+        """
+        if not columns:
+            return itertools.repeat('', size)
+        encoded = []
+        for type_, formatter, column in zip(self.types, self.formatters, columns):
+            raw = ValueFormatter.Value2Formatter.get(type_)
+            if raw is not None and type_ != NDataTypes.STRING.value and None not in column:
+                formatter = raw
+            encoded.append(map(formatter, column))
+        return map(', '.join, zip(*encoded))
+
+    def encode_assignments(self, properties: dict):
+        """编码 UPDATE/UPSERT 的SET子句"""
+        assignments = []
+        for k, v in properties.items():
+            formatter = self.column_formatters.get(k)
+            if formatter is None:
+                raise ValueError('property: {} is not defined in schema: {}'.format(k, self.schema_name))
+            assignments.append('{} = {}'.format(k, formatter(v)))
+        return ', '.join(assignments)
+
+    def encode_properties(self, properties: dict):
+        """编码属性字典，缺失的属性编码为NULL"""
+        get = properties.get
+        return ', '.join([f(get(c)) for f, c in zip(self.formatters, self.columns)])
+
+
 class StmtFormatter:
 
+    @classmethod
+    def byte_length(cls, stmt_part: str):
+        """语句片段按UTF-8编码后的字节数，Nebula以字节计算语句长度"""
+        return len(stmt_part.encode('utf-8'))
+
     @classmethod
     def parts_should_split_of_stmt(cls, fix_part: str, multi_part: list):
         """返回应该将过长的语句均分的份数"""
-        return upper_division(len(fix_part) + sum([len(part) for part in multi_part]),
+        return upper_division(cls.byte_length(fix_part) + sum([cls.byte_length(part) for part in multi_part]),
                               Setting.max_stmt_length)
 
     @classmethod
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from typing import Iterable
+from typing import List
+
+import attr
+
+from ngsm import metrics
+from ngsm.convertor import StmtFormatter
+from ngsm.ngql import Space
+
+
+def flatten_statements(*outputs):
+    """展开 Vertex.insert/Edge.insert 等返回的语句（单条字符串、列表或None）"""
+    for output in outputs:
+        if not output:
+            continue
+        if isinstance(output, str):
+            yield output
+        else:
+            for stmt in output:
+                yield stmt
+
+
+@attr.s
+class BatchResult:
+    """单条语句（一个批次）的执行结果"""
+    batch_id = attr.ib(type=int)
+    # 语句的UTF-8字节数
+    stmt_bytes = attr.ib(type=int)
+    succeeded = attr.ib(type=bool)
+    error_msg = attr.ib(type=str, default='')
+    # 服务端处理耗时，单位微秒
+    server_latency_us = attr.ib(type=int, default=0)
+    # 客户端观测到的耗时，单位秒
+    elapsed = attr.ib(type=float, default=0.0)
+    # 执行该批次的worker序号
+    worker = attr.ib(type=int, default=0)
+    # 语句在输入中的偏移，见 AsyncPipeline.run
+    offset = attr.ib(type=int, default=None)
+
+
+@attr.s
+class PipelineReport:
+    """一次导入的汇总结果"""
+    results = attr.ib(type=List[BatchResult], factory=list)
+    elapsed = attr.ib(type=float, default=0.0)
+    # 根据断点续传日志跳过的批次数
+    skipped = attr.ib(type=int, default=0)
+
+    def succeeded(self):
+        return [r for r in self.results if r.succeeded]
+
+    def failed(self):
+        return [r for r in self.results if not r.succeeded]
+
+    def total_bytes(self):
+        return sum([r.stmt_bytes for r in self.results])
+
+    def statements_per_second(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    def bytes_per_second(self):
+        return self.total_bytes() / self.elapsed if self.elapsed else 0.0
+
+
+class AsyncPipeline:
+    """
+    异步导入管道：语句经有界队列分发给多个会话并发执行
+    + session_factory 无参调用返回会话对象，需提供 execute(stmt) 与 release()，
+      execute 返回的结果需提供 is_succeeded()、error_msg()、latency()，与 nebula3 的 ResultSet 一致，
+      因此可以用本地的替身对象代替 graphd 进行测试
+    + nebula3 的同步调用在线程池中执行，每个worker独占一个会话，并缓存该会话当前所在的图空间
+    + 队列中与执行中的语句总数不超过 max_in_flight，生成语句的速度超过执行速度时会被阻塞
+    + 配置 journal（ngsm.journal.CheckpointJournal）与 job 后，执行成功的批次号被记录下来，
+      重新执行同样的语句序列时跳过已完成的批次
+    + 配置 controller（ngsm.adaptive.AdaptiveBatchController）后，每个批次的结果都交给它调整批次大小，
+      生成语句时把 controller.budget 作为 budget 参数传入 Insert.iter_*_statements 即可生效；
+      批次大小随执行结果变化，同样的输入重新执行时批次边界不同，因此不能与 journal 同时使用
+    + on_result、journal、controller 或 metrics sink 抛出异常时停止分发新的语句，等待在途语句结束后由 run 重新抛出该异常
+    """
+
+    def __init__(self, session_factory: Callable, space_name: str, concurrency: int = 4,
+                 max_in_flight: int = None, on_result: Callable = None, stop_on_error: bool = False,
+                 journal=None, job: str = None, controller=None):
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise ValueError('concurrency require integer > 0, got {} instead'.format(concurrency))
+        max_in_flight = concurrency * 2 if max_in_flight is None else max_in_flight
+        if max_in_flight < concurrency:
+            raise ValueError('max_in_flight require >= concurrency, got {} instead'.format(max_in_flight))
+        self.session_factory = session_factory
+        self.space_name = space_name
+        self.concurrency = concurrency
+        self.max_in_flight = max_in_flight
+        self.on_result = on_result
+        self.stop_on_error = stop_on_error
+        if journal is not None and not job:
+            raise ValueError('job is required when journal is given')
+        if journal is not None and controller is not None:
+            raise ValueError('journal can not be used with controller, batch boundaries are not deterministic')
+        self.journal = journal
+        self.job = job
+        self.controller = controller
+
+    @classmethod
+    def from_connection_pool(cls, pool, user_name: str, password: str, space_name: str, **kwargs):
+        """基于 nebula3 ConnectionPool 创建管道"""
+        return cls(session_factory=lambda: pool.get_session(user_name, password), space_name=space_name, **kwargs)
+
+    def run_sync(self, statements: Iterable[str]):
+        return asyncio.run(self.run(statements))
+
+    async def run(self, statements: Iterable[str]):
+        """
+        执行全部语句，批次号为语句序号
+        statements 的元素也可以是 (输入偏移, 语句)，偏移随 BatchResult 返回并写入断点续传日志
+        """
+        loop = asyncio.get_running_loop()
+        # 队列容量扣除正在执行的语句，使在途语句总数不超过 max_in_flight
+        queue = asyncio.Queue(maxsize=max(1, self.max_in_flight - self.concurrency))
+        report = PipelineReport()
+        completed = self.journal.completed(self.job) if self.journal is not None else set()
+        stopped = asyncio.Event()
+        # 回调中抛出的异常，全部worker退出后重新抛出
+        errors = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='ngsm-executor') as pool:
+            workers = [asyncio.ensure_future(self._worker(i, queue, report, stopped, errors, loop, pool))
+                       for i in range(self.concurrency)]
+            try:
+                for batch_id, stmt in enumerate(statements):
+                    if stopped.is_set():
+                        break
+                    if batch_id in completed:
+                        report.skipped += 1
+                        continue
+                    await queue.put((batch_id, stmt))
+                    # 让出事件循环，避免生成语句时长时间占用
+                    await asyncio.sleep(0)
+            finally:
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+        if errors:
+            raise errors[0]
+        report.elapsed = time.perf_counter() - start
+        report.results.sort(key=lambda r: r.batch_id)
+        return report
+
+    async def _worker(self, index: int, queue: asyncio.Queue, report: PipelineReport,
+                      stopped: asyncio.Event, errors: list, loop, pool: ThreadPoolExecutor):
+        session, current_space = None, None
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if stopped.is_set():
+                    continue
+                batch_id, stmt = item
+                offset = None
+                if not isinstance(stmt, str):
+                    offset, stmt = stmt
+                begin = time.perf_counter()
+                sink = metrics.get_sink()
+                labels = dict(space=self.space_name, schema=metrics.statement_schema(stmt)) if sink.enabled else dict()
+                try:
+                    if session is None:
+                        session = await loop.run_in_executor(pool, self.session_factory)
+                    if current_space != self.space_name:
+                        await self._use_space(session, loop, pool)
+                        current_space = self.space_name
+                    with sink.span('ngsm_execute', **labels):
+                        result = await loop.run_in_executor(pool, session.execute, stmt)
+                    batch_result = BatchResult(batch_id=batch_id,
+                                               stmt_bytes=StmtFormatter.byte_length(stmt),
+                                               succeeded=result.is_succeeded(),
+                                               error_msg='' if result.is_succeeded() else result.error_msg(),
+                                               server_latency_us=result.latency() or 0,
+                                               elapsed=time.perf_counter() - begin,
+                                               worker=index, offset=offset)
+                except Exception as e:
+                    batch_result = BatchResult(batch_id=batch_id,
+                                               stmt_bytes=StmtFormatter.byte_length(stmt),
+                                               succeeded=False, error_msg=str(e),
+                                               elapsed=time.perf_counter() - begin, worker=index,
+                                               offset=offset)
+                report.results.append(batch_result)
+                try:
+                    self._notify(batch_result, sink, labels)
+                except Exception as e:
+                    # worker继续消费队列直到收到结束标记，生产者不会阻塞在 queue.put 上
+                    errors.append(e)
+                    stopped.set()
+                if self.stop_on_error and not batch_result.succeeded:
+                    stopped.set()
+        finally:
+            if session is not None:
+                await loop.run_in_executor(pool, session.release)
+
+    def _notify(self, batch_result: BatchResult, sink, labels: dict):
+        if sink.enabled:
+            sink.counter('ngsm_batches_total', status='ok' if batch_result.succeeded else 'failed', **labels)
+            sink.counter('ngsm_executed_bytes_total', batch_result.stmt_bytes, **labels)
+            if batch_result.succeeded:
+                sink.observe('ngsm_server_latency_seconds', batch_result.server_latency_us / 1e6, **labels)
+        if self.journal is not None and batch_result.succeeded:
+            self.journal.record(self.job, batch_result.batch_id, batch_result.offset)
+        if self.controller is not None:
+            self.controller.observe(batch_result)
+        if self.on_result is not None:
+            self.on_result(batch_result)
+
+    async def _use_space(self, session, loop, pool: ThreadPoolExecutor):
+        result = await loop.run_in_executor(pool, session.execute, Space.use(self.space_name))
+        if not result.is_succeeded():
+            raise RuntimeError('failed to use space {}: {}'.format(self.space_name, result.error_msg()))
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import csv
+import json
+import mmap
+import os
+import time
+from itertools import islice
+from typing import Callable
+from typing import Iterable
+
+from ngsm import cache
+from ngsm.base import NDataTypes
+from ngsm.base import NType2Checker
+from ngsm.base import NType2Coercer
+from ngsm.convertor import StmtFormatter
+from ngsm.loader import ShardResult
+from ngsm.model import EdgeBatch
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import SchemaModel
+from ngsm.model import VertexBatch
+from ngsm.model import build_id
+from ngsm.ngql import Insert
+from ngsm.ngql import Space
+
+
+def read_csv(path: str, delimiter: str = ',', encoding: str = 'utf-8', fieldnames: list = None):
+    """逐行读取带表头的CSV文件，产出 列名 -> 文本 的字典"""
+    with open(path, newline='', encoding=encoding) as f:
+        for record in csv.DictReader(f, delimiter=delimiter, fieldnames=fieldnames):
+            yield record
+
+
+def read_jsonl(path: str, encoding: str = 'utf-8'):
+    """逐行读取JSONL文件，跳过空行"""
+    with open(path, encoding=encoding) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_parquet(path: str, batch_size: int = 10000, columns: list = None):
+    """按批读取Parquet文件，需要安装 pyarrow"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('reading parquet requires pyarrow, install it by: pip install pyarrow') from e
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+        for record in batch.to_pylist():
+            yield record
+
+
+class SchemaImporter:
+    """
+    把外部数据流按块映射到 TagSchemaModel/EdgeSchemaModel，内存占用只与 chunk_size 有关
+    + column_map 指定 属性名 -> 源数据列名，默认同名；源数据中缺失的列视为空值
+    + 按属性类型转换取值，非STRING属性的空字符串视为空值
+    + 产出的语句可直接交给 ngsm.executor.AsyncPipeline 执行
+    """
+
+    def __init__(self, schema: (TagSchemaModel, EdgeSchemaModel), column_map: dict = None, chunk_size: int = 10000,
+                 vid_column: str = 'vid', src_column: str = 'src', dst_column: str = 'dst', rank_column: str = None):
+        if not isinstance(schema, (TagSchemaModel, EdgeSchemaModel)):
+            raise TypeError('require TagSchemaModel or EdgeSchemaModel, got {} instead'.format(type(schema)))
+        if chunk_size < 1:
+            raise ValueError('chunk_size require integer > 0, got {} instead'.format(chunk_size))
+        self.schema = schema
+        self.column_map = column_map or dict()
+        for name in self.column_map.keys():
+            schema.property_type(name)
+        self.chunk_size = chunk_size
+        self.vid_column = vid_column
+        self.src_column = src_column
+        self.dst_column = dst_column
+        self.rank_column = rank_column
+
+    def _coerce_column(self, p_name: str, records: list, offset: int):
+        source = self.column_map.get(p_name, p_name)
+        type_ = self.schema.property_type(p_name)
+        coerce = NType2Coercer[type_]
+        values = []
+        for i, record in enumerate(records):
+            value = record.get(source)
+            if value is None or (value == '' and type_ != NDataTypes.STRING.value):
+                values.append(None)
+                continue
+            try:
+                values.append(coerce(value))
+            except (TypeError, ValueError) as e:
+                raise ValueError('can not coerce {!r} of column {} at record {} into {}: {}'.format(
+                    value, source, offset + i, type_, e)) from e
+        return values
+
+    def _batch(self, records: list, offset: int):
+        columns = {name: self._coerce_column(name, records, offset) for name in self.schema.property_names()}
+        if isinstance(self.schema, TagSchemaModel):
+            return VertexBatch(schema=self.schema, vids=[r[self.vid_column] for r in records], columns=columns)
+        return EdgeBatch(schema=self.schema,
+                         src_vids=[r[self.src_column] for r in records],
+                         dst_vids=[r[self.dst_column] for r in records],
+                         ranks=None if self.rank_column is None else
+                         [int(r.get(self.rank_column) or 0) for r in records],
+                         columns=columns)
+
+    def batches(self, records: Iterable[dict]):
+        """按 chunk_size 产出 VertexBatch/EdgeBatch"""
+        records, offset = iter(records), 0
+        chunk = list(islice(records, self.chunk_size))
+        while chunk:
+            yield self._batch(chunk, offset)
+            offset += len(chunk)
+            chunk = list(islice(records, self.chunk_size))
+
+    def statements(self, records: Iterable[dict], if_not_exists: bool = False,
+                   max_bytes: int = None, max_rows: int = None):
+        """产出不超过字节预算的插入语句"""
+        iter_statements = Insert.iter_vertex_batch_statements if isinstance(self.schema, TagSchemaModel) \
+            else Insert.iter_edge_batch_statements
+        for batch in self.batches(records):
+            for stmt in iter_statements(batch=batch, if_not_exists=if_not_exists,
+                                        max_bytes=max_bytes, max_rows=max_rows):
+                yield stmt
+
+    def csv_statements(self, path: str, delimiter: str = ',', encoding: str = 'utf-8', **kwargs):
+        return self.statements(read_csv(path, delimiter=delimiter, encoding=encoding), **kwargs)
+
+    def jsonl_statements(self, path: str, encoding: str = 'utf-8', **kwargs):
+        return self.statements(read_jsonl(path, encoding=encoding), **kwargs)
+
+    def parquet_statements(self, path: str, **kwargs):
+        return self.statements(read_parquet(path, batch_size=self.chunk_size), **kwargs)
+
+
+class MmapCsvReader:
+    """
+    内存映射读取CSV，把文件按行边界切分为字节区间供多个进程并行处理，
+    字段切片按列序号直接交给schema的行编码器，不构建逐行的字典
+    + 只支持不带引号的简单CSV，字段中不能包含分隔符或换行
+    + 首行为表头；schema属性通过 column_map（属性名 -> 列名，默认同名）对应到列
+    """
+
+    def __init__(self, path: str, delimiter: str = ',', encoding: str = 'utf-8'):
+        self.path = path
+        self.delimiter = delimiter.encode(encoding)
+        self.encoding = encoding
+        self.header = []
+        self.data_start = 0
+        self.size = 0
+        self._file = None
+        self._mm = b''
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_end = self._line_end(0)
+        self.header = self._mm[0:header_end].rstrip(b'\r').decode(self.encoding).split(
+            self.delimiter.decode(self.encoding))
+        self.data_start = min(header_end + 1, self.size)
+        return self
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._mm = b''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _line_end(self, pos: int, end: int = None):
+        end = self.size if end is None else end
+        nl = self._mm.find(b'\n', pos, end)
+        return end if nl == -1 else nl
+
+    def byte_ranges(self, parts: int):
+        """把表头之后的数据切分为最多 parts 个以行首开始的字节区间 [(start, end), ...]"""
+        if parts < 1:
+            raise ValueError('parts require integer > 0, got {} instead'.format(parts))
+        step = max(1, (self.size - self.data_start) // parts)
+        boundaries = [self.data_start]
+        for i in range(1, parts):
+            pos = min(self._line_end(self.data_start + i * step) + 1, self.size)
+            if pos > boundaries[-1]:
+                boundaries.append(pos)
+        if boundaries[-1] < self.size:
+            boundaries.append(self.size)
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def iter_rows(self, start: int = None, end: int = None):
+        """逐行产出 (行首的字节偏移, 字段切片（bytes）列表)，跳过空行"""
+        pos = self.data_start if start is None else start
+        end = self.size if end is None else end
+        mm, delimiter = self._mm, self.delimiter
+        while pos < end:
+            nl = self._line_end(pos, end)
+            line = mm[pos:nl].rstrip(b'\r')
+            if line:
+                yield pos, line.split(delimiter)
+            pos = nl + 1
+
+    def iter_fields(self, start: int = None, end: int = None):
+        """逐行产出字段切片（bytes）列表，跳过空行"""
+        for _, fields in self.iter_rows(start, end):
+            yield fields
+
+    def line_number(self, offset: int):
+        """字节偏移所在的行号（从1开始，含表头），只在报错时使用"""
+        return self._mm[0:offset].count(b'\n') + 1
+
+    def _location(self, offset: int):
+        return 'line {} (byte offset {}) of {}'.format(self.line_number(offset), offset, self.path)
+
+    def _column_index(self, column: str):
+        if column not in self.header:
+            raise ValueError('column: {} is not found in {}'.format(column, self.path))
+        return self.header.index(column)
+
+    def _row_parser(self, schema: SchemaModel, column_map: dict):
+        """
+        按schema的列顺序编译 (属性名, 列序号, 类型转换函数, 类型检查函数, 是否为STRING, 是否支持空值)，
+        源数据缺失的列序号为None
+        """
+        parser = []
+        for p_name, type_ in zip(schema.row_encoder().columns, schema.row_encoder().types):
+            column = column_map.get(p_name, p_name)
+            parser.append((p_name, self.header.index(column) if column in self.header else None,
+                           NType2Coercer[type_], NType2Checker[type_], type_ == NDataTypes.STRING.value,
+                           schema.property_support_null(p_name)))
+        return parser
+
+    def _values(self, offset: int, fields: list, parser: list):
+        if len(fields) < len(self.header):
+            raise ValueError('require {} fields but got {} at {}'.format(
+                len(self.header), len(fields), self._location(offset)))
+        encoding = self.encoding
+        values = []
+        for p_name, index, coerce, check, is_string, support_null in parser:
+            field = None if index is None else fields[index]
+            if field is None or not (field or is_string):
+                if not support_null:
+                    raise ValueError('property: {} got None while defined as not support null at {}'.format(
+                        p_name, self._location(offset)))
+                values.append(None)
+                continue
+            try:
+                value = field.decode(encoding) if is_string else coerce(field.decode(encoding))
+            except (TypeError, ValueError) as e:
+                raise ValueError('can not coerce {!r} of property {} at {}: {}'.format(
+                    field, p_name, self._location(offset), e)) from e
+            reason = check(value)
+            if reason is not None:
+                raise ValueError('property: {} at {}: {}'.format(p_name, self._location(offset), reason))
+            values.append(value)
+        return values
+
+    def statements(self, schema: (TagSchemaModel, EdgeSchemaModel), start: int = None, end: int = None,
+                   column_map: dict = None, vid_column: str = 'vid', src_column: str = 'src',
+                   dst_column: str = 'dst', rank_column: str = None, if_not_exists: bool = False,
+                   max_bytes: int = None, max_rows: int = None):
+        """
+        为 [start, end) 字节区间内的行产出不超过字节预算的插入语句
+        逐行检查列数、类型转换与非空约束，不满足时抛出 ValueError 并给出行号与字节偏移
+        """
+        for stmt, _ in self.counted_statements(schema, start=start, end=end, column_map=column_map,
+                                               vid_column=vid_column, src_column=src_column, dst_column=dst_column,
+                                               rank_column=rank_column, if_not_exists=if_not_exists,
+                                               max_bytes=max_bytes, max_rows=max_rows):
+            yield stmt
+
+    def counted_statements(self, schema: (TagSchemaModel, EdgeSchemaModel), start: int = None, end: int = None,
+                           column_map: dict = None, vid_column: str = 'vid', src_column: str = 'src',
+                           dst_column: str = 'dst', rank_column: str = None, if_not_exists: bool = False,
+                           max_bytes: int = None, max_rows: int = None):
+        """
+        与 statements 相同，产出 (语句, 语句包含的数据行数)
+        节点语句中的vid在产出该语句前一次性从缓存中失效，不逐行失效
+        """
+        encoder = schema.row_encoder()
+        parser = self._row_parser(schema, column_map or dict())
+        rows = self.iter_rows(start, end)
+        # 已编码但尚未失效的vid
+        pending = []
+        if isinstance(schema, TagSchemaModel):
+            multi_parts = self._vertex_parts(schema, encoder, parser, rows, vid_column, pending)
+        else:
+            multi_parts = self._edge_parts(encoder, parser, rows, src_column, dst_column, rank_column)
+        for stmt, count in Insert.iter_counted_stmts(fix_part=encoder.header(if_not_exists), multi_parts=multi_parts,
+                                                     multi_part_splitter=', ', max_bytes=max_bytes,
+                                                     max_rows=max_rows):
+            if pending:
+                # 可能多包含下一条语句已读入的一行，提前失效不影响正确性
+                cache.invalidate_vertices(schema.name, pending)
+                pending.clear()
+            yield stmt, count
+
+    def _vertex_parts(self, schema: TagSchemaModel, encoder, parser: list, rows, vid_column: str, pending: list):
+        vid_index = self._column_index(vid_column)
+        encoding = self.encoding
+        for offset, f in rows:
+            values = self._values(offset, f, parser)
+            vid = build_id(schema_name=schema.name, _str_things=f[vid_index].decode(encoding)) if schema.index else None
+            if vid is not None:
+                pending.append(vid)
+            yield '\"{}\":({})'.format(vid, encoder.encode_values(values))
+
+    def _edge_parts(self, encoder, parser: list, rows, src_column: str, dst_column: str, rank_column: str):
+        src_index, dst_index = self._column_index(src_column), self._column_index(dst_column)
+        rank_index = None if rank_column is None else self._column_index(rank_column)
+        encoding = self.encoding
+        for offset, f in rows:
+            values = self._values(offset, f, parser)
+            try:
+                rank = int(f[rank_index]) if rank_index is not None and f[rank_index] else 0
+            except ValueError as e:
+                raise ValueError('can not coerce rank {!r} at {}'.format(f[rank_index], self._location(offset))) from e
+            yield '\"{0}\"->\"{1}\"{2}:({3})'.format(
+                f[src_index].decode(encoding),
+                f[dst_index].decode(encoding),
+                '' if not rank else '@{}'.format(rank),
+                encoder.encode_values(values)
+            )
+
+
+def csv_range_statements(path: str, schema: (TagSchemaModel, EdgeSchemaModel), start: int, end: int, **kwargs):
+    """
+    逐条产出CSV文件中一个字节区间的插入语句，区间由 MmapCsvReader.byte_ranges 给出
+    生成器不能作为进程池的任务函数，需要在子进程内执行时使用 csv_range_load
+    """
+    delimiter, encoding = kwargs.pop('delimiter', ','), kwargs.pop('encoding', 'utf-8')
+    with MmapCsvReader(path, delimiter=delimiter, encoding=encoding) as reader:
+        for stmt in reader.statements(schema, start=start, end=end, **kwargs):
+            yield stmt
+
+
+def csv_range_load(path: str, schema: (TagSchemaModel, EdgeSchemaModel), start: int, end: int,
+                   session_factory: Callable, space_name: str, **kwargs):
+    """
+    在当前进程内渲染并执行一个字节区间的插入语句，可作为进程池的任务函数，语句不经过进程间传输
+    + session_factory 需可被pickle，每次调用创建一个会话并在结束时释放
+    + 返回 ngsm.loader.ShardResult，shard_id 为区间的起始字节偏移，rows 为已生成语句的数据行数；
+      数据校验失败时停止该区间并把错误信息记录在 errors 中
+    """
+    begin = time.perf_counter()
+    shard = ShardResult(shard_id=start)
+    delimiter, encoding = kwargs.pop('delimiter', ','), kwargs.pop('encoding', 'utf-8')
+    session = session_factory()
+    try:
+        result = session.execute(Space.use(space_name))
+        if not result.is_succeeded():
+            raise RuntimeError('failed to use space {}: {}'.format(space_name, result.error_msg()))
+        with MmapCsvReader(path, delimiter=delimiter, encoding=encoding) as reader:
+            for stmt, rows in reader.counted_statements(schema, start=start, end=end, **kwargs):
+                shard.rows += rows
+                shard.statements += 1
+                shard.stmt_bytes += StmtFormatter.byte_length(stmt)
+                result = session.execute(stmt)
+                if not result.is_succeeded():
+                    shard.errors.append(result.error_msg())
+    except Exception as e:
+        shard.errors.append('{}: {}'.format(type(e).__name__, e))
+    finally:
+        session.release()
+    shard.elapsed = time.perf_counter() - begin
+    return shard
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import abc
+import os
+import sqlite3
+from collections import defaultdict
+
+
+class CheckpointJournal(abc.ABC):
+    """
+    断点续传日志：按作业（通常为schema名称）记录已被graphd确认的批次号及其输入偏移，
+    重新启动导入时跳过已完成的批次
+    + 批次号需要是确定的，即同样的输入按同样的顺序生成同样的语句，
+      AsyncPipeline 的批次号为语句序号，ShardedLoader 的批次号为分片序号
+    + 只记录执行成功的批次，失败的批次在重启后会再次执行
+    """
+
+    @abc.abstractmethod
+    def completed(self, job: str):
+        """作业中已完成的批次号集合"""
+        pass
+
+    @abc.abstractmethod
+    def record(self, job: str, batch_id: int, offset: int = None):
+        pass
+
+    @abc.abstractmethod
+    def offset(self, job: str, batch_id: int):
+        """批次记录的输入偏移，未记录时返回None"""
+        pass
+
+    @abc.abstractmethod
+    def reset(self, job: str):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def watermark(self, job: str):
+        """从0开始连续完成的批次数量，小于该值的批次都已完成，可据此直接跳过对应的输入"""
+        completed = self.completed(job)
+        mark = 0
+        while mark in completed:
+            mark += 1
+        return mark
+
+    def pending(self, job: str, statements):
+        """产出未完成的 (批次号, 语句)"""
+        completed = self.completed(job)
+        for batch_id, stmt in enumerate(statements):
+            if batch_id not in completed:
+                yield batch_id, stmt
+
+
+class FileJournal(CheckpointJournal):
+    """
+    追加写入的文本日志，每行为 作业\\t批次号\\t输入偏移
+    + sync 为True时每条记录都落盘（fsync），否则只刷新到操作系统缓冲区
+    + 进程在写入一行的中途退出时，不完整的末行在下次打开时被忽略
+    """
+
+    def __init__(self, path: str, sync: bool = False):
+        self.path = path
+        self.sync = sync
+        # 作业 -> 批次号 -> 输入偏移
+        self._batches = defaultdict(dict)
+        if os.path.exists(path):
+            self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) != 3:
+                    continue
+                job, batch_id, offset = parts
+                if batch_id == '*':
+                    self._batches.pop(job, None)
+                    continue
+                self._batches[job][int(batch_id)] = int(offset) if offset else None
+
+    def _write(self, line: str):
+        self._file.write(line)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def completed(self, job: str):
+        return set(self._batches.get(job, dict()).keys())
+
+    def record(self, job: str, batch_id: int, offset: int = None):
+        if '\t' in job or '\n' in job:
+            raise ValueError('job name can not contain tab or newline: {!r}'.format(job))
+        self._batches[job][batch_id] = offset
+        self._write('{}\t{}\t{}\n'.format(job, batch_id, '' if offset is None else offset))
+
+    def offset(self, job: str, batch_id: int):
+        return self._batches.get(job, dict()).get(batch_id)
+
+    def reset(self, job: str):
+        self._batches.pop(job, None)
+        self._write('{}\t*\t\n'.format(job))
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class SqliteJournal(CheckpointJournal):
+    """基于SQLite的日志，每条记录在单独的事务中提交"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS checkpoint ('
+                           'job TEXT NOT NULL, batch_id INTEGER NOT NULL, input_offset INTEGER, '
+                           'PRIMARY KEY (job, batch_id))')
+        self._conn.commit()
+
+    def completed(self, job: str):
+        return {row[0] for row in self._conn.execute('SELECT batch_id FROM checkpoint WHERE job = ?', (job,))}
+
+    def record(self, job: str, batch_id: int, offset: int = None):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO checkpoint (job, batch_id, input_offset) VALUES (?, ?, ?)',
+                               (job, batch_id, offset))
+
+    def offset(self, job: str, batch_id: int):
+        row = self._conn.execute('SELECT input_offset FROM checkpoint WHERE job = ? AND batch_id = ?',
+                                 (job, batch_id)).fetchone()
+        return None if row is None else row[0]
+
+    def reset(self, job: str):
+        with self._conn:
+            self._conn.execute('DELETE FROM checkpoint WHERE job = ?', (job,))
+
+    def close(self):
+        self._conn.close()
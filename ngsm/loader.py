@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from itertools import islice
+from multiprocessing import util
+from typing import Callable
+from typing import Iterable
+from typing import List
+
+import attr
+
+from ngsm.convertor import StmtFormatter
+from ngsm.model import EdgeBatch
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import SchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import VertexBatch
+from ngsm.ngql import Insert
+from ngsm.ngql import Space
+
+# 子进程内的状态，由进程池的 initializer 设置，schema 每个进程只传输一次
+_worker_state = dict()
+
+
+@attr.s
+class ShardResult:
+    """单个分片的处理结果"""
+    shard_id = attr.ib(type=int)
+    rows = attr.ib(type=int, default=0)
+    statements = attr.ib(type=int, default=0)
+    stmt_bytes = attr.ib(type=int, default=0)
+    errors = attr.ib(type=List[str], factory=list)
+    elapsed = attr.ib(type=float, default=0.0)
+    # 未配置 session_factory 时返回生成的语句，由父进程自行处理
+    rendered = attr.ib(type=List[str], factory=list)
+
+
+@attr.s
+class LoadReport:
+    """多进程导入的汇总结果"""
+    shards = attr.ib(type=int, default=0)
+    rows = attr.ib(type=int, default=0)
+    statements = attr.ib(type=int, default=0)
+    stmt_bytes = attr.ib(type=int, default=0)
+    # (shard_id, 错误信息)
+    errors = attr.ib(type=list, factory=list)
+    elapsed = attr.ib(type=float, default=0.0)
+    # 根据断点续传日志跳过的分片数
+    skipped = attr.ib(type=int, default=0)
+
+    def add(self, shard: ShardResult):
+        self.shards += 1
+        self.rows += shard.rows
+        self.statements += shard.statements
+        self.stmt_bytes += shard.stmt_bytes
+        self.errors.extend([(shard.shard_id, e) for e in shard.errors])
+
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _init_worker(schema: SchemaModel, session_factory: Callable, space_name: str, options: dict):
+    _worker_state.clear()
+    _worker_state.update(schema=schema, session_factory=session_factory, space_name=space_name,
+                         options=options, session=None)
+
+
+def _worker_session():
+    session = _worker_state['session']
+    if session is None:
+        session = _worker_state['session_factory']()
+        result = session.execute(Space.use(_worker_state['space_name']))
+        if not result.is_succeeded():
+            raise RuntimeError('failed to use space {}: {}'.format(_worker_state['space_name'], result.error_msg()))
+        # 子进程退出时不会执行atexit，借助multiprocessing的终结器释放会话
+        util.Finalize(None, session.release, exitpriority=10)
+        _worker_state['session'] = session
+    return session
+
+
+def _columns(schema: SchemaModel, properties: List[dict]):
+    return {name: [p.get(name) for p in properties] for name in schema.property_names()}
+
+
+def _render_shard(rows: list):
+    schema, options = _worker_state['schema'], _worker_state['options']
+    if isinstance(schema, TagSchemaModel):
+        batch = VertexBatch(schema=schema, vids=[r[0] for r in rows],
+                            columns=_columns(schema, [r[1] for r in rows]))
+        return Insert.iter_vertex_batch_statements(batch=batch, **options)
+    batch = EdgeBatch(schema=schema, src_vids=[r[0] for r in rows], dst_vids=[r[1] for r in rows],
+                      ranks=[r[2] for r in rows], columns=_columns(schema, [r[3] for r in rows]))
+    return Insert.iter_edge_batch_statements(batch=batch, **options)
+
+
+def _load_shard(shard_id: int, rows: list):
+    begin = time.perf_counter()
+    shard = ShardResult(shard_id=shard_id, rows=len(rows))
+    try:
+        for stmt in _render_shard(rows):
+            shard.statements += 1
+            shard.stmt_bytes += StmtFormatter.byte_length(stmt)
+            if _worker_state['session_factory'] is None:
+                shard.rendered.append(stmt)
+                continue
+            result = _worker_session().execute(stmt)
+            if not result.is_succeeded():
+                shard.errors.append(result.error_msg())
+    except Exception as e:
+        shard.errors.append('{}: {}'.format(type(e).__name__, e))
+    shard.elapsed = time.perf_counter() - begin
+    return shard
+
+
+class ShardedLoader:
+    """
+    多进程分片导入：输入按 shard_size 行切分后分发给进程池，各进程独立生成语句并通过自己的会话执行
+    + Tag 的输入行为 (vid, 属性字典)，EdgeType 的输入行为 (src_vid, dst_vid, rank, 属性字典)
+    + schema 与 session_factory 通过进程池的 initializer 每个进程只传输一次，二者需可被pickle
+    + session_factory 为 None 时只生成语句，语句随 ShardResult.rendered 返回父进程
+    + 配置 journal（ngsm.journal.CheckpointJournal）后，执行成功且没有错误的分片按分片序号记录，
+      输入偏移为该分片首行的行号，重新导入同样的输入时跳过已完成的分片；job 默认为schema名称；
+      session_factory 为 None 时分片没有被执行，不会被记录
+    """
+
+    def __init__(self, schema: (TagSchemaModel, EdgeSchemaModel), space_name: str = None,
+                 session_factory: Callable = None, processes: int = None, shard_size: int = 10000,
+                 if_not_exists: bool = False, max_bytes: int = None, max_rows: int = None,
+                 on_shard: Callable = None, journal=None, job: str = None):
+        if not isinstance(schema, (TagSchemaModel, EdgeSchemaModel)):
+            raise TypeError('require TagSchemaModel or EdgeSchemaModel, got {} instead'.format(type(schema)))
+        if session_factory is not None and not space_name:
+            raise ValueError('space_name is required when session_factory is given')
+        if shard_size < 1:
+            raise ValueError('shard_size require integer > 0, got {} instead'.format(shard_size))
+        self.schema = schema
+        self.space_name = space_name
+        self.session_factory = session_factory
+        self.processes = processes
+        self.shard_size = shard_size
+        self.options = dict(if_not_exists=if_not_exists, max_bytes=max_bytes, max_rows=max_rows)
+        self.on_shard = on_shard
+        self.journal = journal
+        self.job = job or schema.name
+
+    def shards(self, rows: Iterable):
+        rows = iter(rows)
+        shard = list(islice(rows, self.shard_size))
+        while shard:
+            yield shard
+            shard = list(islice(rows, self.shard_size))
+
+    def load(self, rows: Iterable):
+        """阻塞直到全部分片处理完成，返回 LoadReport；每完成一个分片回调一次 on_shard(ShardResult, LoadReport)"""
+        report = LoadReport()
+        begin = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                 initargs=(self.schema, self.session_factory, self.space_name,
+                                           self.options)) as pool:
+            # 在途分片数量有限，避免一次性读入全部输入
+            max_pending = (self.processes or os.cpu_count() or 1) * 2
+            pending = set()
+            completed = self.journal.completed(self.job) if self.journal is not None else set()
+            for shard_id, shard in enumerate(self.shards(rows)):
+                if shard_id in completed:
+                    report.skipped += 1
+                    continue
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done, report, begin)
+                pending.add(pool.submit(_load_shard, shard_id, shard))
+            self._collect(wait(pending).done, report, begin)
+        report.elapsed = time.perf_counter() - begin
+        return report
+
+    def _collect(self, futures, report: LoadReport, begin: float):
+        for future in futures:
+            shard = future.result()
+            report.add(shard)
+            # 只生成语句时没有执行，不能记为已完成
+            if self.journal is not None and self.session_factory is not None and not shard.errors:
+                self.journal.record(self.job, shard.shard_id, shard.shard_id * self.shard_size)
+            report.elapsed = time.perf_counter() - begin
+            if self.on_shard is not None:
+                self.on_shard(shard, report)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# 插入语句中的schema名称，用于按 tag/edge type 汇总执行耗时
+_INSERT_SCHEMA = re.compile(r'^\s*insert\s+(?:vertex|edge)\s+(?:if\s+not\s+exists\s+)?`?(\w+)', re.IGNORECASE)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+def statement_schema(stmt: str):
+    """插入语句的 tag/edge type 名称，其余语句返回空字符串"""
+    match = _INSERT_SCHEMA.match(stmt[:256])
+    return match.group(1) if match else ''
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullSink:
+    """
+    默认的空实现，埋点处先判断 enabled，关闭时不做任何计时与计数
+    自定义sink需实现 counter、observe 与 span 并把 enabled 设为True
+    """
+    enabled = False
+
+    def counter(self, name: str, value: float = 1, **labels):
+        pass
+
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+    def span(self, name: str, **labels):
+        return _NULL_SPAN
+
+
+class _Span:
+
+    def __init__(self, sink, name: str, labels: dict):
+        self.sink = sink
+        self.name = name
+        self.labels = labels
+        self.begin = None
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        seconds = time.perf_counter() - self.begin
+        self.sink.observe('{}_seconds'.format(self.name), seconds, **self.labels)
+        for callback in self.sink.span_callbacks:
+            callback(self.name, self.labels, seconds, exc_val)
+        return False
+
+
+class MemorySink(NullSink):
+    """
+    在内存中汇总计数器与直方图，线程安全
+    + span(name) 的耗时记入直方图 name_seconds，并依次调用 span_callbacks 中的 callback(name, labels, 秒数, 异常)
+    """
+    enabled = True
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS, span_callbacks: list = None):
+        self.buckets = tuple(sorted(buckets))
+        self.span_callbacks = list(span_callbacks or [])
+        self.counters = OrderedDict()
+        # (名称, 标签) -> [各个桶的计数, 总和, 次数]
+        self.histograms = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _key(cls, name: str, labels: dict):
+        return name, tuple(sorted(labels.items()))
+
+    def counter(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def span(self, name: str, **labels):
+        return _Span(self, name, labels)
+
+    def value(self, name: str, **labels):
+        """计数器的当前值"""
+        return self.counters.get(self._key(name, labels), 0)
+
+    def summary(self, name: str, **labels):
+        """直方图的 (次数, 总和)"""
+        histogram = self.histograms.get(self._key(name, labels))
+        return (0, 0.0) if histogram is None else (histogram[2], histogram[1])
+
+
+class LoggingSink(MemorySink):
+    """汇总的同时把每条计数与观测写入日志"""
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.DEBUG, **kwargs):
+        super().__init__(**kwargs)
+        self.logger = logger or logging.getLogger('ngsm.metrics')
+        self.level = level
+
+    def counter(self, name: str, value: float = 1, **labels):
+        super().counter(name, value, **labels)
+        self.logger.log(self.level, 'counter %s %s += %s', name, labels, value)
+
+    def observe(self, name: str, value: float, **labels):
+        super().observe(name, value, **labels)
+        self.logger.log(self.level, 'observe %s %s = %.6f', name, labels, value)
+
+
+class PrometheusTextfileSink(MemorySink):
+    """
+    以 Prometheus 文本格式把汇总结果写入文件，供 node_exporter 的 textfile collector 采集
+    write() 先写临时文件再替换，采集方不会读到写了一半的文件
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    @classmethod
+    def _labels(cls, labels: tuple, extra: tuple = ()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(['{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                               for k, v in pairs]) + '}'
+
+    def render(self):
+        lines, typed = [], set()
+        with self._lock:
+            # 同一指标的各行需要相邻
+            for (name, labels), value in sorted(self.counters.items(), key=lambda item: item[0][0]):
+                if name not in typed:
+                    lines.append('# TYPE {} counter'.format(name))
+                    typed.add(name)
+                lines.append('{}{} {}'.format(name, self._labels(labels), value))
+            for (name, labels), (counts, total, count) in sorted(self.histograms.items(),
+                                                                 key=lambda item: item[0][0]):
+                if name not in typed:
+                    lines.append('# TYPE {} histogram'.format(name))
+                    typed.add(name)
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    lines.append('{}_bucket{} {}'.format(name, self._labels(labels, (('le', bound),)), cumulative))
+                lines.append('{}_bucket{} {}'.format(name, self._labels(labels, (('le', '+Inf'),)), count))
+                lines.append('{}_sum{} {}'.format(name, self._labels(labels), total))
+                lines.append('{}_count{} {}'.format(name, self._labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+
+_sink = NullSink()
+
+
+def get_sink():
+    return _sink
+
+
+def set_sink(sink: NullSink = None):
+    """设置全局sink，传入None恢复为空实现，返回之前的sink"""
+    global _sink
+    previous, _sink = _sink, sink or NullSink()
+    return previous
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+import copy
+import sys
 from types import FunctionType
 from types import MethodType
 from typing import List
@@ -7,7 +10,9 @@ from typing import List
 import attr
 from attr import validators
 
+from ngsm.base import ConflictPolicy
 from ngsm.base import NDataTypes
+from ngsm.base import NType2Checker
 from ngsm.base import NType2Validator
 from ngsm.base import Setting
 from ngsm.base import Const
@@ -19,11 +24,64 @@ def build_id(schema_name: str, _str_things: (List[str], str)):
     return Const.vid_joiner.join(_s)
 
 
+def unique_properties(properties):
+    """属性去重并给出稳定的顺序：集合按属性名排序，序列保持给定顺序"""
+    if isinstance(properties, (set, frozenset)):
+        return sorted(properties, key=lambda p: p.name)
+    return list(OrderedDict.fromkeys(properties))
+
+
+def intern_vid(vid):
+    """字符串vid驻留，相同vid只保留一份字符串"""
+    return sys.intern(vid) if type(vid) is str else vid
+
+
+def column_values(column):
+    """将列数据转为python列表，兼容NumPy数组等实现了tolist的对象"""
+    return column.tolist() if hasattr(column, 'tolist') else list(column)
+
+
 def build_index_name(schema_name: str, schema_type: str, properties: list = None):
     return 'i_{}{}'.format('{}_{}'.format(schema_type[0], schema_name),
                            '' if properties is None else '_P_{}'.format('_'.join([p.name for p in properties])))
 
 
+@attr.s
+class ValidationIssue:
+    """一个不满足schema定义的属性值"""
+    row = attr.ib(type=int)
+    property_name = attr.ib(type=str)
+    value = attr.ib()
+    reason = attr.ib(type=str)
+
+
+@attr.s
+class ValidationReport:
+    """整批数据的校验结果"""
+    schema_name = attr.ib(type=str)
+    rows = attr.ib(type=int, default=0)
+    issues = attr.ib(type=List[ValidationIssue], factory=list)
+
+    def ok(self):
+        return not self.issues
+
+    def bad_rows(self):
+        return sorted({issue.row for issue in self.issues})
+
+    def raise_for_issues(self):
+        if self.issues:
+            raise ValidationError(self)
+        return self
+
+
+class ValidationError(ValueError):
+
+    def __init__(self, report: ValidationReport):
+        self.report = report
+        super().__init__('{} of {} rows of {} are invalid, first issue: {}'.format(
+            len(report.bad_rows()), report.rows, report.schema_name, report.issues[0]))
+
+
 @attr.s(eq=False, hash=False)
 class PropertySchemaModel:
     """
@@ -94,14 +152,14 @@ class SchemaModel:
                    validator=validators.instance_of(str))
     # 属性定义
     properties = attr.ib(type=List[PropertySchemaModel],
-                         converter=lambda x: list(set(x)),
+                         converter=unique_properties,
                          validator=validators.deep_iterable(
                              PropertySchemaModel.property_for_schema_validator,
                              validators.instance_of(list)),
                          default=list())
     # 可以指定统一要添加的属性
     unified_properties = attr.ib(type=List[PropertySchemaModel],
-                                 converter=lambda x: list(set(x)),
+                                 converter=unique_properties,
                                  validator=validators.deep_iterable(
                                      PropertySchemaModel.property_for_schema_validator,
                                      validators.instance_of(list)),
@@ -125,6 +183,9 @@ class SchemaModel:
     _index_name = attr.ib(type=str, init=False)
     _prop_index_names = attr.ib(type=list, init=False)
     _properties_map = attr.ib(type=dict, init=False)
+    _row_encoder = attr.ib(init=False, default=None)
+    # vid_builder -> 生成的专用实例类
+    _compiled_classes = attr.ib(type=dict, init=False, factory=dict)
 
     def __attrs_post_init__(self):
         # 默认添加额外的属性：用于形成一个单独的岛屿
@@ -158,9 +219,37 @@ class SchemaModel:
     def __repr__(self):
         return 'Schema: {}'.format(self.name)
 
+    def __getstate__(self):
+        # 编译出的行编码器不参与序列化，需要时重新编译
+        state = self.__dict__.copy()
+        state['_row_encoder'] = None
+        state['_compiled_classes'] = dict()
+        return state
+
+    def schema_type(self):
+        return self._schema_type
+
     def property_names(self):
         return [prop.name for prop in self.properties]
 
+    def row_encoder(self):
+        """惰性编译并缓存本schema的行编码器"""
+        if self._row_encoder is None:
+            from ngsm.convertor import RowEncoder
+            self._row_encoder = RowEncoder(self)
+        return self._row_encoder
+
+    def compile_class(self, vid_builder: (FunctionType, MethodType) = build_id):
+        """
+        惰性生成并缓存本schema专用的节点/边实例类，见 ngsm.codegen.compile_model_class
+        其实例可以代替 VertexModel/EdgeModel 传给 Insert，编译后不应再修改schema的属性
+        """
+        cls = self._compiled_classes.get(vid_builder)
+        if cls is None:
+            from ngsm.codegen import compile_model_class
+            cls = self._compiled_classes[vid_builder] = compile_model_class(self, vid_builder)
+        return cls
+
     def property_type(self, p_name):
         if p_name not in self._properties_map.keys():
             raise ValueError('property: {} is not defined in schema: {}'.format(p_name, self.name))
@@ -196,24 +285,89 @@ class SchemaModel:
             except TypeError as e:
                 raise TypeError('{} of {}: {}'.format(p.name, self.name, e)) from e
 
+    def check_prop_columns(self, columns: dict, size: int):
+        """
+        按列检查属性是否满足预定义，返回按schema属性顺序排列的列数据
+        未给出的属性列以None填充，存在不满足的值时抛出包含全部问题的 ValidationError
+        """
+        for name in columns.keys():
+            if name not in self._properties_map.keys():
+                raise ValueError('property: {} is not defined in schema: {}'.format(name, self.name))
+        checked = dict()
+        for p in self.properties:
+            values = column_values(columns[p.name]) if p.name in columns else [None] * size
+            if len(values) != size:
+                raise ValueError('{} of {} got {} values while {} rows are expected'.format(
+                    p.name, self.name, len(values), size))
+            checked[p.name] = values
+        self.validate_columns(columns=checked, size=size).raise_for_issues()
+        return checked
+
+    def validate_columns(self, columns: dict, size: int):
+        """按列检查全部属性的空值与类型，返回 ValidationReport"""
+        report = ValidationReport(schema_name=self.name, rows=size)
+        for p in self.properties:
+            values = columns.get(p.name)
+            if values is None:
+                values = [None] * size
+            report.issues.extend([ValidationIssue(row=row, property_name=p.name, value=values[row], reason=reason)
+                                  for row, reason in NDataTypes.column_issues(values, p.type, p.support_null)])
+        report.issues.sort(key=lambda issue: issue.row)
+        return report
+
+    def validate_instances(self, instances: list):
+        """对整批节点或边实例按列检查，返回 ValidationReport"""
+        rows = [i.properties for i in instances]
+        columns = {p.name: [row.get(p.name) for row in rows] for p in self.properties}
+        return self.validate_columns(columns=columns, size=len(instances))
+
+    def iter_validated(self, instances, report: ValidationReport = None):
+        """
+        逐个检查实例并只产出合法的实例
+        未给出report时，全部消费完后若存在不合法的实例则抛出 ValidationError，否则问题记录在report中
+        """
+        checkers = [(p.name, NType2Checker[p.type], p.support_null) for p in self.properties]
+        raise_at_end = report is None
+        report = ValidationReport(schema_name=self.name) if report is None else report
+        for row, instance in enumerate(instances):
+            report.rows += 1
+            valid = True
+            properties = instance.properties
+            for name, checker, support_null in checkers:
+                value = properties.get(name)
+                if value is None:
+                    reason = None if support_null else 'got None while defined as not support null'
+                else:
+                    reason = checker(value)
+                if reason is not None:
+                    valid = False
+                    report.issues.append(ValidationIssue(row=row, property_name=name, value=value, reason=reason))
+            if valid:
+                yield instance
+        if raise_at_end:
+            report.raise_for_issues()
+
     def build_id(self, _str_things: (List[str], str), builder: (FunctionType, MethodType)):
         return builder(schema_name=self.name, _str_things=_str_things) if self.index else None
 
+    def _record_index_name(self, index_name: str):
+        # 重复生成DDL时不重复记录同一个索引
+        if index_name not in self._index_names:
+            self._index_names.append(index_name)
+        return index_name
+
     def build_property_index(self, property_: PropertySchemaModel):
         _index_name = self.index_name_builder(self.name, schema_type=self._schema_type, properties=[property_])
-        self._index_names.append(_index_name)
-        return _index_name
+        return self._record_index_name(_index_name)
 
     def build_compound_property_index(self, properties: List[PropertySchemaModel]):
         _index_name = self.index_name_builder(self.name, schema_type=self._schema_type, properties=properties)
-        self._index_names.append(_index_name)
-        return _index_name
+        return self._record_index_name(_index_name)
 
     def build_schema_index(self):
         _index_name = self.index_name_builder(self.name, schema_type=self._schema_type, properties=None)
         self._index_name = _index_name
-        self._index_names.append(_index_name)
-        return _index_name
+        return self._record_index_name(_index_name)
 
 
 @attr.s(repr=False, eq=False, hash=False)
@@ -252,7 +406,7 @@ class EdgeSchemaModel(SchemaModel):
 #     auto_encode_vid = attr.ib(type=bool, default=True)
 
 
-@attr.s(eq=False, hash=False)
+@attr.s(eq=False, hash=False, slots=True)
 class VertexModel:
     """
     节点实例
@@ -263,7 +417,7 @@ class VertexModel:
     # 节点所属schema，目前一个节点只能是一个TagSchema的实例 TODO Nebula支持同个节点是多个TagSchema的实例
     schema = attr.ib(type=TagSchemaModel, validator=validators.instance_of(TagSchemaModel))
     # 节点属性
-    properties = attr.ib(type=dict, default=dict())
+    properties = attr.ib(type=dict, factory=dict)
     # # 是否自动编码图节点id
     # auto_encode_vid = attr.ib(type=bool, default=True)
     # 实际存入图数据库中的vid会加上schema名称作为前缀
@@ -272,7 +426,10 @@ class VertexModel:
     def __attrs_post_init__(self):
         # if self.auto_encode_vid:
         #     self.vid = self.schema.build_id(str(self.vid))
-        self.vid = self.schema.build_id(str(self.vid), builder=self.vid_builder)
+        self.vid = intern_vid(self.schema.build_id(str(self.vid), builder=self.vid_builder))
+        if Setting.deferred_validation:
+            # 推迟到生成语句时整批检查
+            return
         try:
             self.schema.check_prop_instances(properties=self.properties)
         except Exception as e:
@@ -292,24 +449,27 @@ class VertexModel:
     def __hash__(self):
         return self.vid.__hash__()
 
+    def key(self):
+        return self.vid
+
     def property_value(self, p_k):
         return self.properties.get(p_k, None)
 
 
-@attr.s(eq=False, hash=False, repr=False)
+@attr.s(eq=False, hash=False, repr=False, slots=True)
 class EdgeModel:
     """
     边实例
     https://docs.nebula-graph.com.cn/3.2.0/3.ngql-guide/13.edge-statements/1.insert-edge/
     """
     # 起始点vid
-    src_vid = attr.ib(type=(str, int), validator=validators.instance_of((str, int)))
+    src_vid = attr.ib(type=(str, int), converter=intern_vid, validator=validators.instance_of((str, int)))
     # 终点vid
-    dst_vid = attr.ib(type=(str, int), validator=validators.instance_of((str, int)))
+    dst_vid = attr.ib(type=(str, int), converter=intern_vid, validator=validators.instance_of((str, int)))
     # 边所属schema
     schema = attr.ib(type=EdgeSchemaModel, validator=validators.instance_of(EdgeSchemaModel))
     # 边属性
-    properties = attr.ib(type=dict, default=dict())
+    properties = attr.ib(type=dict, factory=dict)
     rank = attr.ib(type=int, default=0, validator=validators.instance_of(int))
 
     def __ne__(self, other):
@@ -327,11 +487,11 @@ class EdgeModel:
         return False
 
     def __hash__(self):
-        return hash(''.join([str(self.src_vid),
-                             str(self.dst_vid),
-                             str(self.rank),
-                             str(self.schema.name)
-                             ]))
+        return hash((self.src_vid, self.dst_vid, self.rank, self.schema.name))
+
+    def key(self):
+        # 同一EdgeType下由起点、终点、rank唯一确定一条边
+        return self.src_vid, self.dst_vid, self.rank
 
     def __repr__(self):
         return 'src_vid: {}, dst_vid: {}, schema: {}, ' \
@@ -343,32 +503,228 @@ class EdgeModel:
         return self.properties.get(p_k, None)
 
 
+@attr.s(eq=False, repr=False)
+class VertexBatch:
+    """
+    列式节点批次，按列校验属性，跳过逐行构建VertexModel
+    columns: 属性名 -> 列数据（list或NumPy数组），与vids一一对应
+    """
+    # 节点所属schema
+    schema = attr.ib(type=TagSchemaModel, validator=validators.instance_of(TagSchemaModel))
+    # 节点id列，最终 vid = tag名称+连接符+自定id
+    vids = attr.ib(type=list, converter=column_values)
+    # 属性列
+    columns = attr.ib(type=dict, validator=validators.instance_of(dict), factory=dict)
+    # 实际存入图数据库中的vid会加上schema名称作为前缀
+    vid_builder = attr.ib(type=(FunctionType, MethodType), default=build_id)
+
+    def __attrs_post_init__(self):
+        if self.schema.index:
+            self.vids = [self.vid_builder(schema_name=self.schema.name, _str_things=str(vid)) for vid in self.vids]
+        else:
+            self.vids = [None] * len(self.vids)
+        self.columns = self.schema.check_prop_columns(columns=self.columns, size=len(self.vids))
+
+    def __len__(self):
+        return len(self.vids)
+
+    def __repr__(self):
+        return 'VertexBatch of {} with {} rows'.format(self.schema.name, len(self))
+
+    def rows(self):
+        """按schema属性顺序逐行产出属性值元组"""
+        return zip(*[self.columns[p.name] for p in self.schema.properties]) if self.columns \
+            else (() for _ in self.vids)
+
+
+@attr.s(eq=False, repr=False)
+class EdgeBatch:
+    """
+    列式边批次，按列校验属性，跳过逐行构建EdgeModel
+    columns: 属性名 -> 列数据（list或NumPy数组），与src_vids/dst_vids一一对应
+    """
+    # 边所属schema
+    schema = attr.ib(type=EdgeSchemaModel, validator=validators.instance_of(EdgeSchemaModel))
+    # 起始点vid列
+    src_vids = attr.ib(type=list, converter=column_values)
+    # 终点vid列
+    dst_vids = attr.ib(type=list, converter=column_values)
+    # 属性列
+    columns = attr.ib(type=dict, validator=validators.instance_of(dict), factory=dict)
+    # rank列，默认全部为0
+    ranks = attr.ib(type=list, converter=attr.converters.optional(column_values), default=None)
+
+    def __attrs_post_init__(self):
+        if len(self.src_vids) != len(self.dst_vids):
+            raise ValueError('got {} src_vids but {} dst_vids'.format(len(self.src_vids), len(self.dst_vids)))
+        if self.ranks is None:
+            self.ranks = [0] * len(self.src_vids)
+        elif len(self.ranks) != len(self.src_vids):
+            raise ValueError('got {} ranks but {} edges'.format(len(self.ranks), len(self.src_vids)))
+        elif NDataTypes.check_column(values=self.ranks, type_=NDataTypes.INT.value, support_null=False) is not None:
+            raise TypeError('ranks of {} require int values'.format(self.schema.name))
+        self.columns = self.schema.check_prop_columns(columns=self.columns, size=len(self.src_vids))
+
+    def __len__(self):
+        return len(self.src_vids)
+
+    def __repr__(self):
+        return 'EdgeBatch of {} with {} rows'.format(self.schema.name, len(self))
+
+    def rows(self):
+        """按schema属性顺序逐行产出属性值元组"""
+        return zip(*[self.columns[p.name] for p in self.schema.properties]) if self.columns \
+            else (() for _ in self.src_vids)
+
+
+def _positional(schema: SchemaModel, properties: dict):
+    """按schema的列顺序取出属性值，schema中未定义的属性无法存放，直接报错"""
+    encoder = schema.row_encoder()
+    if not properties.keys() <= encoder.column_formatters.keys():
+        unknown = [k for k in properties.keys() if k not in encoder.column_formatters]
+        raise ValueError('property: {} is not defined in schema: {}'.format(', '.join(unknown), schema.name))
+    get = properties.get
+    return tuple([get(c) for c in encoder.columns])
+
+
+@attr.s(eq=False, repr=False)
+class VertexRowStore:
+    """
+    节点行存储：属性值按schema的列顺序存为元组，所有行共享schema，vid驻留
+    暂存大量节点时代替VertexModel，未定义的属性在 add 时报错，其余校验推迟到 to_batch 时按列进行
+    """
+    schema = attr.ib(type=TagSchemaModel, validator=validators.instance_of(TagSchemaModel))
+    vids = attr.ib(type=list, init=False, factory=list)
+    rows = attr.ib(type=List[tuple], init=False, factory=list)
+
+    def __len__(self):
+        return len(self.vids)
+
+    def __repr__(self):
+        return 'VertexRowStore of {} with {} rows'.format(self.schema.name, len(self))
+
+    def add(self, vid, properties: dict = None):
+        row = _positional(self.schema, properties or dict())
+        self.vids.append(intern_vid(vid))
+        self.rows.append(row)
+
+    def clear(self):
+        self.vids, self.rows = [], []
+
+    def columns(self):
+        return dict(zip(self.schema.row_encoder().columns, map(list, zip(*self.rows))))
+
+    def to_batch(self, vid_builder: (FunctionType, MethodType) = build_id):
+        return VertexBatch(schema=self.schema, vids=self.vids, columns=self.columns(), vid_builder=vid_builder)
+
+
+@attr.s(eq=False, repr=False)
+class EdgeRowStore:
+    """
+    边行存储：属性值按schema的列顺序存为元组，所有行共享schema，vid驻留
+    暂存大量边时代替EdgeModel，未定义的属性在 add 时报错，其余校验推迟到 to_batch 时按列进行
+    """
+    schema = attr.ib(type=EdgeSchemaModel, validator=validators.instance_of(EdgeSchemaModel))
+    src_vids = attr.ib(type=list, init=False, factory=list)
+    dst_vids = attr.ib(type=list, init=False, factory=list)
+    ranks = attr.ib(type=List[int], init=False, factory=list)
+    rows = attr.ib(type=List[tuple], init=False, factory=list)
+
+    def __len__(self):
+        return len(self.src_vids)
+
+    def __repr__(self):
+        return 'EdgeRowStore of {} with {} rows'.format(self.schema.name, len(self))
+
+    def add(self, src_vid, dst_vid, properties: dict = None, rank: int = 0):
+        row = _positional(self.schema, properties or dict())
+        self.src_vids.append(intern_vid(src_vid))
+        self.dst_vids.append(intern_vid(dst_vid))
+        self.ranks.append(rank)
+        self.rows.append(row)
+
+    def clear(self):
+        self.src_vids, self.dst_vids, self.ranks, self.rows = [], [], [], []
+
+    def columns(self):
+        return dict(zip(self.schema.row_encoder().columns, map(list, zip(*self.rows))))
+
+    def to_batch(self):
+        return EdgeBatch(schema=self.schema, src_vids=self.src_vids, dst_vids=self.dst_vids,
+                         ranks=self.ranks, columns=self.columns())
+
+
 @attr.s
 class SchemaInstancesModel:
     """某schema下实例集"""
     schema = attr.ib(type=(TagSchemaModel, EdgeSchemaModel), validator=validators.instance_of(SchemaModel))
+    # 重复实例的处理方式
+    conflict_policy = attr.ib(type=str, default=ConflictPolicy.LAST_WINS.value,
+                              validator=validators.in_(ConflictPolicy.values()))
     candidates = attr.ib(type=(List[VertexModel], List[EdgeModel]), init=False)
     schema_type = attr.ib(init=False)
     schema_type_class = attr.ib(init=False)
+    # 实例键 -> 在candidates中的位置
+    _positions = attr.ib(type=dict, init=False, repr=False)
+    # 被去重的实例数
+    duplicates = attr.ib(type=int, init=False, default=0)
 
     def __attrs_post_init__(self):
         self.candidates = []
+        self._positions = dict()
         self.schema_type_class = VertexModel if self.schema_type == Const.TAG else EdgeModel
 
+    def __len__(self):
+        return len(self.candidates)
+
+    def __contains__(self, key):
+        """与 get 一致，按vid或(src_vid, dst_vid, rank)判断"""
+        return key in self._positions
+
+    def get(self, key):
+        """按vid或(src_vid, dst_vid, rank)获取实例"""
+        position = self._positions.get(key)
+        return None if position is None else self.candidates[position]
+
     def _check_member_schema(self, _member):
         """
         检查成员的schema类型和属性是否与预定义的一致
+        也接受本schema由 SchemaModel.compile_class 生成的专用类的实例
         """
-        if not isinstance(_member, self.schema_type_class):
-            raise TypeError('require {} got {} instead'.format(self.schema_type_class, type(_member)))
+        if isinstance(_member, self.schema_type_class):
+            return
+        if getattr(_member.__class__, '__ngsm_compiled__', False) and \
+                (_member.schema is self.schema or _member.schema == self.schema):
+            return
+        raise TypeError('require {} got {} instead'.format(self.schema_type_class, type(_member)))
+
+    def validate(self):
+        """整批检查全部实例，返回 ValidationReport"""
+        return self.schema.validate_instances(self.candidates)
 
     def add(self, _member):
         self._check_member_schema(_member)
-        self.candidates.append(_member)
+        key = _member.key()
+        position = self._positions.get(key)
+        if position is None:
+            self._positions[key] = len(self.candidates)
+            self.candidates.append(_member)
+            return
+        self.duplicates += 1
+        if self.conflict_policy == ConflictPolicy.FIRST_WINS.value:
+            return
+        if self.conflict_policy == ConflictPolicy.MERGE.value:
+            properties = dict(self.candidates[position].properties)
+            properties.update({k: v for k, v in _member.properties.items() if v is not None})
+            # 合并结果放在副本中，不修改调用方传入的实例
+            _member = copy.copy(_member)
+            _member.properties = properties
+        self.candidates[position] = _member
 
     def union(self, instances):
         if instances.schema == self.schema and instances.schema_type == self.schema_type:
-            self.candidates.extend(instances.candidates)
+            for _member in instances.candidates:
+                self.add(_member)
 
 
 @attr.s
@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import itertools
+import time
+from typing import Callable
+from typing import Iterable
 from typing import List
 from typing import Tuple
 
 from ngsm.model import VertexModel
 from ngsm.model import EdgeModel
+from ngsm.model import VertexBatch
+from ngsm.model import ValidationReport
+from ngsm.model import EdgeBatch
 from ngsm.model import PropertySchemaModel
 from ngsm.model import SchemaModel
 from ngsm.model import TagSchemaModel
 from ngsm.model import EdgeSchemaModel
 from ngsm.model import NDataTypes
+from ngsm import cache
+from ngsm import metrics
+from ngsm.base import Setting
+from ngsm.convertor import RowEncoder
 from ngsm.convertor import StmtFormatter
 from ngsm.convertor import ValueFormatter
 
@@ -21,47 +32,269 @@ class Insert:
         parts_should_split = StmtFormatter.parts_should_split_of_stmt(fix_part, multi_part)
 
         if parts_should_split == 1:
-            return ''.join([fix_part, multi_part_splitter.join(multi_part), ';'])
+            stmts = ''.join([fix_part, multi_part_splitter.join(multi_part), ';'])
         else:
             parts = StmtFormatter.split_into_parts(multi_parts=multi_part, parts_num=parts_should_split)
-            return [''.join([fix_part, multi_part_splitter.join(p), ';']) for p in parts]
+            stmts = [''.join([fix_part, multi_part_splitter.join(p), ';']) for p in parts]
+        sink = metrics.get_sink()
+        if sink.enabled:
+            labels = dict(schema=metrics.statement_schema(fix_part))
+            # 只有插入语句的片段是数据行，删除、更新与查询语句的片段不计入
+            if labels['schema']:
+                sink.counter('ngsm_rows_rendered_total', len(multi_part), **labels)
+            sink.counter('ngsm_statements_total', parts_should_split, **labels)
+            sink.counter('ngsm_statement_splits_total', parts_should_split - 1, **labels)
+            sink.counter('ngsm_statement_bytes_total',
+                         StmtFormatter.byte_length(stmts) if isinstance(stmts, str) else
+                         sum([StmtFormatter.byte_length(stmt) for stmt in stmts]), **labels)
+        return stmts
+
+    @classmethod
+    def iter_couple_stmts(cls, fix_part: str, multi_parts: Iterable[str], multi_part_splitter: str,
+                          max_bytes: int = None, max_rows: int = None, budget: Callable = None):
+        """
+        按字节预算贪心打包语句，每凑满一条语句立即产出，不在内存中保留全部数据
+        :param max_bytes: 单条语句（含结尾分号）的最大UTF-8字节数，默认为 Setting.max_stmt_length
+        :param max_rows: 单条语句最多包含的数据行数，默认不限制
+        :param budget: 无参调用返回 (max_bytes, max_rows)，每开始一条新语句时读取一次，覆盖前两个参数，
+            例如 ngsm.adaptive.AdaptiveBatchController.budget；此时单行超出当前字节预算不报错而是单独成句，
+            只有超出 Setting.max_stmt_length 才报错
+        """
+        sink = metrics.get_sink()
+        if not sink.enabled:
+            return cls._iter_couple_stmts(fix_part, multi_parts, multi_part_splitter, max_bytes, max_rows, budget)
+        return cls._instrumented_stmts(sink, fix_part, multi_parts, lambda parts: cls._iter_couple_stmts(
+            fix_part, parts, multi_part_splitter, max_bytes, max_rows, budget))
+
+    @classmethod
+    def iter_counted_stmts(cls, fix_part: str, multi_parts: Iterable[str], multi_part_splitter: str,
+                           max_bytes: int = None, max_rows: int = None, budget: Callable = None):
+        """与 iter_couple_stmts 相同，产出 (语句, 语句包含的数据行数)"""
+        counts = []
+
+        def _render(parts):
+            for stmt, rows in cls._iter_counted_stmts(fix_part, parts, multi_part_splitter, max_bytes, max_rows,
+                                                      budget):
+                counts.append(rows)
+                yield stmt
+        sink = metrics.get_sink()
+        stmts = _render(multi_parts) if not sink.enabled else cls._instrumented_stmts(sink, fix_part, multi_parts,
+                                                                                     _render)
+        for stmt in stmts:
+            yield stmt, counts.pop()
+
+    @classmethod
+    def _instrumented_stmts(cls, sink, fix_part: str, multi_parts: Iterable[str], render: Callable):
+        # 每条语句的生成耗时只统计生成器内部的时间，不含消费方处理上一条语句的时间
+        labels = dict(schema=metrics.statement_schema(fix_part))
+        rows = [0]
+
+        def _counted():
+            for part in multi_parts:
+                rows[0] += 1
+                yield part
+        begin = time.perf_counter()
+        try:
+            for stmt in render(_counted()):
+                sink.observe('ngsm_render_seconds', time.perf_counter() - begin, **labels)
+                sink.counter('ngsm_statements_total', **labels)
+                sink.counter('ngsm_statement_bytes_total', StmtFormatter.byte_length(stmt), **labels)
+                yield stmt
+                begin = time.perf_counter()
+        finally:
+            if labels['schema']:
+                sink.counter('ngsm_rows_rendered_total', rows[0], **labels)
+
+    @classmethod
+    def _iter_couple_stmts(cls, fix_part: str, multi_parts: Iterable[str], multi_part_splitter: str,
+                           max_bytes: int, max_rows: int, budget: Callable):
+        for stmt, _ in cls._iter_counted_stmts(fix_part, multi_parts, multi_part_splitter, max_bytes, max_rows,
+                                               budget):
+            yield stmt
+
+    @classmethod
+    def _iter_counted_stmts(cls, fix_part: str, multi_parts: Iterable[str], multi_part_splitter: str,
+                            max_bytes: int, max_rows: int, budget: Callable):
+        max_bytes = int(Setting.max_stmt_length) if max_bytes is None else max_bytes
+        if max_rows is not None and max_rows < 1:
+            raise ValueError('max_rows require integer > 0, got {} instead'.format(max_rows))
+        hard_limit = int(Setting.max_stmt_length) if budget is not None else max_bytes
+        fix_length = StmtFormatter.byte_length(fix_part) + 1
+        splitter_length = StmtFormatter.byte_length(multi_part_splitter)
+        batch, batch_length = [], fix_length
+        if budget is not None:
+            max_bytes, max_rows = budget()
+        for part in multi_parts:
+            part_length = StmtFormatter.byte_length(part)
+            if fix_length + part_length > hard_limit:
+                raise ValueError('single row of {} bytes exceeds max_bytes: {}'.format(part_length, hard_limit))
+            if batch and (batch_length + splitter_length + part_length > max_bytes or
+                          (max_rows is not None and len(batch) >= max_rows)):
+                yield ''.join([fix_part, multi_part_splitter.join(batch), ';']), len(batch)
+                batch, batch_length = [], fix_length
+                if budget is not None:
+                    max_bytes, max_rows = budget()
+            batch_length += part_length + (splitter_length if batch else 0)
+            batch.append(part)
+        if batch:
+            yield ''.join([fix_part, multi_part_splitter.join(batch), ';']), len(batch)
+
+    @classmethod
+    def _iter_validated_stmts(cls, schema: SchemaModel, instances: Iterable, encode, fix_stmt: str,
+                              max_bytes: int, max_rows: int, budget: Callable = None):
+        # 合法实例的语句全部产出后再抛出校验错误
+        encoder = schema.row_encoder()
+        report = ValidationReport(schema_name=schema.name)
+        multi_parts = (encode(encoder, instance) for instance in schema.iter_validated(instances, report=report))
+        yield from cls.iter_couple_stmts(fix_part=fix_stmt, multi_parts=multi_parts, multi_part_splitter=', ',
+                                         max_bytes=max_bytes, max_rows=max_rows, budget=budget)
+        report.raise_for_issues()
+
+    @classmethod
+    def _edge_fix_stmt(cls, schema: SchemaModel, if_not_exists: bool):
+        return schema.row_encoder().header(if_not_exists)
 
     @classmethod
     def edge(cls, schema: SchemaModel, edges: List[EdgeModel], if_not_exists: bool):
         if not edges:
             return None
-        fix_stmt = 'Insert Edge{0}{1}({2}) VALUES '.format(
-            ' IF NOT EXISTS ' if if_not_exists else ' ',
-            schema.name,
-            ','.join(schema.property_names()),
-        )
-        multi_parts = [Insert._edge(schema=schema, edge=edge) for edge in edges]
-        return cls.split_into_couple_stmts(fix_part=fix_stmt, multi_part=multi_parts, multi_part_splitter=', ')
+        if Setting.deferred_validation:
+            schema.validate_instances(edges).raise_for_issues()
+        fix_stmt = cls._edge_fix_stmt(schema=schema, if_not_exists=if_not_exists)
+        encoder = schema.row_encoder()
+        with metrics.get_sink().span('ngsm_render', schema=schema.name):
+            multi_parts = [Insert._encode_edge(encoder=encoder, edge=edge) for edge in edges]
+            return cls.split_into_couple_stmts(fix_part=fix_stmt, multi_part=multi_parts, multi_part_splitter=', ')
+
+    @classmethod
+    def iter_edge_statements(cls, schema: SchemaModel, edges: Iterable[EdgeModel], if_not_exists: bool = False,
+                             max_bytes: int = None, max_rows: int = None, budget: Callable = None):
+        """
+        惰性消费边实例，产出不超过字节预算的插入语句
+        延迟校验模式下只为合法的实例生成语句，全部消费完后对不合法的实例抛出 ValidationError
+        """
+        fix_stmt = cls._edge_fix_stmt(schema=schema, if_not_exists=if_not_exists)
+        encoder = schema.row_encoder()
+        if Setting.deferred_validation:
+            return cls._iter_validated_stmts(schema=schema, instances=edges, encode=Insert._encode_edge,
+                                             fix_stmt=fix_stmt, max_bytes=max_bytes, max_rows=max_rows,
+                                             budget=budget)
+        multi_parts = (Insert._encode_edge(encoder=encoder, edge=edge) for edge in edges)
+        return cls.iter_couple_stmts(fix_part=fix_stmt, multi_parts=multi_parts, multi_part_splitter=', ',
+                                     max_bytes=max_bytes, max_rows=max_rows, budget=budget)
+
+    @classmethod
+    def edge_batch(cls, batch: EdgeBatch, if_not_exists: bool):
+        """由列式边批次生成插入语句，返回形式与 Insert.edge 一致"""
+        if not len(batch):
+            return None
+        fix_stmt = cls._edge_fix_stmt(schema=batch.schema, if_not_exists=if_not_exists)
+        with metrics.get_sink().span('ngsm_render', schema=batch.schema.name):
+            multi_parts = list(cls._edge_rows(batch))
+            return cls.split_into_couple_stmts(fix_part=fix_stmt, multi_part=multi_parts, multi_part_splitter=', ')
+
+    @classmethod
+    def iter_edge_batch_statements(cls, batch: EdgeBatch, if_not_exists: bool = False,
+                                   max_bytes: int = None, max_rows: int = None, budget: Callable = None):
+        fix_stmt = cls._edge_fix_stmt(schema=batch.schema, if_not_exists=if_not_exists)
+        return cls.iter_couple_stmts(fix_part=fix_stmt, multi_parts=cls._edge_rows(batch), multi_part_splitter=', ',
+                                     max_bytes=max_bytes, max_rows=max_rows, budget=budget)
+
+    @classmethod
+    def _edge_rows(cls, batch: EdgeBatch):
+        values = batch.schema.row_encoder().encode_columns(
+            [batch.columns[p.name] for p in batch.schema.properties], size=len(batch))
+        ranks = ['' if not rank else '@{}'.format(rank) for rank in batch.ranks] if any(batch.ranks) \
+            else itertools.repeat('')
+        return map('\"{0}\"->\"{1}\"{2}:({3})'.format, batch.src_vids, batch.dst_vids, ranks, values)
 
     @classmethod
     def _edge(cls, schema: SchemaModel, edge: EdgeModel):
+        return cls._encode_edge(encoder=schema.row_encoder(), edge=edge)
+
+    @classmethod
+    def _encode_edge(cls, encoder: RowEncoder, edge: EdgeModel):
+        # SchemaModel.compile_class 生成的实例自带按列编码
+        to_values = getattr(edge, 'to_values', None)
         return '\"{0}\"->\"{1}\"{2}:({3})'.format(
             edge.src_vid,
             edge.dst_vid,
             '' if not edge.rank else '@{}'.format(edge.rank),
-            Insert.properties(schema.properties, edge)
+            encoder.encode_properties(edge.properties) if to_values is None else to_values()
         )
 
+    @classmethod
+    def _vertex_fix_stmt(cls, schema: SchemaModel, if_not_exists: bool):
+        return schema.row_encoder().header(if_not_exists)
+
     @classmethod
     def vertex(cls, schema: SchemaModel, vertexes: List[VertexModel], if_not_exists: bool):
         if not vertexes:
             return None
-        fix_stmt = 'Insert VERTEX{0}{1}({2}) VALUES '.format(
-            ' IF NOT EXISTS ' if if_not_exists else ' ',
-            schema.name,
-            ', '.join(schema.property_names()),
-        )
-        multi_parts = [Insert._vertex(schema=schema, vertex=vertex) for vertex in vertexes]
-        return cls.split_into_couple_stmts(fix_part=fix_stmt, multi_part=multi_parts, multi_part_splitter=', ')
+        if Setting.deferred_validation:
+            schema.validate_instances(vertexes).raise_for_issues()
+        cache.invalidate_vertices(schema.name, (vertex.vid for vertex in vertexes))
+        fix_stmt = cls._vertex_fix_stmt(schema=schema, if_not_exists=if_not_exists)
+        encoder = schema.row_encoder()
+        with metrics.get_sink().span('ngsm_render', schema=schema.name):
+            multi_parts = [Insert._encode_vertex(encoder=encoder, vertex=vertex) for vertex in vertexes]
+            return cls.split_into_couple_stmts(fix_part=fix_stmt, multi_part=multi_parts, multi_part_splitter=', ')
+
+    @classmethod
+    def iter_vertex_statements(cls, schema: SchemaModel, vertexes: Iterable[VertexModel],
+                               if_not_exists: bool = False, max_bytes: int = None, max_rows: int = None,
+                               budget: Callable = None):
+        """
+        惰性消费节点实例，产出不超过字节预算的插入语句
+        延迟校验模式下只为合法的实例生成语句，全部消费完后对不合法的实例抛出 ValidationError
+        """
+        fix_stmt = cls._vertex_fix_stmt(schema=schema, if_not_exists=if_not_exists)
+        encoder = schema.row_encoder()
+        vertexes = cache.invalidating(schema.name, vertexes)
+        if Setting.deferred_validation:
+            return cls._iter_validated_stmts(schema=schema, instances=vertexes, encode=Insert._encode_vertex,
+                                             fix_stmt=fix_stmt, max_bytes=max_bytes, max_rows=max_rows,
+                                             budget=budget)
+        multi_parts = (Insert._encode_vertex(encoder=encoder, vertex=vertex) for vertex in vertexes)
+        return cls.iter_couple_stmts(fix_part=fix_stmt, multi_parts=multi_parts, multi_part_splitter=', ',
+                                     max_bytes=max_bytes, max_rows=max_rows, budget=budget)
+
+    @classmethod
+    def vertex_batch(cls, batch: VertexBatch, if_not_exists: bool):
+        """由列式节点批次生成插入语句，返回形式与 Insert.vertex 一致"""
+        if not len(batch):
+            return None
+        cache.invalidate_vertices(batch.schema.name, batch.vids)
+        fix_stmt = cls._vertex_fix_stmt(schema=batch.schema, if_not_exists=if_not_exists)
+        with metrics.get_sink().span('ngsm_render', schema=batch.schema.name):
+            multi_parts = list(cls._vertex_rows(batch))
+            return cls.split_into_couple_stmts(fix_part=fix_stmt, multi_part=multi_parts, multi_part_splitter=', ')
+
+    @classmethod
+    def iter_vertex_batch_statements(cls, batch: VertexBatch, if_not_exists: bool = False,
+                                     max_bytes: int = None, max_rows: int = None, budget: Callable = None):
+        cache.invalidate_vertices(batch.schema.name, batch.vids)
+        fix_stmt = cls._vertex_fix_stmt(schema=batch.schema, if_not_exists=if_not_exists)
+        return cls.iter_couple_stmts(fix_part=fix_stmt, multi_parts=cls._vertex_rows(batch),
+                                     multi_part_splitter=', ', max_bytes=max_bytes, max_rows=max_rows,
+                                     budget=budget)
+
+    @classmethod
+    def _vertex_rows(cls, batch: VertexBatch):
+        # 整批按列编码，逐行只剩拼接
+        values = batch.schema.row_encoder().encode_columns(
+            [batch.columns[p.name] for p in batch.schema.properties], size=len(batch))
+        return map('\"{}\":({})'.format, batch.vids, values)
 
     @classmethod
     def _vertex(cls, schema: SchemaModel, vertex: VertexModel):
-        return '\"{}\":({})'.format(vertex.vid, Insert.properties(schema.properties, vertex))
+        return cls._encode_vertex(encoder=schema.row_encoder(), vertex=vertex)
+
+    @classmethod
+    def _encode_vertex(cls, encoder: RowEncoder, vertex: VertexModel):
+        to_values = getattr(vertex, 'to_values', None)
+        return '\"{}\":({})'.format(vertex.vid, encoder.encode_properties(vertex.properties) if to_values is None
+                                    else to_values())
 
     @classmethod
     def properties(cls, properties: List[PropertySchemaModel], instance: (VertexModel, EdgeModel)):
@@ -115,13 +348,20 @@ class Create:
         )
 
     @classmethod
-    def _schema_index(cls, schema_type, schema: SchemaModel, if_not_exists: bool):
-        return 'CREATE {0} {1}INDEX {2} on {3}();'.format(
+    def index(cls, schema_type, schema: SchemaModel, index_name: str, columns: str = '', if_not_exists: bool = True):
+        """按给定的索引名称与列生成建索引语句，不会把索引记录到schema中"""
+        return 'CREATE {0} {1}INDEX {2} on {3}({4});'.format(
             schema_type,
             'IF NOT EXISTS ' if if_not_exists else '',
-            schema.build_schema_index(),
-            schema.name
-        ) if schema.index else None
+            index_name,
+            schema.name,
+            columns
+        )
+
+    @classmethod
+    def _schema_index(cls, schema_type, schema: SchemaModel, if_not_exists: bool):
+        return cls.index(schema_type, schema, schema.build_schema_index(),
+                         if_not_exists=if_not_exists) if schema.index else None
 
     @classmethod
     def _property_index(cls, schema_type, schema: SchemaModel,
@@ -137,13 +377,9 @@ class Create:
             build_index_func = schema.build_compound_property_index
             build_index_type_func = cls._compound_property_index_type
 
-        return 'CREATE {0} {1}INDEX {2} on {3}({4});'.format(
-            schema_type,
-            'IF NOT EXISTS ' if if_not_exists else '',
-            build_index_func(property_),
-            schema.name,
-            build_index_type_func(property_, string_length=string_length)
-        )
+        return cls.index(schema_type, schema, build_index_func(property_),
+                         columns=build_index_type_func(property_, string_length=string_length),
+                         if_not_exists=if_not_exists)
 
     @classmethod
     def _property_index_type(cls, property_: PropertySchemaModel, string_length: int):
@@ -184,11 +420,68 @@ class Create:
                                    if_not_exists=if_not_exists, string_length=string_length)
 
 
+class Alter:
+    """
+    https://docs.nebula-graph.com.cn/3.2.0/3.ngql-guide/10.tag-statements/3.alter-tag/
+    """
+
+    @classmethod
+    def _(cls, schema_type: str, schema_name: str, action: str, definitions: List[str]):
+        return 'ALTER {0} {1} {2} ({3});'.format(schema_type, schema_name, action, ', '.join(definitions))
+
+    @classmethod
+    def add_properties(cls, schema_type: str, schema: SchemaModel, properties: List[PropertySchemaModel]):
+        if not properties:
+            return None
+        return cls._(schema_type=schema_type, schema_name=schema.name, action='ADD',
+                     definitions=[Create._property_(p) for p in properties])
+
+    @classmethod
+    def change_properties(cls, schema_type: str, schema: SchemaModel, properties: List[PropertySchemaModel]):
+        if not properties:
+            return None
+        return cls._(schema_type=schema_type, schema_name=schema.name, action='CHANGE',
+                     definitions=[Create._property_(p) for p in properties])
+
+    @classmethod
+    def drop_properties(cls, schema_type: str, schema: SchemaModel, property_names: List[str]):
+        if not property_names:
+            return None
+        return cls._(schema_type=schema_type, schema_name=schema.name, action='DROP', definitions=property_names)
+
+
+class Drop:
+
+    @classmethod
+    def index(cls, schema_type: str, index_name: str, if_exists: bool):
+        return 'DROP {0} INDEX {1}{2};'.format(schema_type, 'IF EXISTS ' if if_exists else '', index_name)
+
+
 class Delete:
 
     @classmethod
-    def vertex(cls, schema: SchemaModel):
-        pass
+    def vertex(cls, schema: SchemaModel, vids: (List[str], Tuple[str]), with_edge: bool = False):
+        """
+        https://docs.nebula-graph.com.cn/3.2.0/3.ngql-guide/12.vertex-statements/4.delete-vertex/
+        + vids 为实际存入图数据库中的vid
+        + with_edge 为真时同时删除与节点相关的出边和入边
+        + DELETE VERTEX 删除该vid上的全部tag，不限于schema，schema 只用于检查节点属于Tag；
+          因此缓存中该vid在所有tag下的数据都会失效
+        """
+        if not isinstance(schema, TagSchemaModel):
+            raise TypeError('require TagSchemaModel, got {} instead'.format(type(schema)))
+        if not isinstance(vids, (list, tuple)):
+            raise TypeError('required list or tuple type, got {}'.format(type(vids)))
+        if not vids:
+            return None
+        cache.invalidate_vertices(None, vids)
+        stmts = list(Insert.iter_couple_stmts(fix_part='DELETE VERTEX ',
+                                              multi_parts=(ValueFormatter.encode_vid(vid) for vid in vids),
+                                              multi_part_splitter=', ',
+                                              max_bytes=int(Setting.max_stmt_length) - len(' WITH EDGE')))
+        if with_edge:
+            stmts = ['{} WITH EDGE;'.format(stmt[:-1]) for stmt in stmts]
+        return stmts[0] if len(stmts) == 1 else stmts
 
     @classmethod
     def edge(cls, schema: SchemaModel, edge_pairs: (List[tuple], Tuple[tuple])):
@@ -208,14 +501,245 @@ class Delete:
 class Update:
 
     @classmethod
-    def edge(cls, schema: SchemaModel, edge_pair: Tuple, new_properties: dict):
-        # 目前仅支持单次更新一条边的属性
-        return 'UPDATE EDGE ON {} {} SET {}' \
-               ';'.format(schema.name,
-                          ValueFormatter.edge(edge_info=edge_pair),
-                          ', '.join(['{} = {}'.format(k, ValueFormatter.encode(schema.property_type(k), v))
-                                     for k, v in new_properties.items()])
-                          )
+    def edge(cls, schema: SchemaModel, edge_pair: Tuple, new_properties: dict, upsert: bool = False):
+        # 单次更新一条边的属性，批量更新见 Update.edges
+        return '{} EDGE ON {} {} SET {};'.format('UPSERT' if upsert else 'UPDATE',
+                                                 schema.name,
+                                                 ValueFormatter.edge(edge_info=edge_pair),
+                                                 schema.row_encoder().encode_assignments(new_properties))
+
+    @classmethod
+    def vertex(cls, schema: SchemaModel, vid: str, new_properties: dict, upsert: bool = False):
+        """
+        https://docs.nebula-graph.com.cn/3.2.0/3.ngql-guide/12.vertex-statements/2.update-vertex/
+        vid 为实际存入图数据库中的vid
+        """
+        cache.invalidate_vertices(schema.name, (vid,))
+        return '{} VERTEX ON {} {} SET {};'.format('UPSERT' if upsert else 'UPDATE',
+                                                   schema.name,
+                                                   ValueFormatter.encode_vid(vid),
+                                                   schema.row_encoder().encode_assignments(new_properties))
+
+    @classmethod
+    def _grouped(cls, schema: SchemaModel, updates: Iterable[tuple]):
+        """
+        同一实例的多次更新按先后合并，再把SET子句相同的实例排在一起，每种SET子句只编码一次
+        返回 [(SET子句, [实例, ...]), ...]
+        """
+        merged = dict()
+        for target, new_properties in updates:
+            merged.setdefault(target, dict()).update(new_properties)
+        encoder = schema.row_encoder()
+        groups, encoded = dict(), dict()
+        for target, new_properties in merged.items():
+            key = tuple(new_properties.items())
+            try:
+                assignments = encoded.get(key)
+            except TypeError:
+                # 属性值不可哈希时不复用编码结果
+                key, assignments = None, None
+            if assignments is None:
+                assignments = encoder.encode_assignments(new_properties)
+                if key is not None:
+                    encoded[key] = assignments
+            groups.setdefault(assignments, []).append(target)
+        return list(groups.items())
+
+    @classmethod
+    def _payloads(cls, stmts: Iterable[str], max_bytes: int = None):
+        """把多条语句（不含结尾分号）合并为不超过字节预算的多语句请求"""
+        return list(Insert.iter_couple_stmts(fix_part='', multi_parts=stmts, multi_part_splitter='; ',
+                                             max_bytes=max_bytes))
+
+    @classmethod
+    def vertices(cls, schema: SchemaModel, updates: Iterable[tuple], upsert: bool = False, max_bytes: int = None):
+        """
+        批量更新节点
+        :param updates: [(vid, new_properties), ...]，vid 为实际存入图数据库中的vid
+        :return: 多语句请求的列表，每个请求不超过 max_bytes，默认为 Setting.max_stmt_length
+        """
+        action = 'UPSERT' if upsert else 'UPDATE'
+        groups = cls._grouped(schema, updates)
+        cache.invalidate_vertices(schema.name, (vid for _, vids in groups for vid in vids))
+        stmts = ('{} VERTEX ON {} {} SET {}'.format(action, schema.name, ValueFormatter.encode_vid(vid), assignments)
+                 for assignments, vids in groups for vid in vids)
+        return cls._payloads(stmts, max_bytes=max_bytes)
+
+    @classmethod
+    def edges(cls, schema: SchemaModel, updates: Iterable[tuple], upsert: bool = False, max_bytes: int = None):
+        """
+        批量更新边
+        :param updates: [(edge_pair, new_properties), ...]，edge_pair 的形式同 Update.edge
+        :return: 多语句请求的列表，每个请求不超过 max_bytes，默认为 Setting.max_stmt_length
+        """
+        action = 'UPSERT' if upsert else 'UPDATE'
+        stmts = ('{} EDGE ON {} {} SET {}'.format(action, schema.name, ValueFormatter.edge(edge_info=edge_pair),
+                                                  assignments)
+                 for assignments, edge_pairs in cls._grouped(schema, ((tuple(p), v) for p, v in updates))
+                 for edge_pair in edge_pairs)
+        return cls._payloads(stmts, max_bytes=max_bytes)
+
+
+class Query:
+    """读语句的公共部分"""
+
+    Operators = ('==', '!=', '>', '>=', '<', '<=', 'STARTS WITH', 'ENDS WITH', 'CONTAINS')
+
+    @classmethod
+    def property_ref(cls, schema: SchemaModel, p_name: str, in_lookup: bool = False):
+        """tag属性写作 tag.p；edge属性在 LOOKUP 的条件中写作 edge.p，其余写作 properties(edge).p"""
+        schema.property_type(p_name)
+        if isinstance(schema, TagSchemaModel) or in_lookup:
+            return '{}.{}'.format(schema.name, p_name)
+        return 'properties(edge).{}'.format(p_name)
+
+    @classmethod
+    def where(cls, schema: SchemaModel, predicates: (dict, List[tuple]) = None, in_lookup: bool = False):
+        """
+        :param predicates: {属性名: 值} 表示相等，或 [(属性名, 运算符, 值), ...]，多个条件以 AND 连接
+        """
+        if not predicates:
+            return ''
+        predicates = [(k, '==', v) for k, v in predicates.items()] if isinstance(predicates, dict) else predicates
+        conditions = []
+        for p_name, op, value in predicates:
+            if op.upper() not in cls.Operators:
+                raise ValueError('operator: {} is not supported, use one of {}'.format(op, cls.Operators))
+            conditions.append('{} {} {}'.format(cls.property_ref(schema, p_name, in_lookup), op.upper(),
+                                                Insert._property_(schema.property_type(p_name), value)))
+        return ' WHERE {}'.format(' AND '.join(conditions))
+
+    # key_columns 的别名，与属性名区分开，属性不能使用这些名称
+    TagKeyColumns = ('__vid',)
+    EdgeKeyColumns = ('__src', '__dst', '__rank')
+
+    @classmethod
+    def key_columns(cls, schema: SchemaModel):
+        """结果中唯一确定一个实例的列"""
+        return list(cls.TagKeyColumns if isinstance(schema, TagSchemaModel) else cls.EdgeKeyColumns)
+
+    @classmethod
+    def key_items(cls, schema: SchemaModel):
+        """YIELD 中的 key_columns"""
+        functions = ['id(vertex)'] if isinstance(schema, TagSchemaModel) else ['src(edge)', 'dst(edge)', 'rank(edge)']
+        return ['{} AS {}'.format(f, c) for f, c in zip(functions, cls.key_columns(schema))]
+
+    @classmethod
+    def yield_clause(cls, schema: SchemaModel, properties: List[str] = None):
+        """YIELD 子句，先是 key_columns 再是属性，属性列以属性名为别名，默认为全部属性"""
+        properties = schema.property_names() if properties is None else properties
+        reserved = set(cls.key_columns(schema)).intersection(properties)
+        if reserved:
+            raise ValueError('properties: {} of {} conflict with key columns'.format(sorted(reserved), schema.name))
+        items = cls.key_items(schema)
+        items.extend(['{} AS {}'.format(cls.property_ref(schema, p_name), p_name)
+                      for p_name in properties])
+        return ' YIELD {}'.format(', '.join(items))
+
+    @classmethod
+    def batched(cls, fix_part: str, multi_parts: Iterable[str], suffix: str, max_bytes: int = None,
+                max_rows: int = None):
+        """把大量vid等打包进不超过字节预算的多条语句，suffix 接在每条语句的末尾"""
+        max_bytes = int(Setting.max_stmt_length) if max_bytes is None else max_bytes
+        stmts = Insert.iter_couple_stmts(fix_part=fix_part, multi_parts=multi_parts, multi_part_splitter=', ',
+                                         max_bytes=max_bytes - StmtFormatter.byte_length(suffix), max_rows=max_rows)
+        return [''.join([stmt[:-1], suffix, ';']) for stmt in stmts]
+
+
+class Fetch:
+    """
+    https://docs.nebula-graph.com.cn/3.2.0/3.ngql-guide/7.general-query-statements/4.fetch/
+    多个vid或边合并到同一条 FETCH 语句中，返回语句列表
+    """
+
+    @classmethod
+    def vertices(cls, schema: TagSchemaModel, vids: Iterable[str], properties: List[str] = None,
+                 max_bytes: int = None, max_rows: int = None):
+        """vids 为实际存入图数据库中的vid"""
+        return Query.batched(fix_part='FETCH PROP ON {} '.format(schema.name),
+                             multi_parts=(ValueFormatter.encode_vid(vid) for vid in vids),
+                             suffix=Query.yield_clause(schema, properties), max_bytes=max_bytes, max_rows=max_rows)
+
+    @classmethod
+    def edges(cls, schema: EdgeSchemaModel, edge_pairs: Iterable[tuple], properties: List[str] = None,
+              max_bytes: int = None, max_rows: int = None):
+        """edge_pairs: [(src_vid, rank, dst_vid), ...]，与 Delete.edge 一致"""
+        return Query.batched(fix_part='FETCH PROP ON {} '.format(schema.name),
+                             multi_parts=(ValueFormatter.edge(edge_info=edge_pair) for edge_pair in edge_pairs),
+                             suffix=Query.yield_clause(schema, properties), max_bytes=max_bytes, max_rows=max_rows)
+
+
+class Lookup:
+    """
+    https://docs.nebula-graph.com.cn/3.2.0/3.ngql-guide/7.general-query-statements/5.lookup/
+    条件中的属性需要有索引；分页时按 Query.key_columns 排序，保证各页之间不重复、不遗漏
+    """
+
+    @classmethod
+    def _(cls, schema: SchemaModel, predicates: (dict, List[tuple]) = None, properties: List[str] = None):
+        return 'LOOKUP ON {}{}{}'.format(schema.name, Query.where(schema, predicates, in_lookup=True),
+                                         Query.yield_clause(schema, properties))
+
+    @classmethod
+    def query(cls, schema: SchemaModel, predicates: (dict, List[tuple]) = None, properties: List[str] = None):
+        return '{};'.format(cls._(schema, predicates, properties))
+
+    @classmethod
+    def _order_by(cls, schema: SchemaModel):
+        return ' | ORDER BY {}'.format(', '.join(['$-.{}'.format(c) for c in Query.key_columns(schema)]))
+
+    @classmethod
+    def page(cls, schema: SchemaModel, predicates: (dict, List[tuple]) = None, properties: List[str] = None,
+             limit: int = 1000, offset: int = 0):
+        """LIMIT/OFFSET 分页，越往后服务端需要跳过的行越多"""
+        return '{}{} | LIMIT {}, {};'.format(cls._(schema, predicates, properties), cls._order_by(schema),
+                                            offset, limit)
+
+    @classmethod
+    def _after(cls, schema: SchemaModel, cursor: tuple):
+        # 按 key_columns 的字典序取大于 cursor 的行
+        columns = Query.key_columns(schema)
+        values = [ValueFormatter.encode_vid(v) for v in cursor[:2]] + [str(v) for v in cursor[2:]]
+        condition = '$-.{} > {}'.format(columns[-1], values[-1])
+        for column, value in reversed(list(zip(columns[:-1], values[:-1]))):
+            condition = '$-.{0} > {1} OR ($-.{0} == {1} AND ({2}))'.format(column, value, condition)
+        return condition
+
+    @classmethod
+    def page_after(cls, schema: SchemaModel, predicates: (dict, List[tuple]) = None, properties: List[str] = None,
+                   limit: int = 1000, cursor: tuple = None):
+        """
+        按键值游标分页，cursor 为上一页最后一行的 key_columns 取值，首页为None
+        tag 的 cursor 为 (vid,)，edge type 为 (src_vid, dst_vid, rank)
+        """
+        stmt = cls._(schema, predicates, properties)
+        if cursor is not None:
+            columns = Query.key_columns(schema) + (schema.property_names() if properties is None else properties)
+            stmt = '{} | YIELD {} WHERE {}'.format(stmt, ', '.join(['$-.{0} AS {0}'.format(c) for c in columns]),
+                                                  cls._after(schema, cursor))
+        return '{}{} | LIMIT {};'.format(stmt, cls._order_by(schema), limit)
+
+
+class Go:
+    """
+    https://docs.nebula-graph.com.cn/3.2.0/3.ngql-guide/7.general-query-statements/3.go/
+    从多个起点沿 edge type 遍历，返回经过的边，多个起点合并到同一条语句中
+    """
+
+    Directions = ('REVERSELY', 'BIDIRECT')
+
+    @classmethod
+    def over(cls, schema: EdgeSchemaModel, vids: Iterable[str], steps: int = 1, direction: str = None,
+             predicates: (dict, List[tuple]) = None, properties: List[str] = None,
+             max_bytes: int = None, max_rows: int = None):
+        """vids 为实际存入图数据库中的vid，direction 默认为出边方向"""
+        if direction is not None and direction.upper() not in cls.Directions:
+            raise ValueError('direction: {} is not supported, use one of {}'.format(direction, cls.Directions))
+        suffix = ' OVER {}{}{}{}'.format(schema.name, '' if direction is None else ' {}'.format(direction.upper()),
+                                          Query.where(schema, predicates), Query.yield_clause(schema, properties))
+        return Query.batched(fix_part='GO {} STEPS FROM '.format(steps),
+                             multi_parts=(ValueFormatter.encode_vid(vid) for vid in vids),
+                             suffix=suffix, max_bytes=max_bytes, max_rows=max_rows)
 
 
 class RebuildIndex:
@@ -311,6 +835,24 @@ class Vertex:
     def insert(cls, schema: SchemaModel, vertexes: List[VertexModel], if_not_exists: bool):
         return Insert.vertex(schema=schema, vertexes=vertexes, if_not_exists=if_not_exists)
 
+    @classmethod
+    def insert_batch(cls, batch: VertexBatch, if_not_exists: bool):
+        return Insert.vertex_batch(batch=batch, if_not_exists=if_not_exists)
+
+    @classmethod
+    def delete(cls, schema: SchemaModel, vids: (List[str], Tuple[str]), with_edge: bool = False):
+        return Delete.vertex(schema=schema, vids=vids, with_edge=with_edge)
+
+    @classmethod
+    def update(cls, schema: TagSchemaModel, updates: Iterable[tuple], upsert: bool = False):
+        return Update.vertices(schema=schema, updates=updates, upsert=upsert)
+
+    @classmethod
+    def iter_insert(cls, schema: SchemaModel, vertexes: Iterable[VertexModel], if_not_exists: bool,
+                    max_bytes: int = None, max_rows: int = None, budget: Callable = None):
+        return Insert.iter_vertex_statements(schema=schema, vertexes=vertexes, if_not_exists=if_not_exists,
+                                             max_bytes=max_bytes, max_rows=max_rows, budget=budget)
+
 
 class Edge:
 
@@ -318,11 +860,25 @@ class Edge:
     def insert(cls, schema: SchemaModel, edges: List[EdgeModel], if_not_exists: bool):
         return Insert.edge(schema=schema, edges=edges, if_not_exists=if_not_exists)
 
+    @classmethod
+    def insert_batch(cls, batch: EdgeBatch, if_not_exists: bool):
+        return Insert.edge_batch(batch=batch, if_not_exists=if_not_exists)
+
+    @classmethod
+    def iter_insert(cls, schema: SchemaModel, edges: Iterable[EdgeModel], if_not_exists: bool,
+                    max_bytes: int = None, max_rows: int = None, budget: Callable = None):
+        return Insert.iter_edge_statements(schema=schema, edges=edges, if_not_exists=if_not_exists,
+                                           max_bytes=max_bytes, max_rows=max_rows, budget=budget)
+
     @classmethod
     def delete(cls, schema: SchemaModel, edge_pairs: (List[tuple], Tuple[tuple])):
         return Delete.edge(schema=schema, edge_pairs=edge_pairs)
 
     @classmethod
     def update(cls, schema: EdgeSchemaModel, edge_pair: tuple, new_properties: dict):
-        # 目前仅支持单条更新
+        # 单条更新，批量更新见 Edge.update_batch
         return Update.edge(schema=schema, edge_pair=edge_pair, new_properties=new_properties)
+
+    @classmethod
+    def update_batch(cls, schema: EdgeSchemaModel, updates: Iterable[tuple], upsert: bool = False):
+        return Update.edges(schema=schema, updates=updates, upsert=upsert)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import calendar
+import datetime
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+import attr
+
+from ngsm import cache
+from ngsm.base import NDataTypes
+from ngsm.base import Setting
+from ngsm.model import SchemaModel
+from ngsm.ngql import Query
+
+
+def _ttypes():
+    # 只在生成参数时导入 nebula3
+    from nebula3.common import ttypes
+    return ttypes
+
+
+def to_value(type_, py_value):
+    """把python值转为 nebula3 的 Value，None 转为 NULL"""
+    ttypes = _ttypes()
+    if py_value is None:
+        return ttypes.Value(nVal=ttypes.NullType.__NULL__)
+    if type_ in NDataTypes.integers() or type_ == NDataTypes.TIMESTAMP.value:
+        if isinstance(py_value, datetime.datetime):
+            # 不带时区的时间视为UTC，与 ValueFormatter 编码的时间字面量一致
+            py_value = calendar.timegm(py_value.utctimetuple())
+        return ttypes.Value(iVal=int(py_value))
+    if type_ == NDataTypes.STRING.value:
+        return ttypes.Value(sVal=str(py_value).encode('utf-8'))
+    if type_ == NDataTypes.BOOL.value:
+        return ttypes.Value(bVal=bool(py_value))
+    if type_ in (NDataTypes.FLOAT.value, NDataTypes.DOUBLE.value):
+        return ttypes.Value(fVal=float(py_value))
+    if type_ == NDataTypes.DATE.value:
+        return ttypes.Value(dVal=ttypes.Date(py_value.year, py_value.month, py_value.day))
+    if type_ == NDataTypes.TIME.value:
+        return ttypes.Value(tVal=ttypes.Time(py_value.hour, py_value.minute, py_value.second,
+                                             py_value.microsecond))
+    if type_ == NDataTypes.DATETIME.value:
+        return ttypes.Value(dtVal=ttypes.DateTime(py_value.year, py_value.month, py_value.day, py_value.hour,
+                                                  py_value.minute, py_value.second, py_value.microsecond))
+    if type_ == NDataTypes.DURATION.value:
+        return ttypes.Value(duVal=ttypes.Duration(py_value.days * 86400 + py_value.seconds,
+                                                  py_value.microseconds, 0))
+    raise ValueError('{} is not support to encode yet'.format(type_))
+
+
+def vid_value(vid, vid_type_is_fixed_string: bool = True):
+    return to_value(NDataTypes.STRING.value if vid_type_is_fixed_string else NDataTypes.INT64.value, vid)
+
+
+@attr.s(slots=True)
+class ParamStatement:
+    """带 $参数 占位符的语句与参数表，参数值为 nebula3 的 Value"""
+    stmt = attr.ib(type=str)
+    params = attr.ib(type=dict, factory=dict)
+
+    def execute(self, session):
+        return session.execute_parameter(self.stmt, self.params)
+
+
+class Templates:
+    """
+    按 (schema类型, schema名称, 语句种类, 参数结构) 缓存的语句模板，缓存满后不再新增
+    tag 与 edge type 可以同名，键中必须包含schema类型
+    """
+    _cache = dict()
+
+    @classmethod
+    def get(cls, key: tuple, build):
+        template = cls._cache.get(key)
+        if template is None:
+            template = build()
+            if len(cls._cache) < Setting.param_template_cache_size:
+                cls._cache[key] = template
+        return template
+
+    @classmethod
+    def clear(cls):
+        cls._cache.clear()
+
+
+def _chunks(items: list, chunk_size: int):
+    if chunk_size < 1:
+        raise ValueError('chunk_size require integer > 0, got {} instead'.format(chunk_size))
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def _property_params(schema: SchemaModel, new_properties: dict):
+    return {'p_{}'.format(k): to_value(schema.property_type(k), v) for k, v in new_properties.items()}
+
+
+class ParamDelete:
+    """
+    参数化的 DELETE，每个vid一个参数 $v0、$v1 ...
+    按 chunk_size 分块，满块共用同一个模板
+    """
+
+    @classmethod
+    def vertex(cls, schema: SchemaModel, vids: (List[str], Tuple[str]), with_edge: bool = False,
+               chunk_size: int = 1000, vid_type_is_fixed_string: bool = True):
+        """vids 为实际存入图数据库中的vid，返回 ParamStatement 的列表"""
+        vids = list(vids)
+        # DELETE VERTEX 删除该vid的全部tag，不只是schema
+        cache.invalidate_vertices(None, vids)
+        stmts = []
+        for chunk in _chunks(vids, chunk_size):
+            stmt = Templates.get((schema.schema_type(), schema.name, 'DELETE', 'VERTEX', len(chunk), with_edge),
+                                 lambda: 'DELETE VERTEX {}{};'.format(
+                                     ', '.join(['$v{}'.format(i) for i in range(len(chunk))]),
+                                     ' WITH EDGE' if with_edge else ''))
+            stmts.append(ParamStatement(stmt=stmt, params={'v{}'.format(i): vid_value(vid, vid_type_is_fixed_string)
+                                                           for i, vid in enumerate(chunk)}))
+        return stmts
+
+    @classmethod
+    def edge(cls, schema: SchemaModel, edge_pairs: (List[tuple], Tuple[tuple]), chunk_size: int = 1000,
+             vid_type_is_fixed_string: bool = True):
+        """edge_pairs: [(src_vid, rank, dst_vid), ...]，返回 ParamStatement 的列表"""
+        stmts = []
+        for chunk in _chunks(list(edge_pairs), chunk_size):
+            stmt = Templates.get((schema.schema_type(), schema.name, 'DELETE', 'EDGE', len(chunk)),
+                                 lambda: 'DELETE EDGE {} {};'.format(schema.name, ', '.join(
+                                     ['$s{0} -> $d{0} @$r{0}'.format(i) for i in range(len(chunk))])))
+            params = dict()
+            for i, edge_pair in enumerate(chunk):
+                params['s{}'.format(i)] = vid_value(edge_pair[0], vid_type_is_fixed_string)
+                params['r{}'.format(i)] = to_value(NDataTypes.INT64.value, edge_pair[1] or 0)
+                params['d{}'.format(i)] = vid_value(edge_pair[2], vid_type_is_fixed_string)
+            stmts.append(ParamStatement(stmt=stmt, params=params))
+        return stmts
+
+
+class ParamQuery:
+    """参数化的查询语句"""
+
+    @classmethod
+    def lookup(cls, schema: SchemaModel, conditions: dict, yield_properties: Iterable[str] = None):
+        """
+        按属性相等条件 LOOKUP，条件中的属性需要有索引
+        先是 Query.key_items 再是 yield_properties，tag 返回 id(vertex)，edge type 返回 src(edge)、dst(edge)、rank(edge)
+        """
+        names = tuple(conditions.keys())
+        yields = tuple(yield_properties or ())
+
+        def _build():
+            where = ' AND '.join(['{0}.{1} == $p_{1}'.format(schema.name, name) for name in names])
+            yield_items = Query.key_items(schema)
+            yield_items += ['{0}.{1} AS {1}'.format(schema.name, name) for name in yields]
+            return 'LOOKUP ON {} WHERE {} YIELD {};'.format(schema.name, where, ', '.join(yield_items))
+        stmt = Templates.get((schema.schema_type(), schema.name, 'LOOKUP', names, yields), _build)
+        return ParamStatement(stmt=stmt, params=_property_params(schema, conditions))
+
+    @classmethod
+    def fetch_vertices(cls, schema: SchemaModel, vids: (List[str], Tuple[str]), chunk_size: int = 1000,
+                       vid_type_is_fixed_string: bool = True):
+        """按vid取节点属性，返回 ParamStatement 的列表"""
+        stmts = []
+        for chunk in _chunks(list(vids), chunk_size):
+            stmt = Templates.get((schema.schema_type(), schema.name, 'FETCH', len(chunk)),
+                                 lambda: 'FETCH PROP ON {} {} YIELD id(vertex) AS vid, properties(vertex) AS props;'
+                                 .format(schema.name, ', '.join(['$v{}'.format(i) for i in range(len(chunk))])))
+            stmts.append(ParamStatement(stmt=stmt, params={'v{}'.format(i): vid_value(vid, vid_type_is_fixed_string)
+                                                           for i, vid in enumerate(chunk)}))
+        return stmts
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import struct
+from collections import OrderedDict
+from collections import deque
+from typing import Iterable
+from typing import List
+
+from ngsm import cache
+from ngsm.model import EdgeBatch
+from ngsm.model import EdgeModel
+from ngsm.model import SchemaModel
+from ngsm.model import SpaceConfigModel
+from ngsm.model import VertexBatch
+from ngsm.model import VertexModel
+from ngsm.ngql import Insert
+
+_MASK = (1 << 64) - 1
+_MUL = (0xc6a4a793 << 32) + 0x5bd1e995
+_SEED = 0xc70f6907
+
+
+def _shift_mix(value: int):
+    return value ^ (value >> 47)
+
+
+def murmur_hash2(data: bytes, seed: int = _SEED):
+    """与 Nebula 的 MurmurHash2（即 libstdc++ 的 _Hash_bytes）一致的64位哈希"""
+    size = len(data)
+    aligned = size & ~0x7
+    value = (seed ^ (size * _MUL)) & _MASK
+    for (chunk,) in struct.iter_unpack('<Q', data[:aligned]):
+        value ^= (_shift_mix((chunk * _MUL) & _MASK) * _MUL) & _MASK
+        value = (value * _MUL) & _MASK
+    if size & 0x7:
+        value ^= int.from_bytes(data[aligned:], 'little')
+        value = (value * _MUL) & _MASK
+    value = (_shift_mix(value) * _MUL) & _MASK
+    return _shift_mix(value)
+
+
+class Partitioner:
+    """
+    计算vid所在的分区，并按分区组织插入语句
+    + 分区号与 Nebula 的 MetaClient::partId 一致，从1开始：
+      整型vid按其64位无符号表示取模；字符串vid取 MurmurHash2 后取模，
+      长度恰好为8字节的字符串vid与整型一样直接按字节解释
+    + 节点按vid、边按起始点vid分组，出边与起始点存储在同一分区
+    + 每条语句只包含同一分区的数据，各分区的语句轮流产出，使并发执行的语句落在不同的分区
+    """
+
+    def __init__(self, partition_num: int, vid_is_string_type: bool = True):
+        if not isinstance(partition_num, int) or partition_num < 1:
+            raise ValueError('partition_num require integer > 0, got {} instead'.format(partition_num))
+        self.partition_num = partition_num
+        self.vid_is_string_type = vid_is_string_type
+
+    @classmethod
+    def from_space(cls, space: SpaceConfigModel):
+        return cls(partition_num=space.partition_num, vid_is_string_type=space.vid_is_string_type)
+
+    def partition(self, vid: (str, int)):
+        if not self.vid_is_string_type:
+            return (int(vid) & _MASK) % self.partition_num + 1
+        data = str(vid).encode('utf-8')
+        if len(data) == 8:
+            value = struct.unpack('<Q', data)[0]
+        else:
+            # Nebula 按C字符串计算哈希
+            value = murmur_hash2(data.split(b'\0', 1)[0])
+        return value % self.partition_num + 1
+
+    def group(self, items: Iterable, vid_of):
+        """分区号 -> 该分区的元素列表，分区按首次出现的顺序排列"""
+        groups = OrderedDict()
+        for item in items:
+            groups.setdefault(self.partition(vid_of(item)), []).append(item)
+        return groups
+
+    @classmethod
+    def interleave(cls, iterables: Iterable[Iterable]):
+        """轮流从各个可迭代对象中取出一个元素，直到全部耗尽"""
+        iterators = deque([iter(i) for i in iterables])
+        while iterators:
+            iterator = iterators.popleft()
+            try:
+                yield next(iterator)
+            except StopIteration:
+                continue
+            iterators.append(iterator)
+
+    def vertex_statements(self, schema: SchemaModel, vertexes: Iterable[VertexModel], if_not_exists: bool = False,
+                          max_bytes: int = None, max_rows: int = None):
+        groups = self.group(vertexes, vid_of=lambda v: v.vid)
+        return self.interleave([Insert.iter_vertex_statements(schema=schema, vertexes=group,
+                                                              if_not_exists=if_not_exists,
+                                                              max_bytes=max_bytes, max_rows=max_rows)
+                                for group in groups.values()])
+
+    def edge_statements(self, schema: SchemaModel, edges: Iterable[EdgeModel], if_not_exists: bool = False,
+                        max_bytes: int = None, max_rows: int = None):
+        groups = self.group(edges, vid_of=lambda e: e.src_vid)
+        return self.interleave([Insert.iter_edge_statements(schema=schema, edges=group,
+                                                            if_not_exists=if_not_exists,
+                                                            max_bytes=max_bytes, max_rows=max_rows)
+                                for group in groups.values()])
+
+    def _parts_statements(self, fix_stmt: str, vids: List, parts: Iterable[str], max_bytes: int, max_rows: int):
+        groups = self.group(zip(vids, parts), vid_of=lambda pair: pair[0])
+        return self.interleave([Insert.iter_couple_stmts(fix_part=fix_stmt, multi_parts=[p for _, p in group],
+                                                         multi_part_splitter=', ',
+                                                         max_bytes=max_bytes, max_rows=max_rows)
+                                for group in groups.values()])
+
+    def vertex_batch_statements(self, batch: VertexBatch, if_not_exists: bool = False,
+                                max_bytes: int = None, max_rows: int = None):
+        cache.invalidate_vertices(batch.schema.name, batch.vids)
+        fix_stmt = Insert._vertex_fix_stmt(schema=batch.schema, if_not_exists=if_not_exists)
+        return self._parts_statements(fix_stmt, batch.vids, Insert._vertex_rows(batch), max_bytes, max_rows)
+
+    def edge_batch_statements(self, batch: EdgeBatch, if_not_exists: bool = False,
+                              max_bytes: int = None, max_rows: int = None):
+        fix_stmt = Insert._edge_fix_stmt(schema=batch.schema, if_not_exists=if_not_exists)
+        return self._parts_statements(fix_stmt, batch.src_vids, Insert._edge_rows(batch), max_bytes, max_rows)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from typing import Iterable
+from typing import List
+
+from ngsm.convertor import ValueFormatter
+from ngsm.model import EdgeModel
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import SchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import VertexModel
+from ngsm.ngql import Fetch
+from ngsm.ngql import Go
+from ngsm.ngql import Lookup
+from ngsm.ngql import Query
+
+
+def stored_vid(schema_name: str, _str_things: str):
+    """查询结果中的vid已经是实际存入图数据库中的vid，构建 VertexModel 时不再加前缀"""
+    return _str_things
+
+
+class GraphReader:
+    """
+    执行 Fetch/Lookup/Go 生成的语句，把结果按列解码为 VertexModel/EdgeModel
+    + session 需提供 execute(stmt)，返回 nebula3 的 ResultSet，且已经 USE 到目标图空间
+    + 结果逐条语句、逐页产出，内存占用只与 batch_size/page_size 有关，显式开启 single_scan 的 LOOKUP 除外
+    """
+
+    def __init__(self, session, vid_type_is_fixed_string: bool = True):
+        self.session = session
+        self.vid_type_is_fixed_string = vid_type_is_fixed_string
+
+    def _execute(self, stmt: str):
+        result = self.session.execute(stmt)
+        if not result.is_succeeded():
+            raise RuntimeError('failed to execute {}: {}'.format(stmt, result.error_msg()))
+        return result
+
+    def _vids(self, result, key: str):
+        return [ValueFormatter.parse_vid(v, self.vid_type_is_fixed_string) for v in result.column_values(key)]
+
+    def decode(self, result, schema: SchemaModel):
+        """把 Query.yield_clause 形式的结果解码为实例列表"""
+        size = result.row_size()
+        if not size:
+            return []
+        columns = ValueFormatter.decoder(result, schema).columns(by_property=True)
+        rows = [dict(zip(columns.keys(), values)) for values in zip(*columns.values())] if columns \
+            else [dict() for _ in range(size)]
+        keys = Query.key_columns(schema)
+        if isinstance(schema, TagSchemaModel):
+            instances = []
+            for vid, properties in zip(self._vids(result, keys[0]), rows):
+                vertex = VertexModel(vid=vid, schema=schema, properties=properties, vid_builder=stored_vid)
+                # 没有索引的schema不会为vid加前缀，构建后vid为None
+                vertex.vid = vid
+                instances.append(vertex)
+            return instances
+        ranks = [v.as_int() for v in result.column_values(keys[2])]
+        return [EdgeModel(src_vid=src, dst_vid=dst, schema=schema, properties=properties, rank=rank)
+                for src, dst, rank, properties in zip(self._vids(result, keys[0]), self._vids(result, keys[1]),
+                                                      ranks, rows)]
+
+    def _iter_decoded(self, stmts: List[str], schema: SchemaModel):
+        for stmt in stmts:
+            for instance in self.decode(self._execute(stmt), schema):
+                yield instance
+
+    def fetch_vertices(self, schema: TagSchemaModel, vids: Iterable[str], properties: List[str] = None,
+                       batch_size: int = 1000):
+        return self._iter_decoded(Fetch.vertices(schema, vids, properties, max_rows=batch_size), schema)
+
+    def fetch_edges(self, schema: EdgeSchemaModel, edge_pairs: Iterable[tuple], properties: List[str] = None,
+                    batch_size: int = 1000):
+        return self._iter_decoded(Fetch.edges(schema, edge_pairs, properties, max_rows=batch_size), schema)
+
+    def go(self, schema: EdgeSchemaModel, vids: Iterable[str], steps: int = 1, direction: str = None,
+           predicates: (dict, List[tuple]) = None, properties: List[str] = None, batch_size: int = 1000):
+        return self._iter_decoded(Go.over(schema, vids, steps=steps, direction=direction, predicates=predicates,
+                                          properties=properties, max_rows=batch_size), schema)
+
+    def lookup_pages(self, schema: SchemaModel, predicates: (dict, List[tuple]) = None,
+                     properties: List[str] = None, page_size: int = 1000, use_cursor: bool = True,
+                     single_scan: bool = False):
+        """
+        逐页产出实例列表，每页 page_size 个
+        + 默认每页执行一条语句，内存占用只与 page_size 有关，但服务端每页都要重新扫描索引并排序；
+          use_cursor 为真时按键值游标分页（Lookup.page_after），否则按 LIMIT/OFFSET 分页（Lookup.page）
+        + single_scan 为真时只执行一次不排序的 LOOKUP，结果在客户端按页切分，服务端只扫描一次，
+          但全部结果同时留在内存中，只适合结果集较小的场景
+        """
+        if page_size < 1:
+            raise ValueError('page_size require integer > 0, got {} instead'.format(page_size))
+        if single_scan:
+            instances = self.decode(self._execute(Lookup.query(schema, predicates, properties)), schema)
+            for i in range(0, len(instances), page_size):
+                yield instances[i:i + page_size]
+            return
+        cursor, offset = None, 0
+        while True:
+            if use_cursor:
+                stmt = Lookup.page_after(schema, predicates, properties, limit=page_size, cursor=cursor)
+            else:
+                stmt = Lookup.page(schema, predicates, properties, limit=page_size, offset=offset)
+            page = self.decode(self._execute(stmt), schema)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            offset += len(page)
+            last = page[-1]
+            cursor = (last.vid,) if isinstance(schema, TagSchemaModel) else last.key()
+
+    def lookup(self, schema: SchemaModel, predicates: (dict, List[tuple]) = None, properties: List[str] = None,
+               page_size: int = 1000, use_cursor: bool = True, single_scan: bool = False):
+        for page in self.lookup_pages(schema, predicates, properties, page_size, use_cursor, single_scan):
+            for instance in page:
+                yield instance
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+from collections import deque
+from typing import Callable
+from typing import List
+
+import attr
+
+from ngsm.base import Const
+from ngsm.model import SchemaModel
+from ngsm.ngql import RebuildIndex
+from ngsm.registry import MigrationPlan
+from ngsm.registry import SchemaRegistry
+
+
+@attr.s
+class RebuildJob:
+    """一次 REBUILD ... INDEX 作业"""
+    schema_type = attr.ib(type=str)
+    index_names = attr.ib(type=List[str])
+    job_id = attr.ib(type=int, default=None)
+    # QUEUE、RUNNING、FINISHED、FAILED、STOPPED 等，提交前为 None
+    status = attr.ib(type=str, default=None)
+    started = attr.ib(type=float, default=None)
+    finished = attr.ib(type=float, default=None)
+
+    def statement(self):
+        return RebuildIndex._(schema_type=self.schema_type, index_names=self.index_names)
+
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def succeeded(self):
+        return self.status == RebuildPlanner.FINISHED
+
+
+class RebuildPlanner:
+    """
+    只重建实际新建或受导入影响的索引
+    + 通过 mark/mark_loaded/mark_plan 记录受影响的索引，同一类型（TAG/EDGE）的索引合并为一条 REBUILD 语句，
+      max_indexes_per_job 限制单个作业包含的索引数
+    + 提交后轮询 SHOW JOB 直至结束，同时运行的作业数不超过 max_concurrent_jobs
+    + session 需提供 execute(stmt)，返回 nebula3 的 ResultSet，且已经 USE 到目标图空间
+    """
+
+    FINISHED = 'FINISHED'
+    DONE_STATUSES = ('FINISHED', 'FAILED', 'STOPPED')
+
+    def __init__(self, session, max_concurrent_jobs: int = 1, max_indexes_per_job: int = None,
+                 poll_interval: float = 1.0, timeout: float = None,
+                 clock: Callable = time.monotonic, sleep: Callable = time.sleep):
+        if max_concurrent_jobs < 1:
+            raise ValueError('max_concurrent_jobs require integer > 0, got {} instead'.format(max_concurrent_jobs))
+        self.session = session
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_indexes_per_job = max_indexes_per_job
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+        # schema类型 -> 有序去重的索引名称
+        self._affected = OrderedDict()
+
+    def mark(self, schema: SchemaModel, index_names: (List[str], str)):
+        index_names = [index_names] if isinstance(index_names, str) else index_names
+        affected = self._affected.setdefault(schema.schema_type(), OrderedDict())
+        for index_name in index_names:
+            affected[index_name] = None
+        return self
+
+    def mark_loaded(self, schema: SchemaModel):
+        """导入过数据的schema，其全部索引都受影响"""
+        return self.mark(schema, list(SchemaRegistry.declared_indexes(schema).keys()))
+
+    def mark_plan(self, plan: MigrationPlan):
+        """迁移计划中新建的索引"""
+        for schema, index_name in plan.created_indexes:
+            self.mark(schema, index_name)
+        return self
+
+    def jobs(self):
+        jobs = []
+        for schema_type in (Const.TAG, Const.EDGE):
+            index_names = list(self._affected.get(schema_type, dict()).keys())
+            size = self.max_indexes_per_job or len(index_names) or 1
+            for i in range(0, len(index_names), size):
+                jobs.append(RebuildJob(schema_type=schema_type, index_names=index_names[i:i + size]))
+        return jobs
+
+    def statements(self):
+        return [job.statement() for job in self.jobs()]
+
+    def _execute(self, stmt: str):
+        result = self.session.execute(stmt)
+        if not result.is_succeeded():
+            raise RuntimeError('failed to execute {}: {}'.format(stmt, result.error_msg()))
+        return result
+
+    def _submit(self, job: RebuildJob):
+        result = self._execute(job.statement())
+        job.job_id = result.row_values(0)[0].as_int()
+        job.status = 'QUEUE'
+        job.started = self.clock()
+
+    def _poll(self, job: RebuildJob):
+        # SHOW JOB 的第一行为作业本身，第三列为状态
+        result = self._execute('SHOW JOB {};'.format(job.job_id))
+        job.status = result.row_values(0)[2].as_string().upper()
+        if job.status in self.DONE_STATUSES:
+            job.finished = self.clock()
+
+    def run(self):
+        """提交并等待全部重建作业结束，返回作业列表"""
+        jobs = self.jobs()
+        waiting, running = deque(jobs), []
+        begin = self.clock()
+        while waiting or running:
+            while waiting and len(running) < self.max_concurrent_jobs:
+                job = waiting.popleft()
+                self._submit(job)
+                running.append(job)
+            self.sleep(self.poll_interval)
+            for job in list(running):
+                self._poll(job)
+                if job.finished is not None:
+                    running.remove(job)
+            if self.timeout is not None and self.clock() - begin > self.timeout:
+                raise TimeoutError('rebuild jobs {} not finished in {}s'.format(
+                    [job.job_id for job in running], self.timeout))
+        self._affected.clear()
+        return jobs
+
+    @classmethod
+    def job_durations(cls, jobs: List[RebuildJob]):
+        """
+        作业id -> 作业的耗时，耗时从提交到轮询发现结束，精度受 poll_interval 限制
+        一个作业内的多个索引一起重建，单个索引的耗时无法测量，需要时令 max_indexes_per_job=1
+        """
+        return OrderedDict((job.job_id, job.duration()) for job in jobs)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List
+
+import attr
+
+from ngsm.base import Const
+from ngsm.base import NDataTypes
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import SchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.ngql import Alter
+from ngsm.ngql import Create
+from ngsm.ngql import Drop
+
+
+def normalize_type(type_: str):
+    """
+    统一属性类型的写法：DESCRIBE 返回小写类型，INT 即 INT64，FIXED_STRING(n) 视为 STRING
+    """
+    type_ = type_.upper()
+    if type_ == NDataTypes.INT.value:
+        return NDataTypes.INT64.value
+    if type_.startswith('FIXED_STRING'):
+        return NDataTypes.STRING.value
+    return type_
+
+
+@attr.s
+class MigrationPlan:
+    """
+    声明的schema与线上catalog之间的差异，语句按 删除索引 -> 创建/修改schema -> 创建索引 的顺序执行
+    新建的tag/edge type需要等待一个心跳周期后才能创建索引，见 SchemaRegistry.migrate
+    """
+    drop_index_stmts = attr.ib(type=List[str], factory=list)
+    schema_stmts = attr.ib(type=List[str], factory=list)
+    create_index_stmts = attr.ib(type=List[str], factory=list)
+    # 新建的索引：(schema, 索引名称)，创建后需要重建
+    created_indexes = attr.ib(type=list, factory=list)
+
+    def statements(self):
+        return self.drop_index_stmts + self.schema_stmts + self.create_index_stmts
+
+    def is_empty(self):
+        return not self.statements()
+
+
+class SchemaRegistry:
+    """
+    读取线上的 tag/edge type 及索引，与声明的schema比较后只生成必要的DDL
+    + session 需提供 execute(stmt)，返回 nebula3 的 ResultSet，且已经 USE 到目标图空间
+    + 默认不删除线上多出的属性与索引，分别由 drop_properties、drop_indexes 开启
+    + 暂只比较属性的类型与是否支持空值，不比较默认值与备注
+    + 线上类型不在 NDataTypes 中的属性（如 GEOGRAPHY）不参与比较，记录在 unsupported 中：
+      (schema类型, schema名称) -> {属性名: 线上类型}
+    """
+
+    def __init__(self, session, string_length: int = 64, drop_properties: bool = False, drop_indexes: bool = False):
+        self.session = session
+        self.string_length = string_length
+        self.drop_properties = drop_properties
+        self.drop_indexes = drop_indexes
+        self.schemas = OrderedDict()
+        self.unsupported = OrderedDict()
+
+    def register(self, *schemas: SchemaModel):
+        for schema in schemas:
+            if not isinstance(schema, (TagSchemaModel, EdgeSchemaModel)):
+                raise TypeError('require TagSchemaModel or EdgeSchemaModel, got {} instead'.format(type(schema)))
+            self.schemas[(schema.schema_type(), schema.name)] = schema
+        return self
+
+    def _execute(self, stmt: str):
+        result = self.session.execute(stmt)
+        if not result.is_succeeded():
+            raise RuntimeError('failed to execute {}: {}'.format(stmt, result.error_msg()))
+        return result
+
+    def _rows(self, stmt: str):
+        result = self._execute(stmt)
+        return [result.row_values(i) for i in range(result.row_size())]
+
+    def live_schema_names(self, schema_type: str):
+        stmt = 'SHOW TAGS;' if schema_type == Const.TAG else 'SHOW EDGES;'
+        return [row[0].as_string() for row in self._rows(stmt)]
+
+    def live_schema(self, schema_type: str, name: str):
+        """
+        根据 DESCRIBE 的结果重建schema，列依次为 Field、Type、Null、Default、Comment
+        类型不受支持的属性被跳过并记录在 unsupported 中
+        """
+        properties, unsupported = [], OrderedDict()
+        for row in self._rows('DESCRIBE {} {};'.format(schema_type, name)):
+            p_name, p_type = row[0].as_string(), normalize_type(row[1].as_string())
+            if p_type not in NDataTypes.values():
+                unsupported[p_name] = row[1].as_string()
+                continue
+            properties.append(PropertySchemaModel(name=p_name, type=p_type,
+                                                  support_null=row[2].as_string().upper() == 'YES'))
+        if unsupported:
+            self.unsupported[(schema_type, name)] = unsupported
+        else:
+            self.unsupported.pop((schema_type, name), None)
+        schema_class = TagSchemaModel if schema_type == Const.TAG else EdgeSchemaModel
+        return schema_class(name=name, properties=properties)
+
+    def live_schemas(self, schema_type: str):
+        return OrderedDict((name, self.live_schema(schema_type, name))
+                           for name in self.live_schema_names(schema_type))
+
+    def live_indexes(self, schema_type: str):
+        """索引名称 -> (所属schema名称, 列名列表)"""
+        indexes = OrderedDict()
+        for row in self._rows('SHOW {} INDEXES;'.format(schema_type)):
+            columns = [c.as_string() for c in row[2].as_list()] if not row[2].is_null() else []
+            indexes[row[0].as_string()] = (row[1].as_string(), columns)
+        return indexes
+
+    def live_fingerprint(self):
+        """
+        线上 tag/edge type 的 DESCRIBE 结果与索引定义的摘要，属性的类型、空值、默认值与备注变化时摘要随之变化
+        每个 tag/edge type 执行一条 DESCRIBE，数量较多时可改用发布版本号，见 SchemaCatalog.load_or_refresh
+        """
+        h = hashlib.sha256()
+        for schema_type in (Const.TAG, Const.EDGE):
+            for name in sorted(self.live_schema_names(schema_type)):
+                h.update('{}\t{}\n'.format(schema_type, name).encode('utf-8'))
+                for row in self._rows('DESCRIBE {} {};'.format(schema_type, name)):
+                    h.update('\t'.join([repr(v) for v in row]).encode('utf-8'))
+                    h.update(b'\n')
+            for index_name, (by, columns) in sorted(self.live_indexes(schema_type).items()):
+                h.update('{}\t{}\t{}\t{}\n'.format(schema_type, index_name, by, ','.join(columns)).encode('utf-8'))
+        return h.hexdigest()
+
+    @classmethod
+    def declared_indexes(cls, schema: SchemaModel):
+        """索引名称 -> (列名列表, 需要的建索引参数)，不修改schema中已记录的索引"""
+        schema_type = schema.schema_type()
+        indexes = OrderedDict()
+        if schema.index:
+            indexes[schema.index_name_builder(schema.name, schema_type=schema_type, properties=None)] = ([], None)
+        for p in schema.properties:
+            if p.index:
+                name = schema.index_name_builder(schema.name, schema_type=schema_type, properties=[p])
+                indexes[name] = ([p.name], p)
+        for properties in schema.compound_property_indexes:
+            name = schema.index_name_builder(schema.name, schema_type=schema_type, properties=properties)
+            indexes[name] = ([p.name for p in properties], properties)
+        return indexes
+
+    def _create_index_stmt(self, schema: SchemaModel, index_name: str, index_arg):
+        """与 declared_indexes 一样不修改schema中已记录的索引"""
+        if index_arg is None:
+            columns = ''
+        elif isinstance(index_arg, PropertySchemaModel):
+            columns = Create._property_index_type(index_arg, string_length=self.string_length)
+        else:
+            columns = Create._compound_property_index_type(index_arg, string_length=self.string_length)
+        return Create.index(schema.schema_type(), schema, index_name, columns=columns, if_not_exists=True)
+
+    def plan(self):
+        plan = MigrationPlan()
+        for schema_type in (Const.TAG, Const.EDGE):
+            declared = [s for (t, _), s in self.schemas.items() if t == schema_type]
+            if not declared:
+                continue
+            live_names = set(self.live_schema_names(schema_type))
+            live_indexes = self.live_indexes(schema_type)
+            for schema in declared:
+                self._plan_schema(plan, schema, live_names, live_indexes)
+        return plan
+
+    def _plan_schema(self, plan: MigrationPlan, schema: SchemaModel, live_names: set, live_indexes: dict):
+        schema_type = schema.schema_type()
+        declared_indexes = self.declared_indexes(schema)
+        if schema.name not in live_names:
+            plan.schema_stmts.append(Create._schema(schema_type=schema_type, schema=schema, if_not_exists=True))
+            for index_name, (_, index_arg) in declared_indexes.items():
+                plan.create_index_stmts.append(self._create_index_stmt(schema, index_name, index_arg))
+                plan.created_indexes.append((schema, index_name))
+            return
+
+        live = self.live_schema(schema_type, schema.name)
+        live_props = {p.name: p for p in live.properties}
+        unsupported = self.unsupported.get((schema_type, schema.name), dict())
+        added, changed = [], []
+        for p in schema.properties:
+            live_p = live_props.get(p.name)
+            if p.name in unsupported:
+                # 线上同名属性的类型不受支持，改为声明的类型
+                changed.append(p)
+            elif live_p is None:
+                added.append(p)
+            elif normalize_type(p.type) != live_p.type or p.support_null != live_p.support_null:
+                changed.append(p)
+        dropped = [name for name in live_props.keys() if name not in schema.property_names()] \
+            if self.drop_properties else []
+
+        # 被修改或删除的属性上的索引需要先删除
+        touched = {p.name for p in changed} | set(dropped)
+        schema_live_indexes = {name: columns for name, (by, columns) in live_indexes.items() if by == schema.name}
+        for index_name, columns in schema_live_indexes.items():
+            declared_index = declared_indexes.get(index_name)
+            stale = declared_index is None or declared_index[0] != columns or touched.intersection(columns)
+            if stale and (declared_index is not None or self.drop_indexes or touched.intersection(columns)):
+                plan.drop_index_stmts.append(Drop.index(schema_type=schema_type, index_name=index_name,
+                                                        if_exists=True))
+                schema_live_indexes[index_name] = None
+
+        for stmt in (Alter.add_properties(schema_type, schema, added),
+                     Alter.change_properties(schema_type, schema, changed),
+                     Alter.drop_properties(schema_type, schema, dropped)):
+            if stmt:
+                plan.schema_stmts.append(stmt)
+
+        for index_name, (_, index_arg) in declared_indexes.items():
+            if schema_live_indexes.get(index_name) is None:
+                plan.create_index_stmts.append(self._create_index_stmt(schema, index_name, index_arg))
+                plan.created_indexes.append((schema, index_name))
+
+    def migrate(self, index_wait: float = 20.0, index_retries: int = 3):
+        """
+        分两个阶段执行迁移计划并返回该计划：先删除索引并创建/修改schema，再创建索引
+        新建或修改的 tag/edge type 要在meta的心跳周期（默认10秒）之后才对建索引可见，
+        因此schema有变化时两个阶段之间等待 index_wait 秒，创建索引失败时每隔 index_wait 秒重试，最多 index_retries 次
+        """
+        if index_retries < 0:
+            raise ValueError('index_retries require integer >= 0, got {} instead'.format(index_retries))
+        plan = self.plan()
+        for stmt in plan.drop_index_stmts + plan.schema_stmts:
+            self._execute(stmt)
+        if plan.schema_stmts and plan.create_index_stmts:
+            time.sleep(index_wait)
+        for stmt in plan.create_index_stmts:
+            self._execute_with_retries(stmt, wait=index_wait, retries=index_retries)
+        return plan
+
+    def _execute_with_retries(self, stmt: str, wait: float, retries: int):
+        for attempt in range(retries + 1):
+            result = self.session.execute(stmt)
+            if result.is_succeeded():
+                return result
+            if attempt < retries:
+                time.sleep(wait)
+        raise RuntimeError('failed to execute {} after {} retries: {}'.format(stmt, retries, result.error_msg()))
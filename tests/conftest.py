@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+
+class FakeResult:
+
+    def __init__(self, succeeded: bool = True, error_msg: str = ''):
+        self._succeeded = succeeded
+        self._error_msg = error_msg
+
+    def is_succeeded(self):
+        return self._succeeded
+
+    def error_msg(self):
+        return self._error_msg
+
+    def latency(self):
+        return 100
+
+
+class FakeSession:
+    """代替 graphd 的会话，记录执行过的语句，语句中含有 fail 时返回失败"""
+
+    def __init__(self, executed: list, lock: threading.Lock):
+        self.executed = executed
+        self.lock = lock
+        self.released = False
+
+    def execute(self, stmt: str):
+        with self.lock:
+            self.executed.append(stmt)
+        return FakeResult(succeeded='fail' not in stmt, error_msg='failed')
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def sessions():
+    executed, lock, created = [], threading.Lock(), []
+
+    def factory():
+        session = FakeSession(executed, lock)
+        created.append(session)
+        return session
+    factory.executed = executed
+    factory.created = created
+    return factory
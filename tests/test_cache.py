@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import types
+
+import pytest
+
+from ngsm.cache import VertexCache
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import VertexBatch
+from ngsm.ngql import Delete
+from ngsm.partition import Partitioner
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _vertex(schema_name: str, vid: str, **properties):
+    return types.SimpleNamespace(schema=types.SimpleNamespace(name=schema_name), vid=vid, properties=properties)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def vertex_cache(clock):
+    vertex_cache = VertexCache(clock=clock, ttl=None, write_grace=5)
+    yield vertex_cache
+    vertex_cache.clear()
+
+
+def test_delete_vertex_invalidates_every_tag(vertex_cache):
+    tag = TagSchemaModel(name='a', properties=[PropertySchemaModel(name='p', type='INT64')])
+    vertex_cache.put(_vertex('a', 'v1'))
+    vertex_cache.put(_vertex('b', 'v1'))
+    vertex_cache.put(_vertex('b', 'v2'))
+    Delete.vertex(tag, ['v1'])
+    assert vertex_cache.get('a', 'v1') is None and vertex_cache.get('b', 'v1') is None
+    assert vertex_cache.get('b', 'v2') is not None
+
+
+def test_invalidated_vertex_is_not_recached_before_write(vertex_cache, clock):
+    vertex_cache.invalidate('a', ['v1'])
+    assert not vertex_cache.put(_vertex('a', 'v1'))
+    clock.now = 6
+    assert vertex_cache.put(_vertex('a', 'v1'))
+
+
+def test_fetch_started_before_invalidation_is_not_cached(vertex_cache, clock):
+    generation = vertex_cache.generation()
+    clock.now = 100
+    vertex_cache.invalidate(None, ['v1'])
+    clock.now = 200
+    assert not vertex_cache.put(_vertex('a', 'v1'), generation)
+    assert vertex_cache.put(_vertex('a', 'v1'), vertex_cache.generation())
+
+
+def test_partitioned_batch_invalidates(vertex_cache, clock):
+    tag = TagSchemaModel(name='a', properties=[PropertySchemaModel(name='p', type='INT64')])
+    batch = VertexBatch(schema=tag, vids=['v1', 'v2'], columns={'p': [1, 2]})
+    vertex_cache.put(_vertex('a', batch.vids[0]))
+    list(Partitioner(3).vertex_batch_statements(batch))
+    assert vertex_cache.get('a', batch.vids[0]) is None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pickle
+
+import pytest
+
+from ngsm.model import ConflictPolicy
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import EdgesModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import VertexModel
+from ngsm.model import VertexesModel
+from ngsm.ngql import Insert
+
+
+def _tag(*properties, name='person'):
+    return TagSchemaModel(name=name, properties=[PropertySchemaModel(name=n, type=t) for n, t in properties])
+
+
+def test_compiled_vertex_renders_like_vertex_model():
+    schema = _tag(('name', 'STRING'), ('age', 'INT8'), ('ok', 'BOOL'), ('score', 'DOUBLE'))
+    cls = schema.compile_class()
+    compiled = cls('1', name='a"b', age=3, ok=True)
+    plain = VertexModel(vid='1', schema=schema, properties=dict(name='a"b', age=3, ok=True, score=None))
+    assert compiled.vid == plain.vid
+    assert Insert.vertex(schema, [compiled], False) == Insert.vertex(schema, [plain], False)
+    assert compiled.properties == dict(name='a"b', age=3, ok=True, score=None)
+
+
+class _Name(str):
+    pass
+
+
+@pytest.mark.parametrize('value', ['plain', 'a"b', 'a\\b', 'line\nnext\r', '中文', '', None, _Name('x"y')])
+def test_compiled_string_encoding_matches_row_encoder(value):
+    schema = _tag(('name', 'STRING'), ('age', 'INT64'))
+    compiled = schema.compile_class()('1', name=value, age=1)
+    assert compiled.to_values() == schema.row_encoder().encode_values((value, 1))
+
+
+@pytest.mark.parametrize('names', [
+    ('self', 'str', '_f0'),
+    ('_p1', '_p0', 'value'),
+    ('int', 'isinstance', 'dict', 'getattr'),
+])
+def test_property_names_do_not_shadow_generated_code(names):
+    schema = _tag(*[(n, 'INT64') for n in names])
+    cls = schema.compile_class()
+    instance = cls('v', **{n: i for i, n in enumerate(names)})
+    assert instance.properties == {n: i for i, n in enumerate(names)}
+    assert instance.to_values() == ', '.join(str(i) for i in range(len(names)))
+    with pytest.raises(TypeError):
+        cls('v', **{names[0]: 'x'})
+
+
+def test_reserved_names_are_rejected():
+    with pytest.raises(ValueError, match='values'):
+        _tag(('values', 'INT64')).compile_class()
+
+
+def test_checks_follow_schema():
+    cls = _tag(('age', 'INT8'), ('name', 'STRING')).compile_class()
+    with pytest.raises(TypeError):
+        cls('v', age=300)
+    with pytest.raises(TypeError):
+        cls('v', age=True)
+    schema = TagSchemaModel(name='t', properties=[PropertySchemaModel(name='p', type='INT64', support_null=False)])
+    with pytest.raises(ValueError, match='not support null'):
+        schema.compile_class()('v')
+
+
+def test_properties_setter_validates():
+    instance = _tag(('age', 'INT8'), ('name', 'STRING')).compile_class()('v', age=1)
+    instance.properties = dict(name='b')
+    assert instance.properties == dict(age=None, name='b')
+    with pytest.raises(ValueError, match='not defined'):
+        instance.properties = dict(other=1)
+    with pytest.raises(TypeError):
+        instance.properties = dict(age='x')
+
+
+def test_pickle_round_trip():
+    schema = _tag(('name', 'STRING'))
+    instance = schema.compile_class()('v', name='a')
+    restored = pickle.loads(pickle.dumps(instance))
+    assert restored == instance and restored.properties == instance.properties
+
+
+def test_compiled_instances_in_instance_sets():
+    schema = _tag(('name', 'STRING'), ('age', 'INT8'))
+    cls = schema.compile_class()
+    vertexes = VertexesModel(schema=schema, conflict_policy=ConflictPolicy.MERGE.value)
+    first, second = cls('v', name='a', age=1), cls('v', age=2)
+    vertexes.add(first)
+    vertexes.add(second)
+    assert len(vertexes) == 1 and vertexes.duplicates == 1
+    assert vertexes.get(first.key()).properties == dict(name='a', age=2)
+    assert second.properties == dict(name=None, age=2)
+
+    with pytest.raises(TypeError):
+        VertexesModel(schema=_tag(('name', 'STRING'), name='other')).add(first)
+
+    edge_schema = EdgeSchemaModel(name='e', properties=[PropertySchemaModel(name='w', type='INT64')])
+    edges = EdgesModel(schema=edge_schema)
+    edges.add(edge_schema.compile_class()('a', 'b', w=1, rank=2))
+    assert edges.get(('a', 'b', 2)).properties == dict(w=1)
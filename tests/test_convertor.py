@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from ngsm.base import NDataTypes
+from ngsm.base import NType2Checker
+from ngsm.base import NType2Coercer
+from ngsm.convertor import RowEncoder
+from ngsm.convertor import ValueFormatter
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+
+
+@pytest.mark.parametrize('type_, value, expected', [
+    ('INT64', 3, '3'),
+    ('STRING', 'a', '"a"'),
+    ('BOOL', True, 'true'),
+    ('BOOL', False, 'false'),
+    ('DOUBLE', 1.5, '1.5'),
+    ('TIMESTAMP', 1700000000, '1700000000'),
+    ('TIMESTAMP', datetime.datetime(2024, 1, 1, 8, 30), 'timestamp("2024-01-01T08:30:00")'),
+    ('DATE', datetime.date(2024, 1, 2), 'date("2024-01-02")'),
+    ('TIME', datetime.time(3, 4, 5), 'time("03:04:05")'),
+    ('DATETIME', datetime.datetime(2024, 1, 1, 0, 0, 1, 5), 'datetime("2024-01-01T00:00:01.000005")'),
+    ('DURATION', datetime.timedelta(days=1, seconds=2), 'duration({days: 1, seconds: 2, microseconds: 0})'),
+])
+def test_encode(type_, value, expected):
+    assert ValueFormatter.encode(type_, value) == expected
+    assert RowEncoder.column_formatter(type_)(value) == expected
+
+
+def test_every_type_has_a_formatter():
+    assert set(ValueFormatter.Value2Formatter.keys()) == set(NDataTypes.values())
+
+
+def test_aware_datetime_is_converted_to_utc():
+    value = datetime.datetime(2024, 1, 1, 8, tzinfo=datetime.timezone(datetime.timedelta(hours=8)))
+    assert ValueFormatter.encode('DATETIME', value) == 'datetime("2024-01-01T00:00:00")'
+
+
+def test_none_is_null():
+    for type_ in NDataTypes.values():
+        assert RowEncoder.column_formatter(type_)(None) == 'NULL'
+
+
+def test_string_memo_keeps_types_apart():
+    formatter = RowEncoder.column_formatter('STRING')
+    assert [formatter(v) for v in (1, True, 1.0, 1)] == ['"1"', '"True"', '"1.0"', '"1"']
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('a"b', '"a\\"b"'),
+    ('a\\b', '"a\\\\b"'),
+    ('line\nnext\r', '"line\\nnext\\r"'),
+    ('\\"', '"\\\\\\""'),
+    ("it's", '"it\'s"'),
+    ('中文', '"中文"'),
+])
+def test_string_escaping(value, expected):
+    assert ValueFormatter.encode('STRING', value) == expected
+    formatter = RowEncoder.column_formatter('STRING')
+    # 第二次取自缓存
+    assert formatter(value) == formatter(value) == expected
+
+
+def test_row_encoder_escapes_strings_and_encodes_none_as_null():
+    tag = TagSchemaModel(name='t', properties=[PropertySchemaModel(name='a', type='STRING'),
+                                               PropertySchemaModel(name='b', type='INT64')])
+    encoder = tag.row_encoder()
+    assert encoder.encode_properties({'a': 'x"); DROP TAG t; ("', 'b': None}) == '"x\\"); DROP TAG t; (\\"", NULL'
+    assert encoder.encode_values((None, 1)) == 'NULL, 1'
+    assert encoder.encode_assignments({'a': None, 'b': 2}) == 'a = NULL, b = 2'
+    assert list(encoder.encode_columns([['a\n', None], [None, 3]], size=2)) == ['"a\\n", NULL', 'NULL, 3']
+    with pytest.raises(ValueError, match='not defined'):
+        encoder.encode_assignments({'c': 1})
+
+
+def test_row_encoder_column_order_and_missing_properties():
+    tag = TagSchemaModel(name='t', properties=[PropertySchemaModel(name='a', type='INT64'),
+                                               PropertySchemaModel(name='b', type='STRING'),
+                                               PropertySchemaModel(name='c', type='DATE')])
+    encoder = tag.row_encoder()
+    assert encoder.encode_properties({'c': datetime.date(2020, 1, 1), 'a': 1}) == '1, NULL, date("2020-01-01")'
+    assert encoder.header(False) == 'Insert VERTEX t(a, b, c) VALUES '
+
+
+@pytest.mark.parametrize('type_, raw, expected', [
+    ('INT64', '42', 42),
+    ('INT64', 3.0, 3),
+    ('TIMESTAMP', '1700000000', 1700000000),
+    ('DATE', '2024-01-02', datetime.date(2024, 1, 2)),
+    ('TIME', '03:04:05', datetime.time(3, 4, 5)),
+    ('DATETIME', '2024-01-02T03:04:05', datetime.datetime(2024, 1, 2, 3, 4, 5)),
+    ('DURATION', '90', datetime.timedelta(seconds=90)),
+    ('BOOL', 'yes', True),
+])
+def test_coerced_values_pass_checker_and_encode(type_, raw, expected):
+    value = NType2Coercer[type_](raw)
+    assert value == expected
+    assert NType2Checker[type_](value) is None
+    assert ValueFormatter.encode(type_, value)
+
+
+@pytest.mark.parametrize('type_, raw', [
+    ('INT64', 1.5),
+    ('INT64', True),
+    ('INT8', '1.5'),
+    ('TIMESTAMP', False),
+    ('DURATION', True),
+])
+def test_coercer_rejects_lossy_values(type_, raw):
+    with pytest.raises(ValueError):
+        NType2Coercer[type_](raw)
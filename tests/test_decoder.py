@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from ngsm.convertor import ValueFormatter
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+
+ttypes = pytest.importorskip('nebula3.common.ttypes')
+DataObject = pytest.importorskip('nebula3.data.DataObject')
+
+
+def _wrap(value):
+    if value is None:
+        return DataObject.ValueWrapper(ttypes.Value(nVal=ttypes.NullType.__NULL__))
+    if isinstance(value, bool):
+        return DataObject.ValueWrapper(ttypes.Value(bVal=value))
+    if isinstance(value, int):
+        return DataObject.ValueWrapper(ttypes.Value(iVal=value))
+    if isinstance(value, float):
+        return DataObject.ValueWrapper(ttypes.Value(fVal=value))
+    if isinstance(value, str):
+        return DataObject.ValueWrapper(ttypes.Value(sVal=value.encode('utf-8')))
+    return DataObject.ValueWrapper(value)
+
+
+class _ResultSet:
+    """代替 nebula3 的 ResultSet，按列给出 ValueWrapper"""
+
+    def __init__(self, columns: dict):
+        self._columns = {k: [v if isinstance(v, DataObject.ValueWrapper) else _wrap(v) for v in values]
+                         for k, values in columns.items()}
+
+    def keys(self):
+        return list(self._columns.keys())
+
+    def column_values(self, key):
+        return self._columns[key]
+
+    def row_size(self):
+        return len(next(iter(self._columns.values())))
+
+    def row_values(self, index):
+        return [values[index] for values in self._columns.values()]
+
+
+def _tag():
+    return TagSchemaModel(name='t', properties=[
+        PropertySchemaModel(name='i', type='INT64'),
+        PropertySchemaModel(name='f', type='DOUBLE'),
+        PropertySchemaModel(name='b', type='BOOL', support_null=False),
+        PropertySchemaModel(name='s', type='STRING'),
+    ])
+
+
+def _decoder(**columns):
+    return ValueFormatter.decoder(_ResultSet(columns), _tag())
+
+
+def test_columns_are_mapped_by_last_name_segment():
+    decoder = ValueFormatter.decoder(_ResultSet({'__vid': ['v'], 't.i': [1], 'x': [2]}), _tag())
+    assert list(decoder.plan.keys()) == ['t.i']
+    assert decoder.columns(by_property=True) == {'i': [1]}
+    with pytest.raises(ValueError, match='not mapped'):
+        decoder.column('x')
+
+
+def test_column_decodes_nulls():
+    decoder = _decoder(i=[1, None], s=['a', None])
+    assert decoder.columns() == {'i': [1, None], 's': ['a', None]}
+
+
+def test_lazy_rows_decode_on_access():
+    rows = list(_decoder(i=[1, 2], s=['a', None]).iter_rows())
+    assert [row['i'] for row in rows] == [1, 2]
+    assert rows[1].to_dict() == {'i': 2, 's': None}
+    assert rows[0].get('missing', 0) == 0
+
+
+def test_numpy_columns_fill_nulls_and_keep_dtype():
+    numpy = pytest.importorskip('numpy')
+    decoder = _decoder(i=[1, None, 3], f=[1.5, 2.5, None], b=[True, False, True], s=['a', None, 'c'])
+    values, mask = decoder.numpy_column('i')
+    assert values.dtype == numpy.int64 and values.tolist() == [1, 0, 3] and mask.tolist() == [False, True, False]
+    values, mask = decoder.numpy_column('f')
+    assert values.dtype == numpy.float64 and values.tolist() == [1.5, 2.5, 0.0] and mask.tolist()[-1]
+    values, mask = decoder.numpy_column('b')
+    assert values.dtype == numpy.bool_ and values.tolist() == [True, False, True] and not mask.any()
+    values, mask = decoder.numpy_column('s')
+    assert values.dtype == object and values.tolist() == ['a', None, 'c'] and mask.tolist() == [False, True, False]
+
+
+def test_numpy_column_of_empty_result():
+    pytest.importorskip('numpy')
+    values, mask = _decoder(i=[]).numpy_column('i')
+    assert values.tolist() == [] and mask.tolist() == []
+
+
+def _temporal(type_: str, value):
+    if type_ == 'DATE':
+        return DataObject.ValueWrapper(ttypes.Value(dVal=ttypes.Date(value.year, value.month, value.day)))
+    if type_ == 'TIME':
+        return DataObject.ValueWrapper(ttypes.Value(tVal=ttypes.Time(value.hour, value.minute, value.second,
+                                                                     value.microsecond)))
+    if type_ == 'DATETIME':
+        return DataObject.ValueWrapper(ttypes.Value(dtVal=ttypes.DateTime(
+            value.year, value.month, value.day, value.hour, value.minute, value.second, value.microsecond)))
+    return DataObject.ValueWrapper(ttypes.Value(duVal=ttypes.Duration(value.days * 86400 + value.seconds,
+                                                                      value.microseconds, 0)))
+
+
+@pytest.mark.parametrize('type_, value', [
+    ('DATE', datetime.date(2024, 1, 2)),
+    ('TIME', datetime.time(3, 4, 5, 6)),
+    ('DATETIME', datetime.datetime(2024, 1, 2, 3, 4, 5, 6)),
+    ('DURATION', datetime.timedelta(days=1, seconds=2, microseconds=3)),
+])
+def test_temporal_values_are_parsed(type_, value):
+    assert ValueFormatter.parse(type_, _temporal(type_, value)) == value
+
+
+def test_datetime_column_is_read_back():
+    tag = TagSchemaModel(name='t', properties=[PropertySchemaModel(name='at', type='DATETIME')])
+    values = [datetime.datetime(2024, 1, 2, 3, 4, 5), datetime.datetime(2020, 2, 29, 23, 59, 59, 999999)]
+    decoder = ValueFormatter.decoder(_ResultSet({'t.at': [_temporal('DATETIME', v) for v in values] + [None]}), tag)
+    assert decoder.column('t.at') == values + [None]
+    assert next(decoder.iter_rows()).to_dict(by_property=True) == {'at': values[0]}
+
+
+def test_duration_with_months_is_rejected():
+    value = DataObject.ValueWrapper(ttypes.Value(duVal=ttypes.Duration(0, 0, 1)))
+    with pytest.raises(ValueError, match='months'):
+        ValueFormatter.parse('DURATION', value)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from ngsm.executor import AsyncPipeline
+
+
+def _statements(n: int):
+    return ['INSERT VERTEX t(p) VALUES "{}":({});'.format(i, i) for i in range(n)]
+
+
+def test_run_executes_every_statement(sessions):
+    report = AsyncPipeline(sessions, space_name='s', concurrency=3).run_sync(_statements(20))
+    assert [r.batch_id for r in report.results] == list(range(20))
+    assert len(report.succeeded()) == 20
+    assert sorted(s for s in sessions.executed if s.startswith('INSERT')) == sorted(_statements(20))
+    assert all(s.released for s in sessions.created)
+
+
+def test_failed_statement_is_reported(sessions):
+    stmts = _statements(5) + ['INSERT VERTEX t(p) VALUES "fail":(0);']
+    report = AsyncPipeline(sessions, space_name='s', concurrency=2).run_sync(stmts)
+    assert [r.batch_id for r in report.failed()] == [5]
+    assert report.failed()[0].error_msg == 'failed'
+
+
+def test_stop_on_error_stops_dispatching(sessions):
+    stmts = ['INSERT VERTEX t(p) VALUES "fail":(0);'] + _statements(50)
+    report = AsyncPipeline(sessions, space_name='s', concurrency=1, max_in_flight=1,
+                           stop_on_error=True).run_sync(stmts)
+    assert len(report.results) < len(stmts)
+
+
+def test_callback_error_is_raised_without_hanging(sessions):
+    def on_result(_):
+        raise RuntimeError('boom')
+
+    pipeline = AsyncPipeline(sessions, space_name='s', concurrency=2, on_result=on_result)
+    with pytest.raises(RuntimeError, match='boom'):
+        pipeline.run_sync(_statements(100))
+    assert len(sessions.executed) < 100 + len(sessions.created)
+    assert all(s.released for s in sessions.created)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import types
+
+import pytest
+
+from ngsm.cache import VertexCache
+from ngsm.io import MmapCsvReader
+from ngsm.io import csv_range_load
+from ngsm.io import csv_range_statements
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import build_id
+
+
+def _schema():
+    return TagSchemaModel(name='person', index=False,
+                          properties=[PropertySchemaModel(name='name', type='STRING', support_null=False),
+                                      PropertySchemaModel(name='age', type='INT8')])
+
+
+def _csv(tmp_path, text):
+    path = tmp_path / 'data.csv'
+    path.write_text(text)
+    return str(path)
+
+
+def test_range_statements_are_yielded(tmp_path):
+    path = _csv(tmp_path, 'vid,name,age\n1,a,1\n2,b,\n3,c,3\n')
+    with MmapCsvReader(path) as reader:
+        start, end = reader.data_start, reader.size
+    stmts = csv_range_statements(path, _schema(), start, end, max_rows=2)
+    assert isinstance(stmts, types.GeneratorType)
+    stmts = list(stmts)
+    assert len(stmts) == 2
+    assert ':("a", 1), ' in stmts[0] and stmts[0].endswith(':("b", NULL);') and stmts[1].endswith(':("c", 3);')
+
+
+@pytest.mark.parametrize('text, message', [
+    ('vid,name,age\n1,a,1\n2,b,x\n', 'line 3'),
+    ('vid,name,age\n1,a,1\n2,b,300\n', 'out of range'),
+    ('vid,name,age\n1,a,1\n2\n', 'require 3 fields but got 1 at line 3'),
+])
+def test_invalid_rows_report_line(tmp_path, text, message):
+    path = _csv(tmp_path, text)
+    with MmapCsvReader(path) as reader:
+        with pytest.raises(ValueError, match=message):
+            list(reader.statements(_schema()))
+
+
+def test_not_null_is_enforced(tmp_path):
+    path = _csv(tmp_path, 'vid,age\n1,1\n')
+    with MmapCsvReader(path) as reader:
+        with pytest.raises(ValueError, match='not support null at line 2'):
+            list(reader.statements(_schema()))
+
+
+class _Session:
+    executed = []
+
+    def execute(self, stmt):
+        self.executed.append(stmt)
+        return types.SimpleNamespace(is_succeeded=lambda: True, error_msg=lambda: '')
+
+    def release(self):
+        pass
+
+
+def test_range_load_executes_in_place(tmp_path):
+    path = _csv(tmp_path, 'vid,name,age\n1,a,1\n2,b,x\n')
+    with MmapCsvReader(path) as reader:
+        start, end = reader.data_start, reader.size
+    shard = csv_range_load(path, _schema(), start, end, session_factory=_Session, space_name='s')
+    assert shard.shard_id == start
+    assert len(shard.errors) == 1 and 'line 3' in shard.errors[0]
+
+
+def test_range_load_counts_rendered_rows(tmp_path):
+    path = _csv(tmp_path, 'vid,name,age\n1,a,1\n2,b,2\n\n3,c,3\n')
+    with MmapCsvReader(path) as reader:
+        ranges = reader.byte_ranges(2)
+    shards = [csv_range_load(path, _schema(), start, end, session_factory=_Session, space_name='s', max_rows=1)
+              for start, end in ranges]
+    assert sum([shard.rows for shard in shards]) == sum([shard.statements for shard in shards]) == 3
+    assert not any([shard.errors for shard in shards])
+
+
+def test_counted_statements_report_rows_per_statement(tmp_path):
+    path = _csv(tmp_path, 'vid,name,age\n' + ''.join(['{0},n{0},{0}\n'.format(i) for i in range(5)]))
+    with MmapCsvReader(path) as reader:
+        assert [rows for _, rows in reader.counted_statements(_schema(), max_rows=2)] == [2, 2, 1]
+
+
+def test_mmap_rows_invalidate_cached_vertices(tmp_path):
+    schema = TagSchemaModel(name='person', properties=[PropertySchemaModel(name='name', type='STRING')])
+    vid = build_id(schema_name='person', _str_things='1')
+    vertex_cache = VertexCache(ttl=None)
+    vertex_cache.put(types.SimpleNamespace(schema=schema, vid=vid, properties={}))
+    with MmapCsvReader(_csv(tmp_path, 'vid,name\n1,a\n')) as reader:
+        list(reader.statements(schema))
+    assert vertex_cache.get('person', vid) is None
+
+
+def test_mmap_vids_are_invalidated_once_per_statement(tmp_path, monkeypatch):
+    schema = TagSchemaModel(name='person', properties=[PropertySchemaModel(name='name', type='STRING')])
+    calls = []
+    monkeypatch.setattr('ngsm.io.cache.invalidate_vertices', lambda name, vids: calls.append((name, list(vids))))
+    path = _csv(tmp_path, 'vid,name\n1,a\n2,b\n3,c\n')
+    with MmapCsvReader(path) as reader:
+        stmts = reader.statements(schema, max_rows=2)
+        next(stmts)
+        # 语句产出前其中的vid都已失效
+        assert calls and {'person__1', 'person__2'} <= set(calls[0][1])
+        list(stmts)
+    # 读入的下一行随前一条语句一起失效
+    assert len(calls) == 1
+    assert sorted([vid for _, vids in calls for vid in vids]) == ['person__1', 'person__2', 'person__3']
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from ngsm.adaptive import AdaptiveBatchController
+from ngsm.executor import AsyncPipeline
+from ngsm.journal import CheckpointJournal
+from ngsm.journal import FileJournal
+from ngsm.journal import SqliteJournal
+from ngsm.loader import ShardedLoader
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+
+
+@pytest.fixture(params=['file', 'sqlite'])
+def journal(request, tmp_path):
+    path = str(tmp_path / 'journal')
+    journal = FileJournal(path) if request.param == 'file' else SqliteJournal(path)
+    journal.reopen = (lambda: FileJournal(path)) if request.param == 'file' else (lambda: SqliteJournal(path))
+    yield journal
+    journal.close()
+
+
+def test_journal_is_abstract():
+    with pytest.raises(TypeError):
+        CheckpointJournal()
+
+
+def test_record_survives_reopen(journal):
+    journal.record('job', 0, 10)
+    journal.record('job', 2)
+    journal.record('other', 1, 5)
+    journal.close()
+    with journal.reopen() as reopened:
+        assert reopened.completed('job') == {0, 2}
+        assert reopened.offset('job', 0) == 10
+        assert reopened.offset('job', 2) is None
+        assert reopened.watermark('job') == 1
+        reopened.reset('job')
+        assert reopened.completed('job') == set()
+        assert reopened.completed('other') == {1}
+
+
+def test_file_journal_ignores_partial_last_line(tmp_path):
+    path = tmp_path / 'journal'
+    path.write_text('job\t0\t\njob\t1')
+    with FileJournal(str(path)) as journal:
+        assert journal.completed('job') == {0}
+
+
+def test_pipeline_resumes_from_journal(journal, sessions):
+    stmts = ['INSERT VERTEX t(p) VALUES "{}":({});'.format(i, i) for i in range(6)]
+    stmts[3] = 'INSERT VERTEX t(p) VALUES "fail":(3);'
+    report = AsyncPipeline(sessions, space_name='s', concurrency=2, journal=journal, job='t').run_sync(stmts)
+    assert journal.completed('t') == {0, 1, 2, 4, 5}
+    assert [r.batch_id for r in report.failed()] == [3]
+
+    sessions.executed.clear()
+    stmts[3] = 'INSERT VERTEX t(p) VALUES "3":(3);'
+    report = AsyncPipeline(sessions, space_name='s', concurrency=2, journal=journal, job='t').run_sync(stmts)
+    assert report.skipped == 5
+    assert [s for s in sessions.executed if s.startswith('INSERT')] == [stmts[3]]
+    assert journal.completed('t') == set(range(6))
+
+
+def test_sharded_loader_does_not_record_unexecuted_shards(journal):
+    schema = TagSchemaModel(name='t', properties=[PropertySchemaModel(name='p', type='INT64')])
+    loader = ShardedLoader(schema, processes=1, shard_size=2, journal=journal)
+    report = loader.load([('v{}'.format(i), dict(p=i)) for i in range(5)])
+    assert report.shards == 3 and report.statements == 3
+    assert journal.completed('t') == set()
+
+
+def test_pipeline_rejects_journal_with_controller(journal, sessions):
+    with pytest.raises(ValueError, match='controller'):
+        AsyncPipeline(sessions, space_name='s', journal=journal, job='t', controller=AdaptiveBatchController())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from ngsm.journal import FileJournal
+from ngsm.loader import ShardedLoader
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+
+
+class _Result:
+
+    def __init__(self, succeeded: bool):
+        self.succeeded = succeeded
+
+    def is_succeeded(self):
+        return self.succeeded
+
+    def error_msg(self):
+        return 'failed'
+
+
+class FileSessionFactory:
+    """可被pickle的会话工厂，子进程执行的语句逐行追加到文件中，语句中含有 fail 时返回失败"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self):
+        return self
+
+    def execute(self, stmt: str):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(stmt + '\n')
+        return _Result(succeeded='fail' not in stmt)
+
+    def release(self):
+        pass
+
+    def executed(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+
+def _tag():
+    return TagSchemaModel(name='t', properties=[PropertySchemaModel(name='p', type='INT64')])
+
+
+def _rows(size: int):
+    return [('v{}'.format(i), dict(p=i)) for i in range(size)]
+
+
+def test_render_only_returns_statements_of_every_shard():
+    report_rendered = dict()
+    loader = ShardedLoader(_tag(), processes=2, shard_size=2,
+                           on_shard=lambda shard, report: report_rendered.update({shard.shard_id: shard.rendered}))
+    report = loader.load(_rows(5))
+    assert (report.shards, report.rows, report.statements, report.errors) == (3, 5, 3, [])
+    assert report.stmt_bytes == sum([len(stmts[0]) for stmts in report_rendered.values()])
+    assert report_rendered[2] == ['Insert VERTEX t(p) VALUES "t__v4":(4);']
+
+
+def test_shard_options_are_applied_in_workers():
+    rendered = []
+    loader = ShardedLoader(_tag(), processes=1, shard_size=3, max_rows=2, if_not_exists=True,
+                           on_shard=lambda shard, report: rendered.extend(shard.rendered))
+    assert loader.load(_rows(3)).statements == 2
+    assert all(stmt.startswith('Insert VERTEX IF NOT EXISTS t(p)') for stmt in rendered)
+
+
+def test_edges_are_loaded_from_tuples():
+    schema = EdgeSchemaModel(name='e', properties=[PropertySchemaModel(name='w', type='DOUBLE')])
+    rendered = []
+    loader = ShardedLoader(schema, processes=1, on_shard=lambda shard, report: rendered.extend(shard.rendered))
+    loader.load([('a', 'b', 0, dict(w=1.5)), ('b', 'c', 2, dict())])
+    assert rendered == ['Insert Edge e(w) VALUES "a"->"b":(1.5), "b"->"c"@2:(NULL);']
+
+
+def test_workers_execute_through_their_own_sessions(tmp_path):
+    factory = FileSessionFactory(str(tmp_path / 'executed'))
+    report = ShardedLoader(_tag(), space_name='s', session_factory=factory, processes=2, shard_size=2).load(_rows(5))
+    executed = factory.executed()
+    assert report.statements == 3 and not report.errors
+    assert len([stmt for stmt in executed if stmt.startswith('Insert VERTEX')]) == 3
+    # 每个进程只切换一次图空间
+    assert 1 <= executed.count('USE s;') <= 2
+
+
+def test_failed_shards_are_reported_and_not_recorded(tmp_path):
+    factory = FileSessionFactory(str(tmp_path / 'executed'))
+    rows = _rows(6)
+    rows[3] = ('fail', dict(p=3))
+    with FileJournal(str(tmp_path / 'journal')) as journal:
+        loader = ShardedLoader(_tag(), space_name='s', session_factory=factory, processes=2, shard_size=2,
+                               journal=journal)
+        report = loader.load(rows)
+        assert report.errors == [(1, 'failed')]
+        assert journal.completed('t') == {0, 2}
+
+        rows[3] = ('v3', dict(p=3))
+        report = loader.load(rows)
+        assert (report.skipped, report.shards, report.errors) == (2, 1, [])
+        assert journal.completed('t') == {0, 1, 2}
+
+
+def test_invalid_row_fails_only_its_shard():
+    rows = _rows(4)
+    rows[0] = ('v0', dict(p='x'))
+    report = ShardedLoader(_tag(), processes=1, shard_size=2).load(rows)
+    assert [shard_id for shard_id, _ in report.errors] == [0]
+    assert report.errors[0][1].startswith('ValidationError')
+    assert report.statements == 1
+
+
+@pytest.mark.parametrize('kwargs, error', [
+    (dict(schema=object()), TypeError),
+    (dict(schema=_tag(), session_factory=FileSessionFactory('x')), ValueError),
+    (dict(schema=_tag(), shard_size=0), ValueError),
+])
+def test_invalid_arguments(kwargs, error):
+    with pytest.raises(error):
+        ShardedLoader(**kwargs)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from ngsm import metrics
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.ngql import Delete
+from ngsm.ngql import Insert
+
+
+@pytest.fixture
+def sink():
+    sink = metrics.MemorySink()
+    previous = metrics.set_sink(sink)
+    yield sink
+    metrics.set_sink(previous)
+
+
+def test_statement_schema():
+    assert metrics.statement_schema('INSERT VERTEX IF NOT EXISTS person(name) VALUES "1":("a");') == 'person'
+    assert metrics.statement_schema('DELETE VERTEX "1";') == ''
+
+
+def test_only_insert_rows_are_counted(sink):
+    schema = TagSchemaModel(name='person', properties=[PropertySchemaModel(name='name', type='STRING')])
+    list(Insert.iter_couple_stmts(fix_part='INSERT VERTEX person(name) VALUES ',
+                                  multi_parts=['"1":("a")', '"2":("b")'], multi_part_splitter=', '))
+    Delete.vertex(schema, ['1', '2', '3'])
+    assert sink.value('ngsm_rows_rendered_total', schema='person') == 2
+    assert sink.value('ngsm_rows_rendered_total', schema='') == 0
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from ngsm.base import ConflictPolicy
+from ngsm.base import NDataTypes
+from ngsm.model import EdgeBatch
+from ngsm.model import EdgeModel
+from ngsm.model import EdgeRowStore
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import EdgesModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import ValidationError
+from ngsm.model import VertexBatch
+from ngsm.model import VertexModel
+from ngsm.model import VertexRowStore
+from ngsm.model import VertexesModel
+from ngsm.ngql import Insert
+
+
+def _tag(index: bool = True):
+    return TagSchemaModel(name='t', index=index, properties=[
+        PropertySchemaModel(name='n', type='INT8', support_null=False),
+        PropertySchemaModel(name='s', type='STRING'),
+        PropertySchemaModel(name='d', type='DATE'),
+    ])
+
+
+def _edge_type():
+    return EdgeSchemaModel(name='e', properties=[PropertySchemaModel(name='w', type='DOUBLE')])
+
+
+def test_vertex_batch_renders_like_vertex_models():
+    tag = _tag()
+    rows = [(1, {'n': 1, 's': 'a"b', 'd': datetime.date(2024, 1, 2)}), (2, {'n': -128, 's': None})]
+    batch = VertexBatch(schema=tag, vids=[vid for vid, _ in rows],
+                        columns={'n': [1, -128], 's': ['a"b', None], 'd': [datetime.date(2024, 1, 2), None]})
+    vertexes = [VertexModel(vid=vid, schema=tag, properties=properties) for vid, properties in rows]
+    assert Insert.vertex_batch(batch, if_not_exists=False) == Insert.vertex(tag, vertexes, if_not_exists=False)
+    assert Insert.vertex_batch(batch, if_not_exists=False) == \
+        'Insert VERTEX t(n, s, d) VALUES "t__1":(1, "a\\"b", date("2024-01-02")), "t__2":(-128, NULL, NULL);'
+
+
+def test_vertex_batch_statements_respect_max_rows():
+    batch = VertexBatch(schema=_tag(), vids=range(5), columns={'n': list(range(5))})
+    stmts = list(Insert.iter_vertex_batch_statements(batch, max_rows=2))
+    assert [stmt.count('"t__') for stmt in stmts] == [2, 2, 1]
+    assert stmts[-1] == 'Insert VERTEX t(n, s, d) VALUES "t__4":(4, NULL, NULL);'
+
+
+def test_vertex_batch_accepts_numpy_columns():
+    numpy = pytest.importorskip('numpy')
+    batch = VertexBatch(schema=_tag(), vids=numpy.arange(2), columns={'n': numpy.array([3, 4], dtype='int8')})
+    assert Insert.vertex_batch(batch, if_not_exists=False).endswith('"t__0":(3, NULL, NULL), "t__1":(4, NULL, NULL);')
+
+
+def test_vertex_batch_reports_every_invalid_value():
+    with pytest.raises(ValidationError) as e:
+        VertexBatch(schema=_tag(), vids=[1, 2, 3], columns={'n': [1, None, 200], 's': ['a', 'b', 3]})
+    assert [(i.row, i.property_name) for i in e.value.report.issues] == [(1, 'n'), (2, 'n'), (2, 's')]
+
+
+def test_vertex_batch_rejects_unknown_and_misaligned_columns():
+    with pytest.raises(ValueError, match='not defined'):
+        VertexBatch(schema=_tag(), vids=[1], columns={'n': [1], 'x': [1]})
+    with pytest.raises(ValueError, match='rows are expected'):
+        VertexBatch(schema=_tag(), vids=[1, 2], columns={'n': [1]})
+
+
+def test_empty_vertex_batch_renders_nothing():
+    assert Insert.vertex_batch(VertexBatch(schema=_tag(), vids=[]), if_not_exists=False) is None
+
+
+def test_edge_batch_renders_like_edge_models():
+    edge_type = _edge_type()
+    batch = EdgeBatch(schema=edge_type, src_vids=['a', 'b'], dst_vids=['b', 'c'], ranks=[0, 3],
+                      columns={'w': [1.5, None]})
+    edges = [EdgeModel(src_vid='a', dst_vid='b', schema=edge_type, properties={'w': 1.5}),
+             EdgeModel(src_vid='b', dst_vid='c', rank=3, schema=edge_type, properties={})]
+    assert Insert.edge_batch(batch, if_not_exists=True) == Insert.edge(edge_type, edges, if_not_exists=True)
+    assert Insert.edge_batch(batch, if_not_exists=True).endswith('"a"->"b":(1.5), "b"->"c"@3:(NULL);')
+
+
+def test_edge_batch_checks_ranks():
+    with pytest.raises(ValueError, match='ranks'):
+        EdgeBatch(schema=_edge_type(), src_vids=['a'], dst_vids=['b'], ranks=[0, 1])
+    with pytest.raises(TypeError, match='ranks'):
+        EdgeBatch(schema=_edge_type(), src_vids=['a'], dst_vids=['b'], ranks=['1'])
+
+
+@pytest.mark.parametrize('type_, values, support_null, rows', [
+    ('INT8', [1, 127, -128], False, []),
+    ('INT8', [1, 128, None], True, [1]),
+    ('INT64', [1, True], True, [1]),
+    ('DOUBLE', [1, 1.5, None], False, [2]),
+    ('DATE', [datetime.date(2024, 1, 1), datetime.datetime(2024, 1, 1)], True, [1]),
+    ('STRING', [None, None], True, []),
+])
+def test_column_issues_match_the_per_value_checker(type_, values, support_null, rows):
+    assert [row for row, _ in NDataTypes.column_issues(values, type_, support_null)] == rows
+
+
+def _vertexes(policy: str):
+    return VertexesModel(schema=_tag(), conflict_policy=policy)
+
+
+def _vertex(vid, **properties):
+    return VertexModel(vid=vid, schema=_tag(), properties=dict(dict(n=0), **properties))
+
+
+def test_last_wins_replaces_duplicates_in_place():
+    vertexes = _vertexes(ConflictPolicy.LAST_WINS.value)
+    first, other, last = _vertex(1, s='a'), _vertex(2), _vertex(1, s='b')
+    for vertex in (first, other, last):
+        vertexes.add(vertex)
+    assert vertexes.candidates == [last, other] and vertexes.candidates[0] is last
+    assert len(vertexes) == 2 and vertexes.duplicates == 1
+    assert vertexes.get('t__1') is last and 't__1' in vertexes and 't__3' not in vertexes
+
+
+def test_first_wins_keeps_the_first_instance():
+    vertexes = _vertexes(ConflictPolicy.FIRST_WINS.value)
+    first = _vertex(1, s='a')
+    vertexes.add(first)
+    vertexes.add(_vertex(1, s='b'))
+    assert vertexes.candidates == [first] and vertexes.get('t__1') is first and vertexes.duplicates == 1
+
+
+def test_merge_overwrites_with_non_null_properties_without_mutating_inputs():
+    vertexes = _vertexes(ConflictPolicy.MERGE.value)
+    first, second = _vertex(1, s='a'), _vertex(1, n=5, s=None, d=datetime.date(2024, 1, 1))
+    vertexes.add(first)
+    vertexes.add(second)
+    merged = vertexes.get('t__1')
+    assert merged.properties == dict(n=5, s='a', d=datetime.date(2024, 1, 1))
+    assert merged is not first and merged is not second
+    assert first.properties == dict(n=0, s='a')
+    assert second.properties == dict(n=5, s=None, d=datetime.date(2024, 1, 1))
+
+
+def test_edges_are_deduplicated_by_endpoints_and_rank():
+    edges = EdgesModel(schema=_edge_type(), conflict_policy=ConflictPolicy.MERGE.value)
+    for rank, w in ((0, 1.0), (1, 2.0), (0, None)):
+        edges.add(EdgeModel(src_vid='a', dst_vid='b', rank=rank, schema=_edge_type(), properties=dict(w=w)))
+    assert len(edges) == 2 and edges.duplicates == 1
+    assert edges.get(('a', 'b', 0)).properties == dict(w=1.0)
+
+
+def test_union_applies_the_policy_of_the_receiver():
+    left, right = _vertexes(ConflictPolicy.FIRST_WINS.value), _vertexes(ConflictPolicy.LAST_WINS.value)
+    left.add(_vertex(1, s='a'))
+    right.add(_vertex(1, s='b'))
+    right.add(_vertex(2))
+    left.union(right)
+    assert [v.properties.get('s') for v in left.candidates] == ['a', None]
+
+
+def test_members_of_other_schemas_are_rejected():
+    with pytest.raises(TypeError):
+        _vertexes(ConflictPolicy.LAST_WINS.value).add(EdgeModel(src_vid='a', dst_vid='b', schema=_edge_type()))
+
+
+def test_unknown_conflict_policy_is_rejected():
+    with pytest.raises(ValueError):
+        _vertexes('NEWEST')
+
+
+def test_vertex_row_store_keeps_schema_column_order():
+    store = VertexRowStore(schema=_tag())
+    store.add(1, dict(s='a', n=1))
+    store.add(2, dict(n=2))
+    assert store.rows == [(1, 'a', None), (2, None, None)]
+    assert store.columns() == dict(n=[1, 2], s=['a', None], d=[None, None])
+    batch = store.to_batch()
+    assert batch.vids == ['t__1', 't__2'] and len(store) == 2
+    store.clear()
+    assert len(store) == 0 and store.rows == []
+
+
+def test_vertex_row_store_interns_vids():
+    store = VertexRowStore(schema=_tag())
+    store.add(''.join(['v', '1']))
+    store.add(''.join(['v', '1']))
+    assert store.vids[0] is store.vids[1]
+
+
+def test_row_stores_reject_undefined_properties():
+    store = VertexRowStore(schema=_tag())
+    with pytest.raises(ValueError, match='x is not defined in schema: t'):
+        store.add(1, dict(n=1, x=2))
+    assert len(store) == 0 and store.rows == []
+    edges = EdgeRowStore(schema=_edge_type())
+    with pytest.raises(ValueError, match='weight is not defined in schema: e'):
+        edges.add('a', 'b', dict(weight=1.0))
+    assert len(edges) == 0 and edges.ranks == []
+
+
+def test_row_store_validation_is_deferred_to_batch():
+    store = VertexRowStore(schema=_tag())
+    store.add(1, dict(n='x'))
+    with pytest.raises(ValidationError):
+        store.to_batch()
+
+
+def test_edge_row_store_to_batch():
+    store = EdgeRowStore(schema=_edge_type())
+    store.add('a', 'b', dict(w=1.5))
+    store.add('b', 'c', rank=2)
+    assert Insert.edge_batch(store.to_batch(), if_not_exists=False) == \
+        'Insert Edge e(w) VALUES "a"->"b":(1.5), "b"->"c"@2:(NULL);'
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from ngsm.base import Setting
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.ngql import Delete
+from ngsm.ngql import Go
+from ngsm.ngql import Insert
+from ngsm.ngql import Lookup
+from ngsm.ngql import Query
+from ngsm.ngql import Update
+from ngsm.reader import GraphReader
+
+
+def _tag(*names):
+    return TagSchemaModel(name='t', properties=[PropertySchemaModel(name=n, type='STRING', index=True)
+                                                for n in names or ('name',)])
+
+
+def _couple(parts, **kwargs):
+    return list(Insert.iter_couple_stmts('INSERT ', parts, ', ', **kwargs))
+
+
+def test_couple_stmts_respect_byte_limit():
+    parts = ['a' * 10] * 5
+    # 'INSERT ' 7 字节 + 分号 1 字节，两行加分隔符为 22 字节，恰好填满 30 字节
+    stmts = _couple(parts, max_bytes=30)
+    assert stmts == ['INSERT aaaaaaaaaa, aaaaaaaaaa;'] * 2 + ['INSERT aaaaaaaaaa;']
+    assert all(len(stmt.encode('utf-8')) <= 30 for stmt in stmts)
+
+
+def test_couple_stmts_count_utf8_bytes():
+    stmts = _couple(['数据', '数据'], max_bytes=20)
+    assert stmts == ['INSERT 数据;', 'INSERT 数据;']
+
+
+def test_couple_stmts_respect_row_limit():
+    stmts = _couple([str(i) for i in range(5)], max_rows=2)
+    assert stmts == ['INSERT 0, 1;', 'INSERT 2, 3;', 'INSERT 4;']
+    with pytest.raises(ValueError, match='max_rows'):
+        _couple(['0'], max_rows=0)
+
+
+def test_couple_stmts_are_lazy():
+    consumed = []
+
+    def parts():
+        for i in range(4):
+            consumed.append(i)
+            yield str(i)
+    stmts = Insert.iter_couple_stmts('INSERT ', parts(), ', ', max_rows=1)
+    assert next(stmts) == 'INSERT 0;' and consumed == [0, 1]
+
+
+def test_single_row_larger_than_max_bytes_is_rejected():
+    with pytest.raises(ValueError, match='exceeds max_bytes'):
+        _couple(['a', 'b' * 30], max_bytes=20)
+
+
+def test_single_row_larger_than_budget_is_emitted_alone():
+    stmts = _couple(['a', 'b' * 30, 'c'], budget=lambda: (20, None))
+    assert stmts == ['INSERT a;', 'INSERT {};'.format('b' * 30), 'INSERT c;']
+
+
+def test_single_row_larger_than_max_stmt_length_is_rejected_under_budget(monkeypatch):
+    monkeypatch.setattr(Setting, 'max_stmt_length', 40)
+    with pytest.raises(ValueError, match='exceeds max_bytes: 40'):
+        _couple(['a', 'b' * 40], budget=lambda: (20, None))
+
+
+def test_where_escapes_string_literals():
+    where = Query.where(_tag(), {'name': 'a" OR 1 == 1 OR "\\'})
+    assert where == ' WHERE t.name == "a\\" OR 1 == 1 OR \\"\\\\"'
+
+
+def test_key_columns_do_not_collide_with_properties():
+    schema = _tag('vid', 'name')
+    assert Lookup.query(schema) == 'LOOKUP ON t YIELD id(vertex) AS __vid, t.vid AS vid, t.name AS name;'
+    edge = EdgeSchemaModel(name='e', properties=[PropertySchemaModel(name='rank', type='INT64')])
+    assert Query.yield_clause(edge) == \
+        ' YIELD src(edge) AS __src, dst(edge) AS __dst, rank(edge) AS __rank, properties(edge).rank AS rank'
+
+
+def test_properties_named_as_key_columns_are_rejected():
+    with pytest.raises(ValueError, match='key columns'):
+        Query.yield_clause(_tag('__vid'))
+
+
+def test_cursor_condition_uses_key_aliases():
+    stmt = Lookup.page_after(_tag(), limit=10, cursor=('v1',))
+    assert '$-.__vid AS __vid' in stmt and '$-.__vid > "v1"' in stmt and stmt.endswith('| LIMIT 10;')
+
+
+class _EmptyResult:
+
+    def is_succeeded(self):
+        return True
+
+    def row_size(self):
+        return 0
+
+
+class _Session:
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, stmt):
+        self.executed.append(stmt)
+        return _EmptyResult()
+
+
+def test_lookup_pages_with_a_cursor_by_default():
+    session = _Session()
+    assert list(GraphReader(session).lookup_pages(_tag(), {'name': 'a'}, page_size=2)) == []
+    assert session.executed == [Lookup.page_after(_tag(), {'name': 'a'}, limit=2, cursor=None)]
+    assert session.executed[0].endswith('| LIMIT 2;')
+
+
+def test_lookup_pages_with_offsets_without_cursor():
+    session = _Session()
+    list(GraphReader(session).lookup(_tag(), page_size=3, use_cursor=False))
+    assert session.executed == [Lookup.page(_tag(), limit=3, offset=0)]
+
+
+def test_lookup_runs_a_single_scan_on_request():
+    session = _Session()
+    assert list(GraphReader(session).lookup_pages(_tag(), {'name': 'a'}, page_size=2, single_scan=True)) == []
+    assert session.executed == ['LOOKUP ON t WHERE t.name == "a" YIELD id(vertex) AS __vid, t.name AS name;']
+
+
+def test_go_over_edges():
+    edge = EdgeSchemaModel(name='e', properties=[PropertySchemaModel(name='w', type='DOUBLE')])
+    assert Go.over(edge, ['a', 'b'], steps=2, direction='reversely') == [
+        'GO 2 STEPS FROM "a", "b" OVER e REVERSELY'
+        ' YIELD src(edge) AS __src, dst(edge) AS __dst, rank(edge) AS __rank, properties(edge).w AS w;']
+    with pytest.raises(ValueError, match='direction'):
+        Go.over(edge, ['a'], direction='sideways')
+
+
+def _scored():
+    return TagSchemaModel(name='t', properties=[PropertySchemaModel(name='s', type='STRING'),
+                                                PropertySchemaModel(name='n', type='INT64')])
+
+
+def test_update_edge_encodes_none_as_null():
+    edge = EdgeSchemaModel(name='e', properties=[PropertySchemaModel(name='w', type='DOUBLE'),
+                                                 PropertySchemaModel(name='s', type='STRING')])
+    assert Update.edge(edge, ('a', 0, 'b'), {'w': None, 's': 'x"'}) == \
+        'UPDATE EDGE ON e "a" -> "b"@0 SET w = NULL, s = "x\\"";'
+    with pytest.raises(ValueError, match='not defined'):
+        Update.edge(edge, ('a', 0, 'b'), {'missing': 1})
+
+
+def test_update_vertex_and_upsert():
+    assert Update.vertex(_scored(), 'v', {'n': None}, upsert=True) == 'UPSERT VERTEX ON t "v" SET n = NULL;'
+
+
+def test_updates_of_the_same_target_are_merged_and_grouped_by_assignments():
+    groups = Update._grouped(_scored(), [('a', {'n': 1}), ('b', {'n': 1}), ('a', {'s': 'x'}), ('c', {'n': 1})])
+    assert groups == [('n = 1, s = "x"', ['a']), ('n = 1', ['b', 'c'])]
+
+
+def test_unhashable_values_are_encoded_per_target():
+    schema = TagSchemaModel(name='t', properties=[PropertySchemaModel(name='d', type='DURATION')])
+
+    class Unhashable(datetime.timedelta):
+        __hash__ = None
+    groups = Update._grouped(schema, [('a', {'d': Unhashable(seconds=1)}), ('b', {'d': Unhashable(seconds=1)})])
+    assert groups == [('d = duration({days: 0, seconds: 1, microseconds: 0})', ['a', 'b'])]
+
+
+def test_vertex_updates_are_packed_into_multi_statement_payloads():
+    updates = [('v{}'.format(i), {'n': i % 2}) for i in range(4)]
+    assert Update.vertices(_scored(), updates) == [
+        'UPDATE VERTEX ON t "v0" SET n = 0; UPDATE VERTEX ON t "v2" SET n = 0; '
+        'UPDATE VERTEX ON t "v1" SET n = 1; UPDATE VERTEX ON t "v3" SET n = 1;']
+    payloads = Update.vertices(_scored(), updates, upsert=True, max_bytes=70)
+    assert payloads[0] == 'UPSERT VERTEX ON t "v0" SET n = 0; UPSERT VERTEX ON t "v2" SET n = 0;'
+    assert len(payloads) == 2 and all(len(payload) <= 70 for payload in payloads)
+
+
+def test_edge_updates_accept_list_pairs():
+    edge = EdgeSchemaModel(name='e', properties=[PropertySchemaModel(name='w', type='DOUBLE')])
+    assert Update.edges(edge, [(['a', 0, 'b'], {'w': 1.0}), (('a', 0, 'b'), {'w': None})]) == \
+        ['UPDATE EDGE ON e "a" -> "b"@0 SET w = NULL;']
+
+
+def test_delete_vertex_requires_a_tag():
+    assert Delete.vertex(_tag(), ['a', 'b'], with_edge=True) == 'DELETE VERTEX "a", "b" WITH EDGE;'
+    with pytest.raises(TypeError, match='TagSchemaModel'):
+        Delete.vertex(EdgeSchemaModel(name='e'), ['a'])
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+
+import pytest
+
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.param import ParamDelete
+from ngsm.param import ParamQuery
+from ngsm.param import Templates
+from ngsm.param import to_value
+
+pytest.importorskip('nebula3')
+
+
+@pytest.fixture(autouse=True)
+def templates():
+    Templates.clear()
+    yield
+    Templates.clear()
+
+
+def _same_name_schemas():
+    properties = [PropertySchemaModel(name='since', type='INT64', index=True)]
+    return TagSchemaModel(name='follow', properties=properties), EdgeSchemaModel(name='follow', properties=properties)
+
+
+def test_lookup_keys_include_schema_type():
+    tag, edge = _same_name_schemas()
+    tag_stmt = ParamQuery.lookup(tag, {'since': 1}).stmt
+    edge_stmt = ParamQuery.lookup(edge, {'since': 1}).stmt
+    assert 'id(vertex)' in tag_stmt and 'id(vertex)' not in edge_stmt
+    assert 'src(edge)' in edge_stmt
+
+
+def test_every_template_key_starts_with_schema_type():
+    tag, edge = _same_name_schemas()
+    ParamDelete.vertex(tag, ['v'])
+    ParamDelete.edge(edge, [('a', 0, 'b')])
+    ParamQuery.fetch_vertices(tag, ['v'])
+    ParamQuery.lookup(tag, {'since': 1})
+    ParamQuery.lookup(edge, {'since': 1})
+    assert len(Templates._cache) == 5
+    assert {key[:2] for key in Templates._cache} == {('TAG', 'follow'), ('EDGE', 'follow')}
+
+
+def test_templates_are_reused():
+    tag, _ = _same_name_schemas()
+    first = ParamDelete.vertex(tag, ['a', 'b'])[0]
+    second = ParamDelete.vertex(tag, ['c', 'd'])[0]
+    assert first.stmt is second.stmt
+    assert first.params != second.params
+
+
+@pytest.mark.parametrize('value', [
+    datetime.datetime(2024, 1, 1, 8, 30),
+    datetime.datetime(2024, 1, 1, 16, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=8))),
+])
+def test_timestamp_params_treat_naive_datetimes_as_utc(value):
+    assert to_value('TIMESTAMP', value).get_iVal() == 1704097800
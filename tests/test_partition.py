@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import struct
+
+import pytest
+
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.model import VertexBatch
+from ngsm.partition import Partitioner
+from ngsm.partition import murmur_hash2
+
+
+@pytest.mark.parametrize('data, expected', [
+    # std::hash<std::string> of libstdc++ on x86_64
+    (b'', 6142509188972423790),
+    (b'a', 4993892634952068459),
+    (b'player100', 7289597605171850056),
+    (b'Tim Duncan', 5662213458193308137),
+    (b'abcdefghijklmnop', 9002761040096737846),
+    (b'12345678901234567', 4786737806892549399),
+])
+def test_murmur_hash2_matches_libstdcxx(data, expected):
+    assert murmur_hash2(data) == expected
+
+
+def test_string_partition_ids():
+    partitioner = Partitioner(100)
+    assert partitioner.partition('player100') == 7289597605171850056 % 100 + 1
+    # 长度恰好为8字节时按整型解释
+    assert partitioner.partition('abcdefgh') == struct.unpack('<Q', b'abcdefgh')[0] % 100 + 1
+    # 按C字符串计算哈希，\0 之后的内容被忽略
+    assert partitioner.partition('a\0bc') == partitioner.partition('a')
+    assert all(1 <= partitioner.partition('v{}'.format(i)) <= 100 for i in range(1000))
+
+
+def test_integer_partition_ids():
+    partitioner = Partitioner(10, vid_is_string_type=False)
+    assert partitioner.partition(25) == 6
+    assert partitioner.partition(-1) == ((1 << 64) - 1) % 10 + 1
+
+
+def test_statements_are_grouped_by_partition():
+    partitioner = Partitioner(4)
+    schema = TagSchemaModel(name='t', index=True, properties=[PropertySchemaModel(name='p', type='INT64')])
+    batch = VertexBatch(schema=schema, vids=['v{}'.format(i) for i in range(40)], columns={'p': list(range(40))})
+    stmts = list(partitioner.vertex_batch_statements(batch))
+    groups = partitioner.group(batch.vids, vid_of=lambda vid: vid)
+    assert len(stmts) == len(groups)
+    for stmt in stmts:
+        vids = [part.split('":(')[0].lstrip('"') for part in stmt.split(' VALUES ', 1)[1][:-1].split(', ')]
+        assert len({partitioner.partition(vid) for vid in vids}) == 1
+
+
+def test_partition_num_is_validated():
+    with pytest.raises(ValueError):
+        Partitioner(0)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.rebuild import RebuildJob
+from ngsm.rebuild import RebuildPlanner
+from ngsm.registry import MigrationPlan
+
+
+class Value:
+
+    def __init__(self, value):
+        self.value = value
+
+    def as_int(self):
+        return self.value
+
+    def as_string(self):
+        return self.value
+
+
+class Result:
+
+    def __init__(self, row: list = None, succeeded: bool = True):
+        self.row = [Value(v) for v in row or []]
+        self.succeeded = succeeded
+
+    def is_succeeded(self):
+        return self.succeeded
+
+    def error_msg(self):
+        return 'failed'
+
+    def row_values(self, index: int):
+        return self.row
+
+
+class Session:
+    """
+    代替 graphd 的会话：REBUILD 依次分配作业id，statuses 为每个作业依次返回的 SHOW JOB 状态，
+    用完后保持最后一个状态
+    """
+
+    def __init__(self, statuses: dict = None):
+        self.statuses = statuses or dict()
+        self.executed = []
+        self.next_id = 1
+
+    def execute(self, stmt: str):
+        self.executed.append(stmt)
+        if stmt.startswith('REBUILD'):
+            self.next_id += 1
+            return Result([self.next_id - 1])
+        if stmt.startswith('SHOW JOB '):
+            statuses = self.statuses.get(int(stmt[len('SHOW JOB '):-1]), ['finished'])
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+            return Result([None, 'REBUILD_TAG_INDEX', status])
+        return Result(succeeded=False)
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def _planner(session: Session, **kwargs):
+    clock = Clock()
+    return RebuildPlanner(session, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def _tag(name: str = 't'):
+    return TagSchemaModel(name=name, properties=[PropertySchemaModel(name='a', type='INT64', index=True)])
+
+
+def test_affected_indexes_are_grouped_by_schema_type():
+    edge = EdgeSchemaModel(name='e', index=True, properties=[])
+    planner = _planner(Session()).mark_loaded(_tag()).mark_loaded(edge).mark(_tag(), 'i_T_t')
+    assert planner.statements() == ['REBUILD TAG INDEX i_T_t,i_T_t_P_a;', 'REBUILD EDGE INDEX i_E_e;']
+
+
+def test_max_indexes_per_job_splits_jobs():
+    planner = _planner(Session(), max_indexes_per_job=2).mark(_tag(), ['a', 'b', 'c'])
+    assert [job.index_names for job in planner.jobs()] == [['a', 'b'], ['c']]
+
+
+def test_only_indexes_created_by_the_plan_are_marked():
+    tag = _tag()
+    plan = MigrationPlan(created_indexes=[(tag, 'i_T_t_P_a')])
+    assert _planner(Session()).mark_plan(plan).statements() == ['REBUILD TAG INDEX i_T_t_P_a;']
+
+
+def test_nothing_marked_means_no_jobs():
+    assert _planner(Session()).run() == []
+
+
+def test_run_polls_until_jobs_are_done():
+    session = Session(statuses={1: ['queue', 'running', 'finished'], 2: ['failed']})
+    planner = _planner(session, max_indexes_per_job=1).mark(_tag(), ['a', 'b'])
+    jobs = planner.run()
+    assert [(job.job_id, job.status) for job in jobs] == [(1, 'FINISHED'), (2, 'FAILED')]
+    assert [job.succeeded() for job in jobs] == [True, False]
+    assert RebuildPlanner.job_durations(jobs) == {1: 3.0, 2: 1.0}
+    # 同时只运行一个作业
+    assert session.executed[:4] == ['REBUILD TAG INDEX a;', 'SHOW JOB 1;', 'SHOW JOB 1;', 'SHOW JOB 1;']
+    assert planner.jobs() == []
+
+
+def test_concurrent_jobs_are_submitted_together():
+    session = Session()
+    _planner(session, max_indexes_per_job=1, max_concurrent_jobs=2).mark(_tag(), ['a', 'b']).run()
+    assert session.executed == ['REBUILD TAG INDEX a;', 'REBUILD TAG INDEX b;', 'SHOW JOB 1;', 'SHOW JOB 2;']
+
+
+def test_run_times_out():
+    planner = _planner(Session(statuses={1: ['running']}), timeout=2.5).mark(_tag(), 'a')
+    with pytest.raises(TimeoutError, match=r'\[1\]'):
+        planner.run()
+
+
+def test_job_duration_is_none_until_finished():
+    job = RebuildJob(schema_type='TAG', index_names=['a'], started=1.0)
+    assert job.duration() is None and not job.succeeded()
+
+
+def test_invalid_concurrency():
+    with pytest.raises(ValueError):
+        RebuildPlanner(Session(), max_concurrent_jobs=0)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+from ngsm.model import EdgeSchemaModel
+from ngsm.model import PropertySchemaModel
+from ngsm.model import TagSchemaModel
+from ngsm.registry import SchemaRegistry
+
+
+class Value:
+
+    def __init__(self, value):
+        self.value = value
+
+    def as_string(self):
+        return self.value
+
+    def as_list(self):
+        return [Value(v) for v in self.value]
+
+    def is_null(self):
+        return self.value is None
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+class Result:
+
+    def __init__(self, rows: list, succeeded: bool = True):
+        self.rows = [[Value(v) for v in row] for row in rows]
+        self.succeeded = succeeded
+
+    def is_succeeded(self):
+        return self.succeeded
+
+    def error_msg(self):
+        return 'failed'
+
+    def row_size(self):
+        return len(self.rows)
+
+    def row_values(self, index: int):
+        return self.rows[index]
+
+
+class Session:
+    """
+    代替 graphd 的会话
+    describe: tag名称 -> DESCRIBE 的行，edges 同理；indexes: 索引名称 -> (tag名称, 列名列表)
+    failures: 语句前缀 -> 失败次数，之后执行成功
+    """
+
+    def __init__(self, describe: dict, edges: dict = None, indexes: dict = None, failures: dict = None):
+        self.describe = {'TAG': describe, 'EDGE': edges or dict()}
+        self.indexes = indexes or dict()
+        self.failures = failures or dict()
+        self.executed = []
+
+    def execute(self, stmt: str):
+        if stmt == 'SHOW TAGS;':
+            return Result([[name] for name in self.describe['TAG']])
+        if stmt == 'SHOW EDGES;':
+            return Result([[name] for name in self.describe['EDGE']])
+        if stmt.startswith('DESCRIBE '):
+            schema_type, name = stmt[len('DESCRIBE '):-1].split(' ')
+            return Result(self.describe[schema_type][name])
+        if stmt == 'SHOW TAG INDEXES;':
+            return Result([[name, by, columns] for name, (by, columns) in self.indexes.items()])
+        if stmt.startswith('SHOW '):
+            return Result([])
+        self.executed.append(stmt)
+        for prefix, times in self.failures.items():
+            if stmt.startswith(prefix) and times:
+                self.failures[prefix] -= 1
+                return Result([], succeeded=False)
+        return Result([])
+
+
+def _p(name: str, type_: str = 'INT64', **kwargs):
+    return PropertySchemaModel(name=name, type=type_, **kwargs)
+
+
+def test_live_fingerprint_follows_property_types():
+    first = SchemaRegistry(Session({'t': [['p', 'int64', 'YES', None, '']]})).live_fingerprint()
+    same = SchemaRegistry(Session({'t': [['p', 'int64', 'YES', None, '']]})).live_fingerprint()
+    changed = SchemaRegistry(Session({'t': [['p', 'string', 'YES', None, '']]})).live_fingerprint()
+    assert first == same != changed
+
+
+def test_unsupported_types_are_skipped():
+    registry = SchemaRegistry(Session({'t': [['p', 'int64', 'YES', None, ''], ['g', 'geography', 'YES', None, '']]}))
+    schema = registry.live_schema('TAG', 't')
+    assert schema.property_names() == ['p']
+    assert registry.unsupported[('TAG', 't')] == {'g': 'geography'}
+
+
+def test_new_schema_is_created_with_its_indexes():
+    tag = TagSchemaModel(name='t', index=True, properties=[_p('a', index=True), _p('b', 'STRING')])
+    edge = EdgeSchemaModel(name='e', properties=[_p('w', 'DOUBLE')])
+    plan = SchemaRegistry(Session({})).register(tag, edge).plan()
+    assert plan.drop_index_stmts == []
+    assert [stmt.split('(')[0] for stmt in plan.schema_stmts] == ['CREATE TAG IF NOT EXISTS t',
+                                                                  'CREATE EDGE IF NOT EXISTS e']
+    assert [name for _, name in plan.created_indexes] == ['i_T_t', 'i_T_t_P_a', 'i_E_e']
+    assert plan.create_index_stmts[0] == 'CREATE TAG IF NOT EXISTS INDEX i_T_t on t();'
+    # 规划不修改schema中已记录的索引
+    assert tag.index_names() == []
+
+
+def test_unchanged_schema_plans_nothing():
+    tag = TagSchemaModel(name='t', index=False,
+                         properties=[_p('a', index=True), _p('b', 'STRING', support_null=False)])
+    session = Session({'t': [['a', 'int64', 'YES', None, ''], ['b', 'fixed_string(8)', 'NO', None, '']]},
+                      indexes={'i_T_t_P_a': ('t', ['a'])})
+    assert SchemaRegistry(session).register(tag).plan().is_empty()
+
+
+def test_added_changed_and_dropped_properties():
+    tag = TagSchemaModel(name='t', index=False,
+                         properties=[_p('a'), _p('b', 'STRING'), _p('c', support_null=False)])
+    describe = {'t': [['a', 'int64', 'YES', None, ''], ['c', 'int64', 'YES', None, ''], ['d', 'bool', 'YES', None, '']]}
+    plan = SchemaRegistry(Session(describe)).register(tag).plan()
+    assert [stmt.split(' (')[0] for stmt in plan.schema_stmts] == ['ALTER TAG t ADD', 'ALTER TAG t CHANGE']
+    assert 'b string' in plan.schema_stmts[0].lower() and 'c int64 not null' in plan.schema_stmts[1].lower()
+
+    plan = SchemaRegistry(Session(describe), drop_properties=True).register(tag).plan()
+    assert plan.schema_stmts[-1].startswith('ALTER TAG t DROP') and '(d)' in plan.schema_stmts[-1]
+
+
+def test_indexes_on_changed_properties_are_rebuilt():
+    tag = TagSchemaModel(name='t', index=False, properties=[_p('a', 'STRING', index=True)])
+    session = Session({'t': [['a', 'int64', 'YES', None, '']]}, indexes={'i_T_t_P_a': ('t', ['a'])})
+    plan = SchemaRegistry(session).register(tag).plan()
+    assert plan.drop_index_stmts == ['DROP TAG INDEX IF EXISTS i_T_t_P_a;']
+    assert [name for _, name in plan.created_indexes] == ['i_T_t_P_a']
+
+
+def test_undeclared_indexes_are_dropped_only_on_request():
+    tag = TagSchemaModel(name='t', index=False, properties=[_p('a')])
+    session = Session({'t': [['a', 'int64', 'YES', None, '']]},
+                      indexes={'i_T_t_P_a': ('t', ['a']), 'other': ('x', ['a'])})
+    assert SchemaRegistry(session).register(tag).plan().is_empty()
+    plan = SchemaRegistry(session, drop_indexes=True).register(tag).plan()
+    assert plan.drop_index_stmts == ['DROP TAG INDEX IF EXISTS i_T_t_P_a;']
+
+
+def test_unsupported_live_property_is_changed_to_declared_type():
+    tag = TagSchemaModel(name='t', index=False, properties=[_p('g', 'STRING')])
+    registry = SchemaRegistry(Session({'t': [['g', 'geography', 'YES', None, '']]}))
+    plan = registry.register(tag).plan()
+    assert len(plan.schema_stmts) == 1 and plan.schema_stmts[0].startswith('ALTER TAG t CHANGE')
+
+
+def test_migrate_creates_indexes_after_schema_changes(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('ngsm.registry.time.sleep', sleeps.append)
+    tag = TagSchemaModel(name='t', index=True, properties=[_p('a')])
+    session = Session({}, failures={'CREATE TAG IF NOT EXISTS INDEX': 1})
+    plan = SchemaRegistry(session).register(tag).migrate(index_wait=5)
+    assert session.executed[0].startswith('CREATE TAG IF NOT EXISTS t')
+    # 等待心跳后首次建索引失败，重试后成功
+    assert session.executed[1:] == plan.create_index_stmts * 2
+    assert sleeps == [5, 5]
+
+
+def test_migrate_gives_up_after_index_retries(monkeypatch):
+    monkeypatch.setattr('ngsm.registry.time.sleep', lambda seconds: None)
+    tag = TagSchemaModel(name='t', index=True, properties=[_p('a')])
+    session = Session({}, failures={'CREATE TAG IF NOT EXISTS INDEX': 3})
+    with pytest.raises(RuntimeError, match='after 2 retries'):
+        SchemaRegistry(session).register(tag).migrate(index_retries=2)
+
+
+def test_migrate_without_schema_changes_does_not_wait(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('ngsm.registry.time.sleep', sleeps.append)
+    tag = TagSchemaModel(name='t', index=True, properties=[_p('a')])
+    session = Session({'t': [['a', 'int64', 'YES', None, '']]})
+    plan = SchemaRegistry(session).register(tag).migrate()
+    assert session.executed == plan.create_index_stmts and sleeps == []